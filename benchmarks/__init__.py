@@ -0,0 +1,3 @@
+"""
+Бенчмарки и проверки производительности.
+"""
\ No newline at end of file
@@ -0,0 +1,106 @@
+"""
+Стоимость маршрутизации одного сообщения по намерениям.
+
+Сравнивает ``IntentRouter`` с прежней схемой (проверка каждой фразы через
+``in`` и цикл по регулярным выражениям) на штатной таблице и на таблицах,
+расширенных синтетическими намерениями. У маршрутизатора время на
+сообщение не должно расти вместе с числом фраз.
+
+Запуск: python -m benchmarks.intents [--messages 2000] [--json]
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import timeit
+from typing import Dict, List, Sequence
+
+from src.intents import DEFAULT_INTENTS, SLOT_NONE, Intent, IntentRouter
+
+MESSAGES = [
+    'Привет! Как тебя зовут?',
+    'Меня зовут Алиса',
+    'Что такое квантовая запутанность?',
+    'Расскажи про интернет и как он устроен',
+    'Я твой создатель',
+    'Не хочу об этом говорить',
+    'Это просто тест',
+    'Сегодня отличная погода, пойдём гулять в парк после работы?',
+    'Мне грустно, поговори со мной немного',
+    'Кто такой Пушкин и почему его все знают',
+]
+
+EXTRA_SIZES = (0, 100, 1000)
+
+
+def synthetic_intents(count: int, seed: int = 42) -> List[Intent]:
+    """Намерения из случайных двухсловных фраз, которые не встречаются в сообщениях."""
+    rng = random.Random(seed)
+    letters = 'абвгдежзиклмнопрстуфхцчшщэюя'
+    intents = []
+    for i in range(count):
+        words = [''.join(rng.choice(letters) for _ in range(rng.randint(4, 8))) for _ in range(2)]
+        intents.append(Intent(f'synthetic_{i}', (' '.join(words),)))
+    return intents
+
+
+class LegacyRouter:
+    """Прежняя схема: подстрочный поиск каждой фразы и цикл по регулярным выражениям."""
+
+    def __init__(self, intents: Sequence[Intent]):
+        self.plain = [(i.name, i.phrases) for i in intents if i.slot is SLOT_NONE]
+        self.patterns = [
+            (i.name, [re.compile(re.escape(p) + r' (\w+)') for p in i.phrases])
+            for i in intents if i.slot is not SLOT_NONE
+        ]
+
+    def match(self, text: str) -> List[str]:
+        text_lower = text.lower()
+        found = [name for name, phrases in self.plain if any(p in text_lower for p in phrases)]
+        for name, patterns in self.patterns:
+            for pattern in patterns:
+                if pattern.search(text_lower):
+                    found.append(name)
+                    break
+        return found
+
+
+def per_message_us(router, messages: Sequence[str], repeat: int = 5) -> float:
+    """Лучшее из ``repeat`` измерений, микросекунды на сообщение."""
+    best = min(timeit.repeat(lambda: [router.match(m) for m in messages], number=1, repeat=repeat))
+    return best / len(messages) * 1e6
+
+
+def run(message_count: int = 2000) -> Dict[str, Dict[str, float]]:
+    rng = random.Random(0)
+    messages = [rng.choice(MESSAGES) for _ in range(message_count)]
+    results = {}
+    for extra in EXTRA_SIZES:
+        intents = list(DEFAULT_INTENTS) + synthetic_intents(extra)
+        results[f'+{extra} намерений'] = {
+            'router_us': per_message_us(IntentRouter(intents), messages),
+            'legacy_us': per_message_us(LegacyRouter(intents), messages),
+        }
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Стоимость маршрутизации по намерениям')
+    parser.add_argument('--messages', type=int, default=2000, help='число сообщений в прогоне')
+    parser.add_argument('--json', action='store_true', help='вывести результат в JSON')
+    args = parser.parse_args()
+
+    results = run(args.messages)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print(f"{'таблица':18} {'роутер':>10} {'прежняя схема':>15}")
+        for name, r in results.items():
+            print(f"{name:18} {r['router_us']:7.1f} µs {r['legacy_us']:12.1f} µs")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
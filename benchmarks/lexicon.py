@@ -0,0 +1,136 @@
+"""
+Словарь тональности с основами слов против прежнего поиска точных форм.
+
+Сравнивает точность знака тональности на размеченных сообщениях с разными
+формами слов и время оценки тональности и ключевых слов на сообщение
+(токены готовы заранее, кэш основ прогрет, как в работающем процессе).
+
+Запуск: python -m benchmarks.lexicon [--messages 5000] [--json]
+"""
+
+import argparse
+import json
+import random
+import sys
+import timeit
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+from benchmarks import synthetic
+from src.lexicon import load_lexicon
+from src.text_processor import BASE_STOP_WORDS, TextProcessor
+
+# Сообщение и ожидаемый знак тональности
+LABELLED: Tuple[Tuple[str, int], ...] = (
+    ('Я так рада тебя видеть!', 1),
+    ('Мне очень нравятся твои ответы', 1),
+    ('Спасибо, всё отлично', 1),
+    ('Какой замечательный день', 1),
+    ('Обожаю такие вечера', 1),
+    ('Мы были счастливы', 1),
+    ('Это прекрасная идея', 1),
+    ('Сегодня всё хорошо', 1),
+    ('Меня раздражают соседи', -1),
+    ('Какая ужасная погода', -1),
+    ('Мне грустно и одиноко', -1),
+    ('Надоело всё', -1),
+    ('Мне не нравится этот фильм', -1),
+    ('Ненавижу понедельники', -1),
+    ('Было так обидно', -1),
+    ('Он злится на меня', -1),
+    ('Плохой день', -1),
+    ('Сплошное разочарование', -1),
+    ('Я ради тебя включила радио', 0),
+    ('Завтра пойду в магазин', 0),
+)
+
+# Прежние списки: точные формы слов
+LEGACY_POSITIVE = frozenset({
+    'хорошо', 'отлично', 'замечательно', 'прекрасно', 'великолепно',
+    'рад', 'счастлив', 'доволен', 'люблю', 'нравится', 'спасибо'
+})
+LEGACY_NEGATIVE = frozenset({
+    'плохо', 'ужасно', 'отвратительно', 'грустно', 'печально',
+    'жаль', 'жалко', 'обидно', 'ненавижу', 'злюсь', 'раздражает'
+})
+
+
+def legacy_sentiment(tokens: Sequence[str]) -> Dict[str, float]:
+    words = set(tokens)
+    pos_count = len(words & LEGACY_POSITIVE)
+    neg_count = len(words & LEGACY_NEGATIVE)
+    total = pos_count + neg_count or 1
+    return {'polarity': (pos_count - neg_count) / total, 'subjectivity': (pos_count + neg_count) / len(words) if words else 0}
+
+
+def legacy_keywords(tokens: Sequence[str], limit: int = 5) -> List[str]:
+    words = [w for w in tokens if len(w) > 2 and w.isalnum() and w not in BASE_STOP_WORDS]
+    return [w for w, _ in Counter(words).most_common(limit)]
+
+
+def _sign(value: float) -> int:
+    return (value > 0) - (value < 0)
+
+
+def accuracy(score) -> float:
+    processor = TextProcessor()
+    hits = sum(_sign(score(processor.tokenize(text))['polarity']) == label for text, label in LABELLED)
+    return hits / len(LABELLED)
+
+
+def per_message_us(fn, token_lists: Sequence[Sequence[str]], repeat: int = 5) -> float:
+    """Лучшее из ``repeat`` измерений, микросекунды на сообщение."""
+    best = min(timeit.repeat(lambda: [fn(tokens) for tokens in token_lists], number=1, repeat=repeat))
+    return best / len(token_lists) * 1e6
+
+
+def run(message_count: int = 5000) -> Dict[str, Dict[str, float]]:
+    processor = TextProcessor()
+    lexicon = load_lexicon()
+    corpus = synthetic.messages(message_count)
+    texts = corpus + [text for text, _ in LABELLED]
+    random.Random(0).shuffle(texts)
+    token_lists = [processor.tokenize(text) for text in texts]
+    # Прогрев кэша основ: в работающем процессе словарь повторяющихся слов быстро насыщается
+    for tokens in token_lists:
+        lexicon.stems(tokens)
+
+    def stem_sentiment(tokens):
+        return lexicon.sentiment(tokens)
+
+    def stem_both(tokens):
+        stems = lexicon.stems(tokens)
+        return lexicon.sentiment(tokens, stems), lexicon.keywords(tokens, BASE_STOP_WORDS, 5, stems)
+
+    return {
+        'точные формы': {
+            'accuracy': accuracy(legacy_sentiment),
+            'sentiment_us': per_message_us(legacy_sentiment, token_lists),
+            'sentiment_keywords_us': per_message_us(lambda t: (legacy_sentiment(t), legacy_keywords(t)), token_lists),
+        },
+        'основы (Snowball)': {
+            'accuracy': accuracy(stem_sentiment),
+            'sentiment_us': per_message_us(stem_sentiment, token_lists),
+            'sentiment_keywords_us': per_message_us(stem_both, token_lists),
+        },
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Словарь тональности: точность и стоимость')
+    parser.add_argument('--messages', type=int, default=5000, help='число сообщений в прогоне')
+    parser.add_argument('--json', action='store_true', help='вывести результат в JSON')
+    args = parser.parse_args()
+
+    results = run(args.messages)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print(f"{'словарь':20} {'точность':>9} {'тональность':>13} {'+ ключевые слова':>18}")
+        for name, r in results.items():
+            print(f"{name:20} {r['accuracy']:9.0%} {r['sentiment_us']:10.1f} µs {r['sentiment_keywords_us']:15.1f} µs")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Проверка бюджета холодного старта.
+
+Каждый модуль импортируется в отдельном процессе с ``python -X importtime``;
+суммарное время импорта сравнивается с бюджетом. Отдельно замеряется
+создание ``Mika`` (без обращения к сети) во временном каталоге.
+
+Запуск: python -m benchmarks.startup [--scale 1.5]
+Код возврата 1, если хотя бы один бюджет превышен.
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Бюджеты в миллисекундах
+IMPORT_BUDGETS_MS = {
+    'src': 20,
+    'src.dialog_manager': 80,
+    'src.text_processor': 60,
+    'src.mika': 600,
+}
+CONSTRUCT_BUDGET_MS = 1500
+
+_IMPORTTIME_RE = re.compile(r'import time:\s+\d+ \|\s+(\d+) \|\s*(\S+)')
+
+
+def measure_import(module: str) -> float:
+    """Возвращает суммарное время импорта модуля в миллисекундах."""
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, env=env, cwd=tempfile.gettempdir()
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    for line in reversed(result.stderr.splitlines()):
+        match = _IMPORTTIME_RE.match(line)
+        if match and match.group(2) == module:
+            return int(match.group(1)) / 1000
+    raise RuntimeError(f'Не найдено время импорта {module}')
+
+
+def measure_construct() -> float:
+    """Возвращает время импорта и создания Mika в миллисекундах."""
+    code = (
+        'import time; t = time.perf_counter(); '
+        'from src.mika import Mika; m = Mika(); '
+        'print((time.perf_counter() - t) * 1000); m.close()'
+    )
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    with tempfile.TemporaryDirectory() as workdir:
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            capture_output=True, text=True, env=env, cwd=workdir
+        )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def run(scale: float = 1.0) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for module, budget in IMPORT_BUDGETS_MS.items():
+        results[f'import {module}'] = {'ms': measure_import(module), 'budget_ms': budget * scale}
+    results['Mika()'] = {'ms': measure_construct(), 'budget_ms': CONSTRUCT_BUDGET_MS * scale}
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Проверка бюджета холодного старта')
+    parser.add_argument('--scale', type=float, default=1.0, help='множитель бюджетов для медленных машин')
+    parser.add_argument('--json', action='store_true', help='вывести результат в JSON')
+    args = parser.parse_args()
+
+    results = run(args.scale)
+    failed = [name for name, r in results.items() if r['ms'] > r['budget_ms']]
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        for name, r in results.items():
+            mark = 'FAIL' if name in failed else 'ok'
+            print(f"{name:28} {r['ms']:8.1f} ms  (бюджет {r['budget_ms']:.0f} ms)  {mark}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
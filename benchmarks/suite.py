@@ -0,0 +1,176 @@
+"""
+Набор микробенчмарков: TextProcessor, DialogManager и сборка контекста Мики.
+
+Данные синтетические (см. ``benchmarks.synthetic``); базы нужного размера
+создаются один раз в рабочем каталоге и переиспользуются.
+
+Запуск:
+    python -m benchmarks.suite --rows 10000 100000 --output results.json
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json --tolerance 0.25
+
+Код возврата 1, если медиана какого-либо замера хуже базовой больше чем на
+``tolerance``.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+from benchmarks import synthetic
+
+DEFAULT_WORKDIR = Path(tempfile.gettempdir()) / 'mika-benchmarks'
+
+
+def measure(fn: Callable[[int], object], repeat: int = 7, min_time: float = 0.05) -> Dict[str, float]:
+    """Замеряет ``fn(i)``; число вызовов в серии подбирается так, чтобы серия длилась не меньше ``min_time``."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for i in range(number):
+            fn(i)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+
+    samples = []
+    offset = number
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(offset, offset + number):
+            fn(i)
+        samples.append((time.perf_counter() - start) / number * 1e6)
+        offset += number
+    samples.sort()
+    return {
+        'median_us': statistics.median(samples),
+        'min_us': samples[0],
+        'max_us': samples[-1],
+        'calls': number * repeat,
+    }
+
+
+def text_benchmarks(corpus: Sequence[str]) -> Dict[str, Callable[[int], object]]:
+    from src.text_processor import TextProcessor
+
+    processor = TextProcessor()
+    size = len(corpus)
+    return {
+        'text.analyze_text': lambda i: processor.analyze_text(corpus[i % size]),
+        'text.extract_keywords': lambda i: processor.extract_keywords(corpus[i % size]),
+        'text.find_entities': lambda i: processor.find_entities(corpus[i % size]),
+        'text.tokenize': lambda i: processor.tokenize(corpus[i % size]),
+    }
+
+
+def dialog_benchmarks(db_path: Path, rows: int, sessions: int) -> Dict[str, Callable[[int], object]]:
+    from src.dialog_manager import DialogManager
+    from src.storage import Storage
+
+    storage = Storage(db_path)
+    managers = [DialogManager(storage=storage, session_id=f'session-{s}') for s in range(min(sessions, 64))]
+    count = len(managers)
+    queries = [f'{adj} {noun}' for noun in synthetic.NOUNS for adj in synthetic.ADJECTIVES]
+    return {
+        f'dialog.get_recent_messages[rows={rows}]': lambda i: managers[i % count].get_recent_messages(5),
+        f'dialog.get_user_preferences[rows={rows}]': lambda i: managers[i % count].get_user_preferences(),
+        f'dialog.search[rows={rows}]': lambda i: managers[0].search(queries[i % len(queries)]),
+        f'dialog.get_statistics[rows={rows}]': lambda i: managers[0].get_statistics(30, f'session-{i % count}'),
+    }
+
+
+def context_benchmarks(db_path: Path, corpus: Sequence[str], workdir: Path) -> Dict[str, Callable[[int], object]]:
+    from src.dialog_manager import DialogManager
+    from src.knowledge import KnowledgeBase
+    from src.message_analysis import MessageAnalyzer
+    from src.mika import Mika
+    from src.text_processor import TextProcessor
+
+    processor = TextProcessor()
+    analyzer = MessageAnalyzer(processor)
+    mika = Mika(
+        dialog_manager=DialogManager(db_path, session_id='session-0', analyzer=analyzer),
+        text_processor=processor,
+        knowledge=KnowledgeBase(workdir / 'knowledge.db', offline=True)
+    )
+    for message in corpus[:3]:
+        mika._update_context(message, 'Ответ Мики 🌸')
+    analyses = [analyzer.analyze(message) for message in corpus]
+    size = len(corpus)
+    return {
+        'mika.build_context': lambda i: mika._build_context(corpus[i % size], analyses[i % size]),
+    }
+
+
+def run(rows_list: Sequence[int], workdir: Path, sessions: int = 1000, corpus_size: int = 1000) -> Dict[str, Dict[str, float]]:
+    workdir.mkdir(parents=True, exist_ok=True)
+    corpus = synthetic.messages(corpus_size)
+    cases: Dict[str, Callable[[int], object]] = {}
+    cases.update(text_benchmarks(corpus))
+    for rows in rows_list:
+        db_path = synthetic.build_dialog_db(workdir / f'dialogs-{rows}.db', rows, sessions)
+        cases.update(dialog_benchmarks(db_path, rows, sessions))
+    smallest = synthetic.build_dialog_db(workdir / f'dialogs-{min(rows_list)}.db', min(rows_list), sessions)
+    cases.update(context_benchmarks(smallest, corpus, workdir))
+    return {name: measure(fn) for name, fn in cases.items()}
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """Возвращает имена замеров, медиана которых хуже базовой больше чем на ``tolerance``."""
+    regressions = []
+    for name, row in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        row['baseline_us'] = base['median_us']
+        row['ratio'] = row['median_us'] / base['median_us']
+        if row['ratio'] > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Микробенчмарки Мики')
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000], help='размеры синтетических баз (10000 … 10000000)')
+    parser.add_argument('--sessions', type=int, default=1000, help='число сессий в синтетической базе')
+    parser.add_argument('--workdir', type=Path, default=DEFAULT_WORKDIR, help='каталог для синтетических баз')
+    parser.add_argument('--output', type=Path, help='сохранить результат в JSON')
+    parser.add_argument('--baseline', type=Path, help='сравнить с сохранённым результатом')
+    parser.add_argument('--save-baseline', type=Path, help='сохранить результат как базовый')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='допустимое замедление относительно базы')
+    args = parser.parse_args()
+
+    results = run(args.rows, args.workdir, args.sessions)
+    regressions: List[str] = []
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding='utf-8'))['results']
+        regressions = compare(results, baseline, args.tolerance)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'rows': args.rows,
+        'results': results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    for name, row in results.items():
+        line = f"{name:44} {row['median_us']:10.1f} µs"
+        if 'ratio' in row:
+            mark = 'FAIL' if name in regressions else 'ok'
+            line += f"  (база {row['baseline_us']:.1f} µs, x{row['ratio']:.2f})  {mark}"
+        print(line)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
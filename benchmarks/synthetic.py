@@ -0,0 +1,116 @@
+"""
+Синтетические данные для бенчмарков: русские сообщения и базы диалогов.
+
+Генерация детерминирована (зависит только от seed), поэтому замеры на
+разных машинах и в разных прогонах сравнимы. Собранная база кэшируется в
+рабочем каталоге и пересоздаётся, только если её нет.
+"""
+
+import random
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterator, List, Tuple, Union
+
+from src.dialog_manager import DEFAULT_USER_ID, _MIGRATIONS
+from src.storage import Storage
+
+NAMES = ('Алиса', 'Борис', 'Вера', 'Глеб', 'Дарья', 'Егор', 'Жанна', 'Иван', 'Катя', 'Лев')
+NOUNS = (
+    'кот', 'погода', 'работа', 'книга', 'музыка', 'город', 'море', 'программа', 'школа', 'друг',
+    'фильм', 'игра', 'мечта', 'кофе', 'собака', 'лес', 'поезд', 'компьютер', 'праздник', 'утро',
+)
+ADJECTIVES = (
+    'хороший', 'странный', 'новый', 'интересный', 'грустный', 'весёлый', 'сложный', 'тёплый',
+    'длинный', 'красивый', 'плохой', 'отличный', 'скучный', 'важный',
+)
+VERBS = (
+    'люблю', 'читаю', 'слушаю', 'думаю', 'помню', 'хочу', 'вижу', 'знаю', 'жду', 'ищу',
+)
+TEMPLATES = (
+    'Привет! Как у тебя дела?',
+    'Я {verb} {noun}, это очень {adj} опыт.',
+    'Что такое {noun}?',
+    'Расскажи про {noun}, пожалуйста.',
+    'Меня зовут {name}.',
+    'Сегодня был {adj} день, {noun} совсем не радует.',
+    'Почему {noun} такой {adj}?',
+    'Мне кажется, что {noun} — это {adj} идея, но я не уверен.',
+    'Ты {verb} {noun}? Мне интересно твоё мнение.',
+    'Кто такой {name} и почему все о нём говорят?',
+    'Не хочу говорить про {noun}.',
+    'Вчера я видел {adj} {noun} в городе {name}, и это было {adj} зрелище!',
+)
+REPLIES = (
+    'Ой, как интересно! 🌸 Расскажи подробнее про {noun}!',
+    'Я тоже думаю, что {noun} — это {adj} тема ✨',
+    'Понимаю тебя! 💫 А что ты {verb} больше всего?',
+    'Здорово, {name}! 🌟 Давай поговорим о чём-нибудь ещё?',
+)
+
+
+def _fill(template: str, rng: random.Random) -> str:
+    return template.format(
+        name=rng.choice(NAMES), noun=rng.choice(NOUNS),
+        adj=rng.choice(ADJECTIVES), verb=rng.choice(VERBS)
+    )
+
+
+def messages(count: int, seed: int = 0) -> List[str]:
+    """Сообщения пользователя: вопросы, представления, длинные и короткие реплики."""
+    rng = random.Random(seed)
+    return [_fill(rng.choice(TEMPLATES), rng) for _ in range(count)]
+
+
+def dialog_rows(count: int, sessions: int, seed: int = 0, days: int = 30) -> Iterator[Tuple[str, str, str, str, str]]:
+    """Строки таблицы messages: (session_id, user_id, human, ai, timestamp) по возрастанию времени."""
+    rng = random.Random(seed)
+    start = time.time() - days * 86400
+    step = days * 86400 / max(count, 1)
+    for i in range(count):
+        session = f'session-{rng.randrange(sessions)}'
+        stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(start + i * step))
+        yield (
+            session, session if rng.random() < 0.9 else DEFAULT_USER_ID,
+            _fill(rng.choice(TEMPLATES), rng), _fill(rng.choice(REPLIES), rng), stamp
+        )
+
+
+def build_dialog_db(path: Union[str, Path], rows: int, sessions: int = 1000, seed: int = 0, batch: int = 50000) -> Path:
+    """Создаёт базу диалогов со схемой DialogManager и ``rows`` сообщениями."""
+    path = Path(path)
+    if path.exists():
+        return path
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.unlink(missing_ok=True)
+    storage = Storage(tmp_path)
+    storage.migrate(_MIGRATIONS)
+    storage.close()
+
+    # Заполняем напрямую: журнал и синхронизация на время сборки не нужны
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('BEGIN')
+        buffer = []
+        for row in dialog_rows(rows, sessions, seed):
+            buffer.append(row)
+            if len(buffer) >= batch:
+                _insert(conn, buffer)
+                buffer = []
+        if buffer:
+            _insert(conn, buffer)
+        conn.execute('COMMIT')
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+    tmp_path.rename(path)
+    return path
+
+
+def _insert(conn: sqlite3.Connection, rows: List[Tuple]):
+    conn.executemany(
+        'INSERT INTO messages (session_id, user_id, human_message, ai_message, timestamp) VALUES (?, ?, ?, ?, ?)',
+        rows
+    )
@@ -2,8 +2,21 @@
 Mika AI Assistant Package
 """
 
-from .mika import Mika
-from .dialog_manager import DialogManager
-from .text_processor import TextProcessor
+import importlib
 
-__all__ = ['Mika', 'DialogManager', 'TextProcessor'] 
\ No newline at end of file
+# Модули загружаются при первом обращении, чтобы импорт пакета был дешёвым
+_LAZY_ATTRS = {
+    'Mika': '.mika',
+    'DialogManager': '.dialog_manager',
+    'TextProcessor': '.text_processor',
+}
+
+__all__ = ['Mika', 'DialogManager', 'TextProcessor']
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRS:
+        value = getattr(importlib.import_module(_LAZY_ATTRS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,264 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncGenerator, Dict, Generator, List, Optional, Sequence, Tuple, Union
+
+import requests
+
+from .ollama_client import OllamaClient, OllamaError
+
+log = logging.getLogger("mika")
+
+# Адрес сервера и, необязательно, модель на нём: 'http://host:11434=marco-o1'
+EndpointSpec = Union[str, Tuple[str, Optional[str]]]
+
+
+def parse_endpoint(spec: EndpointSpec) -> Tuple[str, Optional[str]]:
+    if isinstance(spec, tuple):
+        return spec
+    url, _, model = spec.partition('=')
+    return url, model or None
+
+
+class Backend:
+    """Сервер модели: клиент, число идущих запросов и состояние автомата отключения."""
+
+    __slots__ = ('url', 'model', 'client', 'outstanding', 'failures', 'open_until', 'requests', 'errors')
+
+    def __init__(self, url: str, model: Optional[str], client: OllamaClient):
+        self.url = url
+        self.model = model
+        self.client = client
+        self.outstanding = 0
+        # Ошибки подряд; после порога сервер исключается до open_until
+        self.failures = 0
+        self.open_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def status(self, failure_threshold: int) -> Dict[str, Any]:
+        if self.failures < failure_threshold:
+            state = 'closed'
+        elif self.open_until > time.monotonic():
+            state = 'open'
+        else:
+            state = 'half-open'
+        return {
+            'url': self.url,
+            'model': self.model,
+            'state': state,
+            'outstanding': self.outstanding,
+            'requests': self.requests,
+            'errors': self.errors,
+        }
+
+
+class OllamaRouter:
+    """Распределяет генерацию между несколькими серверами Ollama.
+
+    Интерфейс тот же, что у ``OllamaClient``, поэтому Мика и сервер работают
+    с роутером без изменений. Запрос уходит серверу с наименьшим числом идущих
+    запросов (при равенстве — по кругу). Сервер, ответивший ошибкой
+    ``failure_threshold`` раз подряд или не прошедший фоновую проверку,
+    исключается на ``cooldown`` секунд; затем к нему пропускается один
+    пробный запрос. Если сервер отказал до первого токена, запрос прозрачно
+    повторяется на следующем; оборвавшийся посреди ответа поток не
+    повторяется (пользователь уже видел часть ответа), но следующий ход
+    диалога уйдёт на исправный сервер: запрос /api/chat несёт всю историю.
+    """
+
+    def __init__(
+        self,
+        endpoints: Sequence[EndpointSpec],
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+        probe_interval: float = 5.0,
+        probe_timeout: float = 1.0,
+        pool_maxsize: int = 16,
+        **client_options: Any
+    ):
+        if not endpoints:
+            raise ValueError("Не задан ни один сервер модели")
+        # Повторы соединения внутри клиента не нужны: вместо них переключение на другой сервер
+        client_options.setdefault('retries', 0)
+        self.backends = [
+            Backend(url, model, OllamaClient(url, pool_maxsize=pool_maxsize, **client_options))
+            for url, model in map(parse_endpoint, endpoints)
+        ]
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.failovers = 0
+        self._lock = threading.Lock()
+        self._turn = 0
+        self._stop = threading.Event()
+        self._prober: Optional[threading.Thread] = None
+        if probe_interval > 0:
+            self._prober = threading.Thread(target=self._probe_loop, name='ollama-probe', daemon=True)
+            self._prober.start()
+
+    def check_service(self) -> bool:
+        """Проверяет, что доступен хотя бы один сервер."""
+        if any(backend.client.ping(self.probe_timeout) for backend in self.backends):
+            return True
+        log.error(f"Ни один сервер Ollama не отвечает: {', '.join(b.url for b in self.backends)}")
+        return False
+
+    def stream_generate(self, payload: Dict[str, Any]) -> Generator[Dict[str, Any], None, None]:
+        return self._stream('stream_generate', payload)
+
+    def stream_chat(self, payload: Dict[str, Any]) -> Generator[Dict[str, Any], None, None]:
+        return self._stream('stream_chat', payload)
+
+    def astream_generate(self, payload: Dict[str, Any]) -> AsyncGenerator[Dict[str, Any], None]:
+        return self._astream('astream_generate', payload)
+
+    def astream_chat(self, payload: Dict[str, Any]) -> AsyncGenerator[Dict[str, Any], None]:
+        return self._astream('astream_chat', payload)
+
+    def warm_up(self, model: str, keep_alive: Any = '30m', options: Optional[Dict[str, Any]] = None) -> bool:
+        """Загружает модели на всех серверах одновременно; True, если удалось хотя бы на одном."""
+        with ThreadPoolExecutor(max_workers=len(self.backends), thread_name_prefix='ollama-warmup') as pool:
+            results = list(pool.map(
+                lambda backend: backend.client.warm_up(backend.model or model, keep_alive, options),
+                self.backends
+            ))
+        return any(results)
+
+    def status(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [backend.status(self.failure_threshold) for backend in self.backends]
+
+    def close(self):
+        self._stop.set()
+        if self._prober is not None:
+            self._prober.join()
+        for backend in self.backends:
+            backend.client.close()
+
+    def _stream(self, method: str, payload: Dict[str, Any]) -> Generator[Dict[str, Any], None, None]:
+        tried: List[Backend] = []
+        last_error: Optional[Exception] = None
+        while True:
+            backend = self._acquire(tried)
+            if backend is None:
+                raise last_error or OllamaError("Нет доступных серверов модели")
+            tried.append(backend)
+            request = dict(payload, model=backend.model) if backend.model else payload
+            stream = getattr(backend.client, method)(request)
+            started = False
+            try:
+                for message in stream:
+                    started = True
+                    yield message
+                self._succeeded(backend)
+                return
+            except (requests.exceptions.RequestException, OllamaError) as e:
+                self._failed(backend)
+                if started:
+                    raise
+                last_error = e
+                self.failovers += 1
+                log.warning(f"Сервер модели {backend.url} не ответил, запрос передаётся другому: {str(e)}")
+            finally:
+                stream.close()
+                self._release(backend)
+
+    async def _astream(self, method: str, payload: Dict[str, Any]) -> AsyncGenerator[Dict[str, Any], None]:
+        """Асинхронный вариант ``_stream`` с тем же переключением до первого токена."""
+        tried: List[Backend] = []
+        last_error: Optional[Exception] = None
+        while True:
+            backend = self._acquire(tried)
+            if backend is None:
+                raise last_error or OllamaError("Нет доступных серверов модели")
+            tried.append(backend)
+            request = dict(payload, model=backend.model) if backend.model else payload
+            stream = getattr(backend.client, method)(request)
+            started = False
+            try:
+                async for message in stream:
+                    started = True
+                    yield message
+                self._succeeded(backend)
+                return
+            except (requests.exceptions.RequestException, OllamaError) as e:
+                self._failed(backend)
+                if started:
+                    raise
+                last_error = e
+                self.failovers += 1
+                log.warning(f"Сервер модели {backend.url} не ответил, запрос передаётся другому: {str(e)}")
+            finally:
+                await stream.aclose()
+                self._release(backend)
+
+    def _acquire(self, exclude: Sequence[Backend]) -> Optional[Backend]:
+        """Выбирает сервер с наименьшим числом идущих запросов среди доступных."""
+        with self._lock:
+            now = time.monotonic()
+            count = len(self.backends)
+            self._turn = (self._turn + 1) % count
+            candidates = [
+                (backend.outstanding, (i - self._turn) % count, backend)
+                for i, backend in enumerate(self.backends)
+                if backend not in exclude and self._available(backend, now)
+            ]
+            if not candidates:
+                # Все отключены: пробуем тот, что отключён раньше всех, а не отказываем сразу
+                candidates = [
+                    (backend.open_until, i, backend)
+                    for i, backend in enumerate(self.backends)
+                    if backend not in exclude
+                ]
+                if not candidates:
+                    return None
+            backend = min(candidates, key=lambda c: c[:2])[2]
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def _available(self, backend: Backend, now: float) -> bool:
+        if backend.failures < self.failure_threshold:
+            return True
+        # После паузы — один пробный запрос за раз
+        return backend.open_until <= now and backend.outstanding == 0
+
+    def _release(self, backend: Backend):
+        with self._lock:
+            backend.outstanding -= 1
+
+    def _succeeded(self, backend: Backend):
+        with self._lock:
+            backend.failures = 0
+            backend.open_until = 0.0
+
+    def _failed(self, backend: Backend):
+        with self._lock:
+            backend.errors += 1
+            backend.failures += 1
+            if backend.failures >= self.failure_threshold:
+                backend.open_until = time.monotonic() + self.cooldown
+                log.warning(f"Сервер модели {backend.url} отключён на {self.cooldown:.0f} с")
+
+    def _probe_loop(self):
+        while not self._stop.wait(self.probe_interval):
+            for backend in self.backends:
+                ok = backend.client.ping(self.probe_timeout)
+                with self._lock:
+                    now = time.monotonic()
+                    if ok:
+                        # Отключённый сервер возвращается только после паузы: ответ на проверку
+                        # ещё не значит, что он справляется с генерацией
+                        if backend.open_until <= now:
+                            if backend.failures >= self.failure_threshold:
+                                log.info(f"Сервер модели {backend.url} снова доступен")
+                            backend.failures = 0
+                            backend.open_until = 0.0
+                    elif backend.open_until <= now:
+                        if backend.failures < self.failure_threshold:
+                            log.warning(f"Сервер модели {backend.url} не отвечает на проверку, отключён")
+                        backend.failures = max(backend.failures, self.failure_threshold)
+                        backend.open_until = now + self.cooldown
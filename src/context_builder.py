@@ -0,0 +1,108 @@
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Приоритеты разделов: меньше — важнее; при нехватке бюджета первыми отбрасываются последние
+SECTION_REQUIRED = 0
+SECTION_HIGH = 1
+SECTION_NORMAL = 2
+SECTION_LOW = 3
+
+_TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+
+
+@lru_cache(maxsize=8192)
+def estimate_tokens(text: str) -> int:
+    """Оценка числа токенов без токенизатора модели.
+
+    Короткое слово — примерно один токен, длинное русское слово BPE режет
+    на несколько частей; каждый знак препинания и эмодзи — отдельный токен.
+    """
+    return sum(1 + len(piece) // 6 for piece in _TOKEN_RE.findall(text))
+
+
+def truncate_tokens(text: str, max_tokens: int, keep_tail: bool = False) -> str:
+    """Обрезает текст по словам до ``max_tokens``; ``keep_tail`` оставляет конец, а не начало."""
+    if max_tokens <= 0:
+        return ''
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    words = text.split(' ')
+    if keep_tail:
+        words.reverse()
+    kept = []
+    used = 0
+    for word in words:
+        cost = estimate_tokens(word) + (1 if kept else 0)
+        if used + cost > max_tokens - 1:
+            break
+        kept.append(word)
+        used += cost
+    if keep_tail:
+        kept.reverse()
+        return '…' + ' '.join(kept)
+    return ' '.join(kept) + '…'
+
+
+class _Section:
+    __slots__ = ('name', 'text', 'priority', 'truncatable', 'keep_tail', 'tokens')
+
+    def __init__(self, name: str, text: str, priority: int, truncatable: bool, keep_tail: bool):
+        self.name = name
+        self.text = text
+        self.priority = priority
+        self.truncatable = truncatable
+        self.keep_tail = keep_tail
+        self.tokens = estimate_tokens(text)
+
+
+class ContextBuilder:
+    """Собирает контекст из разделов в пределах бюджета токенов.
+
+    Разделы выводятся в порядке добавления, а в бюджет включаются по
+    приоритету: важные целиком, менее важные обрезаются (если разрешено) или
+    отбрасываются. Оценки токенов кэшируются по тексту, а если набор разделов
+    и бюджет не изменились с прошлого хода, возвращается прошлый результат.
+    """
+
+    def __init__(self):
+        self._sections: List[_Section] = []
+        self._previous: Optional[Tuple[Tuple, str]] = None
+        self.last_tokens = 0
+        self.last_dropped: List[str] = []
+
+    def begin(self):
+        """Начинает сборку контекста нового хода."""
+        self._sections = []
+
+    def add(self, name: str, text: str, priority: int = SECTION_NORMAL, truncatable: bool = False, keep_tail: bool = False):
+        if text:
+            self._sections.append(_Section(name, text, priority, truncatable, keep_tail))
+
+    def render(self, max_tokens: int) -> str:
+        key = (max_tokens, tuple((s.name, s.text, s.priority) for s in self._sections))
+        if self._previous is not None and self._previous[0] == key:
+            return self._previous[1]
+
+        # Разделы переводятся строкой, которую тоже считаем за токен
+        remaining = max_tokens
+        rendered: Dict[int, str] = {}
+        dropped = []
+        order = sorted(range(len(self._sections)), key=lambda i: self._sections[i].priority)
+        for i in order:
+            section = self._sections[i]
+            cost = section.tokens + 1
+            if cost <= remaining or section.priority == SECTION_REQUIRED:
+                rendered[i] = section.text
+                remaining -= cost
+            elif section.truncatable and remaining > 8:
+                rendered[i] = truncate_tokens(section.text, remaining - 1, section.keep_tail)
+                remaining -= estimate_tokens(rendered[i]) + 1
+            else:
+                dropped.append(section.name)
+
+        result = '\n'.join(rendered[i] for i in sorted(rendered))
+        self.last_tokens = max_tokens - remaining
+        self.last_dropped = dropped
+        self._previous = (key, result)
+        return result
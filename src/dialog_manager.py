@@ -1,162 +1,443 @@
 import sqlite3
-import json
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple, Union
 import logging
-from pathlib import Path
+import os
 import re
+from pathlib import Path
+from .storage import Storage
+from .lexicon import stem
+from .session_state import SessionStateCache
+from .message_analysis import MessageAnalysis, MessageAnalyzer
+
+DEFAULT_SESSION_ID = 'default'
+DEFAULT_USER_ID = 'default'
+
+
+def retention_days_from_env() -> Optional[int]:
+    """Срок хранения истории из MIKA_RETENTION_DAYS; не задан или 0 — хранить бессрочно."""
+    value = os.environ.get('MIKA_RETENTION_DAYS', '').strip()
+    if not value:
+        return None
+    try:
+        days = int(value)
+    except ValueError:
+        logging.error(f"MIKA_RETENTION_DAYS должно быть целым числом дней: {value!r}")
+        return None
+    return days if days > 0 else None
+
+# Ответы Мики, когда модель ничего не вернула; по ним считается доля неудачных ходов
+FALLBACK_RESPONSES = (
+    "Извини, я немного запуталась. Давай начнём сначала? 🌸",
+    "Прости, я не совсем поняла. Можешь повторить? ✨",
+    "Что-то я отвлеклась. О чём мы говорили? 💫",
+    "Ой, кажется, я потеряла нить разговора. Напомни? 🌟",
+)
+
+
+def _sql_literals(values) -> str:
+    return ', '.join("'" + value.replace("'", "''") + "'" for value in values)
+
+
+# Версионные миграции схемы: (версия, выражения). Версия хранится в PRAGMA user_version.
+_MIGRATIONS = [
+    (1, [
+        '''
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            human_message TEXT,
+            ai_message TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_preferences (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    # Сессии и пользователи, индексы для выборки последних сообщений и очистки
+    (2, [
+        f"ALTER TABLE messages ADD COLUMN session_id TEXT NOT NULL DEFAULT '{DEFAULT_SESSION_ID}'",
+        f"ALTER TABLE messages ADD COLUMN user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER_ID}'",
+        'CREATE INDEX IF NOT EXISTS idx_messages_session_ts ON messages (session_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_messages_user_ts ON messages (user_id, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_messages_ts ON messages (timestamp)',
+        f'''
+        CREATE TABLE user_preferences_v2 (
+            user_id TEXT NOT NULL DEFAULT '{DEFAULT_USER_ID}',
+            key TEXT NOT NULL,
+            value TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, key)
+        )
+        ''',
+        f'''
+        INSERT INTO user_preferences_v2 (user_id, key, value, timestamp)
+        SELECT '{DEFAULT_USER_ID}', key, value, timestamp FROM user_preferences
+        ''',
+        'DROP TABLE user_preferences',
+        'ALTER TABLE user_preferences_v2 RENAME TO user_preferences',
+    ]),
+    # Докуда перенесены таблицы старых баз (см. src.history)
+    (3, [
+        '''
+        CREATE TABLE IF NOT EXISTS history_imports (
+            source TEXT NOT NULL,
+            source_table TEXT NOT NULL,
+            last_id INTEGER NOT NULL,
+            imported INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (source, source_table)
+        )
+        ''',
+    ]),
+    # Снимок контекста сессии для продолжения разговора после перезапуска
+    (4, [
+        '''
+        CREATE TABLE IF NOT EXISTS session_state (
+            session_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            state TEXT NOT NULL,
+            updated DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_session_state_updated ON session_state (updated)',
+    ]),
+    # Полнотекстовый индекс по сообщениям (синхронизируется триггерами) и отметка запасных ответов
+    (5, [
+        'ALTER TABLE messages ADD COLUMN fallback INTEGER NOT NULL DEFAULT 0',
+        f'UPDATE messages SET fallback = 1 WHERE ai_message IN ({_sql_literals(FALLBACK_RESPONSES)})',
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+            human_message, ai_message,
+            content='messages', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts (rowid, human_message, ai_message)
+            VALUES (new.id, new.human_message, new.ai_message);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, human_message, ai_message)
+            VALUES ('delete', old.id, old.human_message, old.ai_message);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF human_message, ai_message ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, human_message, ai_message)
+            VALUES ('delete', old.id, old.human_message, old.ai_message);
+            INSERT INTO messages_fts (rowid, human_message, ai_message)
+            VALUES (new.id, new.human_message, new.ai_message);
+        END
+        ''',
+        # Индексируем уже накопленную историю
+        "INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')",
+    ]),
+    # Владелец сессии: контекст и история сессии доступны только ему, в том числе после перезапуска
+    (6, [
+        '''
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            created DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Уже существующие сессии принадлежат автору первого сообщения
+        '''
+        INSERT OR IGNORE INTO sessions (session_id, user_id)
+        SELECT session_id, user_id FROM messages m
+        WHERE id = (SELECT MIN(id) FROM messages WHERE session_id = m.session_id)
+        ''',
+        'INSERT OR IGNORE INTO sessions (session_id, user_id) SELECT session_id, user_id FROM session_state',
+    ]),
+]
+
+# Тексты запросов постоянны, поэтому sqlite3 переиспользует подготовленные выражения
+_INSERT_MESSAGE_SQL = '''INSERT INTO messages (session_id, user_id, human_message, ai_message, fallback)
+                         VALUES (?, ?, ?, ?, ?)'''
+_RECENT_MESSAGES_SQL = '''SELECT human_message, ai_message FROM messages
+                         WHERE session_id = ? AND user_id = ? ORDER BY timestamp DESC, id DESC LIMIT ?'''
+_DELETE_OLD_MESSAGES_SQL = '''DELETE FROM messages WHERE id IN (
+                                SELECT id FROM messages WHERE timestamp < datetime('now', ?)
+                                ORDER BY timestamp LIMIT ?)'''
+_DELETE_OLD_STATES_SQL = "DELETE FROM session_state WHERE updated < datetime('now', ?)"
+# Маркеры подсветки, многоточие и число слов во фрагменте передаются параметрами
+_SEARCH_SQL = '''SELECT m.id, m.session_id, m.user_id, m.timestamp,
+                         snippet(messages_fts, 0, ?, ?, '…', ?), snippet(messages_fts, 1, ?, ?, '…', ?),
+                         bm25(messages_fts) AS rank
+                  FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+                  WHERE {conditions}
+                  ORDER BY rank, m.id DESC LIMIT ? OFFSET ?'''
+_SEARCH_COUNT_SQL = '''SELECT COUNT(*) FROM messages_fts JOIN messages m ON m.id = messages_fts.rowid
+                        WHERE {conditions}'''
+_DAILY_STATS_SQL = '''SELECT date(timestamp) AS day, COUNT(*), SUM(fallback), COUNT(DISTINCT session_id)
+                      FROM messages WHERE {conditions} GROUP BY day ORDER BY day'''
+_TOTAL_STATS_SQL = '''SELECT COUNT(*), COALESCE(SUM(fallback), 0), COUNT(DISTINCT session_id), COUNT(DISTINCT user_id)
+                      FROM messages WHERE {conditions}'''
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def search_query(text: str) -> str:
+    """Запрос FTS5 из обычного текста.
+
+    Нужны все слова запроса; каждое ищется по основе как префикс, поэтому
+    «котик» находит и «котики», и «котиков». Кавычки и операторы FTS5 во
+    вводе пользователя не действуют.
+    """
+    return ' '.join(f'"{stem(word)}"*' for word in _WORD_RE.findall(text.lower()))
+
+
+def _filters(user_id: Optional[str], session_id: Optional[str],
+             since: Optional[str], until: Optional[str], column_prefix: str = ''):
+    conditions: List[str] = []
+    params: List[Any] = []
+    for column, operator, value in (('user_id', '=', user_id), ('session_id', '=', session_id),
+                                    ('timestamp', '>=', since), ('timestamp', '<', until)):
+        if value is not None:
+            conditions.append(f'{column_prefix}{column} {operator} ?')
+            params.append(value)
+    return conditions, params
+
+
+def migrate_schema(storage: Storage) -> int:
+    """Обновляет схему базы диалогов до текущей версии и возвращает её."""
+    # До миграций: новая база ещё пуста и переходит в режим incremental без пересборки
+    if not storage.enable_incremental_vacuum():
+        logging.debug(f"{storage.db_path.name}: место после очистки вернётся системе после "
+                      f"python -m src.history compact --db {storage.db_path}")
+    return storage.migrate(_MIGRATIONS)
+
 
 class DialogManager:
-    def __init__(self):
-        self.db_path = Path('mika_data.db')
+    def __init__(
+        self,
+        db_path: Union[str, Path] = 'mika_data.db',
+        storage: Optional[Storage] = None,
+        session_id: str = DEFAULT_SESSION_ID,
+        user_id: str = DEFAULT_USER_ID,
+        analyzer: Optional[MessageAnalyzer] = None,
+        state_cache: Optional[SessionStateCache] = None,
+        retention_days: Optional[int] = None
+    ):
+        self.db_path = Path(db_path) if storage is None else storage.db_path
+        self.storage = storage or Storage(self.db_path)
+        self.session_id = session_id
+        self.user_id = user_id
+        self.analyzer = analyzer or MessageAnalyzer()
+        # Сколько дней хранить историю; None — бессрочно (по умолчанию, если не задано MIKA_RETENTION_DAYS)
+        self.retention_days = retention_days if retention_days is not None else retention_days_from_env()
         self._init_db()
-        self.name_patterns = [
-            r'меня зовут (\w+)',
-            r'я (\w+)',
-            r'моё имя (\w+)',
-            r'мое имя (\w+)',
-            r'можешь называть меня (\w+)',
-            r'можешь звать меня (\w+)'
-        ]
+        # Профиль и контекст в памяти; общий кэш передаётся, когда сессий много
+        self.state_cache = state_cache or SessionStateCache(self.storage)
     
     def _init_db(self):
         """Инициализация базы данных."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Таблица для сообщений
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS messages (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        human_message TEXT,
-                        ai_message TEXT,
-                        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                # Таблица для пользовательских данных
-                cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS user_preferences (
-                        key TEXT PRIMARY KEY,
-                        value TEXT,
-                        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-                    )
-                ''')
-                
-                conn.commit()
+            migrate_schema(self.storage)
         except Exception as e:
             logging.error(f"Ошибка при инициализации БД: {str(e)}")
     
-    def add_interaction(self, human_message: str, ai_message: str):
-        """Добавляет взаимодействие в базу данных."""
+    def add_interaction(self, human_message: str, ai_message: str, fallback: bool = False):
+        """Добавляет взаимодействие в очередь записи в базу данных.
+
+        ``fallback`` отмечает ход, на который модель не ответила и Мика
+        ответила заготовленной фразой.
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    'INSERT INTO messages (human_message, ai_message) VALUES (?, ?)',
-                    (human_message, ai_message)
-                )
-                conn.commit()
+            self.storage.submit(
+                _INSERT_MESSAGE_SQL,
+                (self.session_id, self.user_id, human_message, ai_message, int(fallback))
+            )
         except Exception as e:
             logging.error(f"Ошибка при сохранении взаимодействия: {str(e)}")
     
     def get_recent_messages(self, limit: int = 5) -> List[Dict[str, str]]:
-        """Получает последние сообщения из базы данных."""
+        """Получает последние сообщения текущей сессии и её пользователя из базы данных."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    'SELECT human_message, ai_message FROM messages ORDER BY timestamp DESC LIMIT ?',
-                    (limit,)
-                )
-                messages = []
-                for human_msg, ai_msg in cursor.fetchall():
-                    messages.extend([
-                        {'role': 'user', 'content': human_msg},
-                        {'role': 'assistant', 'content': ai_msg}
-                    ])
-                return messages[::-1]  # Возвращаем в хронологическом порядке
+            rows = self.storage.query(_RECENT_MESSAGES_SQL, (self.session_id, self.user_id, limit))
+            messages = []
+            # Возвращаем в хронологическом порядке
+            for human_msg, ai_msg in reversed(rows):
+                messages.extend([
+                    {'role': 'user', 'content': human_msg},
+                    {'role': 'assistant', 'content': ai_msg}
+                ])
+            return messages
         except Exception as e:
             logging.error(f"Ошибка при получении сообщений: {str(e)}")
             return []
     
-    def clear_old_messages(self, days: int = 7):
-        """Удаляет старые сообщения из базы данных."""
+    def clear_old_messages(self, days: Optional[int] = None, batch_size: int = 1000,
+                           max_batches: Optional[int] = None, vacuum_pages: int = 256) -> int:
+        """Удаляет сообщения старше ``days`` дней пачками и возвращает число удалённых.
+
+        По умолчанию ``days`` — срок хранения ``retention_days``; если он не
+        задан, история не удаляется, чистятся только снимки контекста сессий,
+        которые уже не восстанавливаются. Каждая пачка удаляется в отдельной транзакции, поэтому запись и чтение
+        не блокируются на всё время очистки. ``max_batches`` ограничивает объём
+        работы за вызов: оставшееся удалится при следующих вызовах. После
+        очистки освобождается не более ``vacuum_pages`` страниц.
+        """
+        days = days if days is not None else self.retention_days
+        deleted = 0
+        batches = 0
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    'DELETE FROM messages WHERE timestamp < datetime("now", ?)',
-                    (f'-{days} days',)
-                )
-                conn.commit()
+            self.storage.execute(_DELETE_OLD_STATES_SQL, (f'-{int(self.state_cache.max_age)} seconds',))
+            while days and (max_batches is None or batches < max_batches):
+                count = self.storage.execute(_DELETE_OLD_MESSAGES_SQL, (f'-{days} days', batch_size))
+                deleted += count
+                batches += 1
+                if count < batch_size:
+                    break
+            if deleted:
+                self.storage.incremental_vacuum(vacuum_pages)
         except Exception as e:
             logging.error(f"Ошибка при очистке старых сообщений: {str(e)}")
+        return deleted
     
+    def search(
+        self,
+        query: str,
+        user_id: Optional[str] = None,
+        session_id: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+        raw: bool = False,
+        highlight: Tuple[str, str] = ('[', ']'),
+        snippet_words: int = 12
+    ) -> Dict[str, Any]:
+        """Ищет по истории всех пользователей (или одного) через индекс FTS5.
+
+        Результаты упорядочены по релевантности (bm25), страница задаётся
+        ``limit`` и ``offset``. Для каждого сообщения возвращаются фрагменты
+        реплик с подсвеченными словами запроса. ``raw`` передаёт запрос
+        в FTS5 как есть (операторы OR, NOT, NEAR, фразы в кавычках).
+        Возвращает ``{'total': всего совпадений, 'results': [...]}``.
+        """
+        match = query if raw else search_query(query)
+        if not match:
+            return {'total': 0, 'results': []}
+        conditions, params = _filters(user_id, session_id, since, until, 'm.')
+        where = ' AND '.join(['messages_fts MATCH ?', *conditions])
+        start, end = highlight
+        try:
+            rows = self.storage.query(_SEARCH_SQL.format(conditions=where), (
+                start, end, snippet_words, start, end, snippet_words,
+                match, *params, limit, offset
+            ))
+            if len(rows) < limit and (rows or not offset):
+                # Неполная страница — последняя, отдельный подсчёт не нужен
+                total = offset + len(rows)
+            else:
+                total = self.storage.query_one(_SEARCH_COUNT_SQL.format(conditions=where), (match, *params))[0]
+        except sqlite3.OperationalError as e:
+            logging.error(f"Ошибка в поисковом запросе {query!r}: {str(e)}")
+            return {'total': 0, 'results': []}
+        results = [
+            {
+                'id': message_id,
+                'session_id': session,
+                'user_id': user,
+                'timestamp': timestamp,
+                'human_message': human_snippet,
+                'ai_message': ai_snippet,
+                'rank': rank,
+            }
+            for message_id, session, user, timestamp, human_snippet, ai_snippet, rank in rows
+        ]
+        return {'total': total, 'results': results}
+
+    def get_statistics(self, days: int = 30, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Сводка по истории за последние ``days`` дней, посчитанная в SQL.
+
+        Число сообщений, сессий, пользователей и доля ходов с запасным
+        ответом — всего и по дням.
+        """
+        conditions, params = _filters(user_id, None, None, None)
+        conditions.insert(0, "timestamp >= datetime('now', ?)")
+        params.insert(0, f'-{int(days)} days')
+        where = ' AND '.join(conditions)
+        try:
+            total, fallbacks, sessions, users = self.storage.query_one(
+                _TOTAL_STATS_SQL.format(conditions=where), params
+            )
+            daily = self.storage.query(_DAILY_STATS_SQL.format(conditions=where), params)
+        except Exception as e:
+            logging.error(f"Ошибка при подсчёте статистики: {str(e)}")
+            return {}
+        return {
+            'messages': total,
+            'sessions': sessions,
+            'users': users,
+            'fallbacks': fallbacks,
+            'fallback_rate': fallbacks / total if total else 0.0,
+            'per_day': [
+                {
+                    'day': day,
+                    'messages': count,
+                    'sessions': day_sessions,
+                    'fallbacks': day_fallbacks,
+                    'fallback_rate': day_fallbacks / count,
+                }
+                for day, count, day_fallbacks, day_sessions in daily
+            ],
+        }
+
     def update_user_preferences(self, preferences: Dict[str, Any]):
         """Обновляет пользовательские настройки."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                for key, value in preferences.items():
-                    cursor.execute(
-                        '''INSERT OR REPLACE INTO user_preferences (key, value, timestamp)
-                           VALUES (?, ?, CURRENT_TIMESTAMP)''',
-                        (key, json.dumps(value))
-                    )
-                conn.commit()
+            self.state_cache.update_preferences(self.user_id, preferences)
         except Exception as e:
             logging.error(f"Ошибка при обновлении настроек: {str(e)}")
     
     def get_user_preferences(self) -> Dict[str, Any]:
-        """Получает пользовательские настройки."""
+        """Получает пользовательские настройки (из памяти после первого чтения)."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT key, value FROM user_preferences')
-                return {key: json.loads(value) for key, value in cursor.fetchall()}
+            return self.state_cache.preferences(self.user_id)
         except Exception as e:
             logging.error(f"Ошибка при получении настроек: {str(e)}")
             return {}
     
+    def load_state(self) -> Optional[Dict[str, Any]]:
+        """Возвращает сохранённый контекст сессии, если он ещё не устарел."""
+        try:
+            return self.state_cache.load_state(self.session_id, self.user_id)
+        except Exception as e:
+            logging.error(f"Ошибка при загрузке состояния сессии: {str(e)}")
+            return None
+    
+    def save_state(self, state: Dict[str, Any]):
+        """Сохраняет контекст сессии (запись в базу отложенная)."""
+        try:
+            self.state_cache.save_state(self.session_id, self.user_id, state)
+        except Exception as e:
+            logging.error(f"Ошибка при сохранении состояния сессии: {str(e)}")
+    
+    def invalidate_cache(self):
+        """Сбрасывает профиль и контекст этой сессии в памяти; следующее чтение пойдёт в базу."""
+        self.state_cache.invalidate(user_id=self.user_id, session_id=self.session_id)
+    
+    def flush(self):
+        """Дописывает в базу все отложенные записи."""
+        self.storage.flush()
+    
+    def close(self):
+        """Дописывает отложенные записи и закрывает хранилище."""
+        self.storage.close()
+    
+    def analyze_message(self, message: str) -> MessageAnalysis:
+        """Анализирует сообщение один раз; повторные вызовы берутся из кэша."""
+        return self.analyzer.analyze(message)
+    
     def process_message(self, message: str) -> Dict[str, Any]:
         """Обрабатывает сообщение и возвращает информацию о нём."""
-        result = {
-            'requires_name_confirmation': False,
-            'name': None,
-            'requires_wiki': False,
-            'wiki_info': None,
-            'sentiment': {'polarity': 0, 'subjectivity': 0},
-            'keywords': []
-        }
-        
-        # Проверяем, спрашивает ли пользователь имя Мики
-        if re.search(r'как\s+тебя\s+зовут', message.lower()):
-            result['is_mika_name_question'] = True
-            return result
-        
-        # Проверяем, представляется ли пользователь
-        for pattern in self.name_patterns:
-            match = re.search(pattern, message.lower())
-            if match:
-                name = match.group(1)
-                # Проверяем длину имени и наличие недопустимых символов
-                if 2 <= len(name) <= 20 and re.match(r'^[а-яА-ЯёЁa-zA-Z]+$', name):
-                    result['requires_name_confirmation'] = True
-                    result['name'] = name.capitalize()
-                break
-        
-        # Проверяем, нужна ли информация из Wikipedia
-        wiki_triggers = {'что такое', 'кто такой', 'расскажи о', 'расскажи про'}
-        message_lower = message.lower()
-        for trigger in wiki_triggers:
-            if trigger in message_lower:
-                # Извлекаем тему после триггера
-                topic = message_lower.split(trigger)[-1].strip()
-                if topic:
-                    result['requires_wiki'] = True
-                    # Здесь можно добавить получение информации из Wikipedia
-                break
-        
-        return result 
\ No newline at end of file
+        return self.analyze_message(message).to_dict()
@@ -0,0 +1,52 @@
+import logging
+import threading
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+log = logging.getLogger("mika")
+
+DEFAULT_MODEL = 'paraphrase-multilingual-MiniLM-L12-v2'
+
+
+class Embedder:
+    """Векторы предложений через sentence-transformers с отложенной загрузкой модели.
+
+    Модель загружается при первом вызове ``encode``. Векторы нормированы,
+    поэтому косинусная близость — это скалярное произведение.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_MODEL, device: Optional[str] = None, batch_size: int = 32):
+        self.model_name = model_name
+        self.device = device
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def dimension(self) -> int:
+        return self._get_model().get_sentence_embedding_dimension()
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        """Возвращает матрицу float32 (len(texts), dimension) нормированных векторов."""
+        model = self._get_model()
+        vectors = model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+    def encode_one(self, text: str) -> np.ndarray:
+        return self.encode([text])[0]
+
+    def _get_model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    log.info(f"Загружаем модель эмбеддингов {self.model_name}")
+                    self._model = SentenceTransformer(self.model_name, device=self.device)
+        return self._model
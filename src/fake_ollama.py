@@ -0,0 +1,212 @@
+"""
+Локальный имитатор Ollama для нагрузочных проверок без модели и сети.
+
+Отдаёт потоковые ответы NDJSON на /api/generate и /api/chat с заданной
+скоростью токенов, задержкой до первого токена и долей ошибок.
+
+Запуск: python -m src.fake_ollama --port 11434 --rate 40 --latency 0.3 --error-rate 0.01
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+WORDS = (
+    'Привет', 'как', 'здорово', 'что', 'ты', 'спросил', 'об', 'этом', 'мне', 'очень', 'интересно',
+    'давай', 'поговорим', 'подробнее', 'я', 'думаю', 'это', 'отличная', 'идея', 'расскажи', 'ещё',
+)
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """HTTP-сервер с параметрами имитации; запускается в фоновом потоке через ``start()``."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int] = ('127.0.0.1', 0),
+        rate: float = 40.0,
+        latency: float = 0.3,
+        jitter: float = 0.1,
+        tokens: Tuple[int, int] = (20, 60),
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+        record: bool = False
+    ):
+        super().__init__(address, _Handler)
+        self.rate = rate
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens = tokens
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop_lock = threading.Lock()
+        self._stopped = False
+        self.requests = 0
+        self.aborted = 0
+        # Тела POST-запросов байт в байт, если включена запись (для проверок в тестах)
+        self.record = record
+        self.payloads: List[bytes] = []
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeOllamaServer':
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-ollama', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Останавливает сервер и закрывает сокет; повторный вызов ничего не делает."""
+        with self._stop_lock:
+            if self._stopped:
+                return
+            self._stopped = True
+        # shutdown() ждёт цикл serve_forever и без запущенного потока завис бы
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        # Клиенты рвут соединения, прерывая генерацию; это не ошибка имитатора
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def plan(self) -> Dict[str, float]:
+        """Параметры очередного ответа: задержка, длина и момент ошибки."""
+        with self._rng_lock:
+            self.requests += 1
+            length = self.rng.randint(*self.tokens)
+            fail = self.rng.random() < self.error_rate
+            return {
+                'latency': max(0.0, self.rng.gauss(self.latency, self.jitter)),
+                'length': length,
+                # Ошибка до начала ответа или посреди потока
+                'fail_at': self.rng.randint(0, length) if fail else -1,
+                'words': [self.rng.choice(WORDS) for _ in range(length)],
+            }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: FakeOllamaServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/api/version':
+            self._send_json(200, {'version': 'fake'})
+        elif self.path == '/api/tags':
+            self._send_json(200, {'models': [{'name': 'marco-o1'}]})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        if self.server.record:
+            self.server.payloads.append(body)
+        request = json.loads(body or b'{}')
+        if self.path not in ('/api/generate', '/api/chat'):
+            self._send_json(404, {'error': 'not found'})
+            return
+
+        if 'prompt' not in request and 'messages' not in request:
+            # Запрос без промпта только загружает модель
+            self._send_json(200, {'model': request.get('model', 'fake'), 'response': '', 'done': True, 'done_reason': 'load'})
+            return
+
+        plan = self.server.plan()
+        if plan['fail_at'] == 0:
+            self._send_json(500, {'error': 'fake failure'})
+            return
+
+        chat = self.path == '/api/chat'
+        model = request.get('model', 'fake')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        started = time.perf_counter()
+        try:
+            time.sleep(plan['latency'])
+            interval = 1.0 / self.server.rate if self.server.rate > 0 else 0.0
+            for index, word in enumerate(plan['words']):
+                if index == plan['fail_at']:
+                    self._write_line({'error': 'fake failure mid-stream'})
+                    break
+                text = word if index == 0 else ' ' + word
+                self._write_line(self._message(model, chat, text, done=False))
+                if interval:
+                    time.sleep(interval)
+            else:
+                final = self._message(model, chat, '', done=True)
+                final['eval_count'] = plan['length']
+                final['eval_duration'] = int((time.perf_counter() - started - plan['latency']) * 1e9) or 1
+                self._write_line(final)
+            self.wfile.write(b'0\r\n\r\n')
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент оборвал поток: генерация прекращается, как в Ollama
+            self.server.aborted += 1
+            self.close_connection = True
+
+    @staticmethod
+    def _message(model: str, chat: bool, text: str, done: bool) -> Dict:
+        if chat:
+            return {'model': model, 'message': {'role': 'assistant', 'content': text}, 'done': done}
+        return {'model': model, 'response': text, 'done': done}
+
+    def _write_line(self, payload: Dict):
+        data = (json.dumps(payload, ensure_ascii=False) + '\n').encode('utf-8')
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Имитатор Ollama')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--rate', type=float, default=40.0, help='токенов в секунду на поток')
+    parser.add_argument('--latency', type=float, default=0.3, help='средняя задержка до первого токена, с')
+    parser.add_argument('--jitter', type=float, default=0.1, help='разброс задержки, с')
+    parser.add_argument('--min-tokens', type=int, default=20)
+    parser.add_argument('--max-tokens', type=int, default=60)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ответов с ошибкой')
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(
+        (args.host, args.port), rate=args.rate, latency=args.latency, jitter=args.jitter,
+        tokens=(args.min_tokens, args.max_tokens), error_rate=args.error_rate
+    )
+    print(f"Имитатор Ollama слушает {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,424 @@
+"""
+История диалогов: перенос старых баз в одну и потоковое чтение с выгрузкой.
+
+Раньше история жила в трёх файлах: mika.db (пользователи, факты, диалоги),
+dialogs.db (диалоги без пользователей) и mika_data.db (схема DialogManager).
+Перенос дописывает старые таблицы в схему DialogManager; уже перенесённое
+запоминается, поэтому повторный запуск догружает только новые строки.
+Источник узнаётся по содержимому (отпечатку первой строки таблицы), а не по
+пути, так что перемещённая или скопированная база не переносится заново.
+
+Чтение идёт страницами по первичному ключу (WHERE id > ? ORDER BY id LIMIT ?),
+так что ни выгрузка, ни аналитика не держат в памяти всю таблицу.
+
+    python -m src.history consolidate --target mika_data.db --sources mika.db dialogs.db --compact
+    python -m src.history export history.jsonl.gz --db mika_data.db --keywords
+    python -m src.history export history.parquet --db mika_data.db --user default
+    python -m src.history search "котик" --db mika_data.db --user default
+    python -m src.history stats --db mika_data.db --days 30
+    python -m src.history compact --db mika_data.db
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import sqlite3
+from itertools import tee
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from .dialog_manager import (
+    DEFAULT_SESSION_ID, DEFAULT_USER_ID, FALLBACK_RESPONSES, DialogManager, migrate_schema, retention_days_from_env
+)
+from .storage import Storage
+
+log = logging.getLogger("mika")
+
+LEGACY_SOURCES = ('mika.db', 'dialogs.db')
+
+_INSERT_SQL = '''INSERT INTO messages (session_id, user_id, human_message, ai_message, timestamp, fallback)
+                 VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?)'''
+_IMPORTED_SQL = 'SELECT last_id FROM history_imports WHERE source = ? AND source_table = ?'
+_SAVE_IMPORTED_SQL = '''INSERT INTO history_imports (source, source_table, last_id, imported) VALUES (?, ?, ?, ?)
+                        ON CONFLICT (source, source_table)
+                        DO UPDATE SET last_id = excluded.last_id, imported = imported + excluded.imported'''
+_COUNT_EXPIRING_SQL = "SELECT COUNT(*) FROM messages WHERE timestamp < datetime('now', ?)"
+_INSERT_PREFERENCE_SQL = '''INSERT OR IGNORE INTO user_preferences (user_id, key, value, timestamp)
+                            VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))'''
+
+# Поля сообщения в порядке выгрузки
+FIELDS = ('id', 'session_id', 'user_id', 'human_message', 'ai_message', 'timestamp')
+
+
+class HistoryRow(NamedTuple):
+    id: int
+    session_id: str
+    user_id: str
+    human_message: str
+    ai_message: str
+    timestamp: str
+
+
+def iter_messages(
+    storage: Storage,
+    user_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    since: Optional[str] = None,
+    after_id: int = 0,
+    page_size: int = 1000
+) -> Iterator[HistoryRow]:
+    """Отдаёт сообщения по возрастанию id, читая базу страницами по ``page_size``.
+
+    Между страницами соединение свободно, поэтому долгая выгрузка не мешает
+    работающему серверу; строки, дописанные во время чтения, тоже попадут
+    в выборку. ``since`` — нижняя граница времени в формате SQLite.
+    """
+    conditions = ['id > ?']
+    params: List[Any] = []
+    for column, value in (('user_id', user_id), ('session_id', session_id)):
+        if value is not None:
+            conditions.append(f'{column} = ?')
+            params.append(value)
+    if since is not None:
+        conditions.append('timestamp >= ?')
+        params.append(since)
+    sql = (f"SELECT {', '.join(FIELDS)} FROM messages WHERE {' AND '.join(conditions)} "
+           f"ORDER BY id LIMIT {int(page_size)}")
+
+    last_id = after_id
+    while True:
+        rows = storage.query(sql, [last_id, *params])
+        for row in rows:
+            yield HistoryRow(*row)
+        if len(rows) < page_size:
+            return
+        last_id = rows[-1][0]
+
+
+def consolidate(
+    target: Union[str, Path] = 'mika_data.db',
+    sources: Sequence[Union[str, Path]] = LEGACY_SOURCES,
+    user_id: str = DEFAULT_USER_ID,
+    page_size: int = 1000,
+    compact: bool = False
+) -> Dict[str, int]:
+    """Переносит диалоги и сведения о пользователях из старых баз в ``target``.
+
+    Источники открываются только на чтение. Диалоги без пользователя
+    (dialogs.db, mika_data.db старой схемы) приписываются ``user_id`` и сессии
+    по умолчанию, пользователи mika.db получают id вида ``mika.db:<id>``.
+    Возвращает число перенесённых сообщений по источникам.
+    """
+    target = Path(target)
+    storage = Storage(target)
+    report: Dict[str, int] = {}
+    try:
+        migrate_schema(storage)
+        for source in sources:
+            path = Path(source)
+            if not path.exists():
+                log.info(f"База {path} не найдена, пропускаем")
+                continue
+            if path.resolve() == target.resolve():
+                continue
+            report[str(path)] = _import_source(storage, path, user_id, page_size)
+        _warn_retention(storage)
+        if compact:
+            storage.compact()
+    finally:
+        storage.close()
+    return report
+
+
+def _warn_retention(storage: Storage):
+    """Перенесённые диалоги сохраняют исходное время и могут попасть под срок хранения."""
+    days = retention_days_from_env()
+    if not days:
+        return
+    expiring = storage.query_one(_COUNT_EXPIRING_SQL, (f'-{days} days',))[0]
+    if expiring:
+        log.warning(
+            f"В базе {expiring} сообщений старше {days} дней: при MIKA_RETENTION_DAYS={days} "
+            f"Мика удалит их при следующих запусках. Чтобы сохранить историю, уберите переменную "
+            f"или увеличьте срок."
+        )
+
+
+def _import_source(storage: Storage, path: Path, user_id: str, page_size: int) -> int:
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    imported = 0
+    try:
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table in ('dialogs', 'messages'):
+            if table in tables:
+                imported += _import_dialogs(storage, conn, path, table, user_id, page_size)
+        if 'users' in tables:
+            _import_users(storage, conn, path.name, tables)
+        if 'user_info' in tables:
+            # Единственная запись с именем; уже известное имя не перезаписываем
+            row = conn.execute('SELECT name, last_updated FROM user_info ORDER BY id DESC LIMIT 1').fetchone()
+            if row and row[0]:
+                storage.execute(_INSERT_PREFERENCE_SQL, (user_id, 'name', json.dumps(row[0]), row[1]))
+    finally:
+        conn.close()
+    log.info(f"Из {path} перенесено сообщений: {imported}")
+    return imported
+
+
+def _source_key(conn: sqlite3.Connection, table: str) -> Optional[str]:
+    """Отпечаток таблицы источника: хэш её первой строки.
+
+    Старые таблицы только дописываются, поэтому первая строка не меняется ни
+    при новых диалогах, ни при переносе файла; у пустой таблицы отпечатка нет.
+    """
+    row = conn.execute(f'SELECT id, human_message, ai_message, timestamp FROM {table} ORDER BY id LIMIT 1').fetchone()
+    if row is None:
+        return None
+    digest = hashlib.sha1(json.dumps(row, ensure_ascii=False, default=str).encode('utf-8')).hexdigest()
+    return f'sha1:{digest}'
+
+
+def _import_dialogs(
+    storage: Storage,
+    conn: sqlite3.Connection,
+    path: Path,
+    table: str,
+    user_id: str,
+    page_size: int
+) -> int:
+    source = _source_key(conn, table)
+    if source is None:
+        return 0
+    source_name = path.name
+    columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+    # Разные версии схемы: недостающие столбцы читаем как NULL
+    select = ', '.join(c if c in columns else 'NULL' for c in ('session_id', 'user_id'))
+    # datetime() приводит ISO-время mika.db к формату, с которым сравнивает очистка
+    sql = (f'SELECT id, {select}, human_message, ai_message, datetime(timestamp) FROM {table} '
+           f'WHERE id > ? ORDER BY id LIMIT ?')
+    row = storage.query_one(_IMPORTED_SQL, (source, table))
+    if row is None:
+        # Переносы прежних версий запоминали источник по абсолютному пути
+        row = storage.query_one(_IMPORTED_SQL, (str(path.resolve()), table))
+    last_id = row[0] if row else 0
+    legacy_users = 'session_id' not in columns and 'user_id' in columns
+
+    imported = 0
+    while True:
+        rows = conn.execute(sql, (last_id, page_size)).fetchall()
+        if not rows:
+            break
+        batch = []
+        for _, session, user, human, ai, timestamp in rows:
+            if not human and not ai:
+                continue
+            if legacy_users and user is not None:
+                # Числовые id пользователей mika.db уникальны только внутри файла
+                user = session = f'{source_name}:{user}'
+            batch.append((
+                session or DEFAULT_SESSION_ID, str(user) if user is not None else user_id,
+                human or '', ai or '', timestamp, int(ai in FALLBACK_RESPONSES)
+            ))
+        last_id = rows[-1][0]
+        # Строки и отметка о переносе фиксируются вместе: прерванный перенос не задвоит историю
+        with storage.transaction() as target:
+            target.executemany(_INSERT_SQL, batch)
+            target.execute(_SAVE_IMPORTED_SQL, (source, table, last_id, len(batch)))
+        imported += len(batch)
+        if len(rows) < page_size:
+            break
+    return imported
+
+
+def _import_users(storage: Storage, conn: sqlite3.Connection, source_name: str, tables: Iterable[str]):
+    """Имена, факты и интересы пользователей mika.db становятся их настройками."""
+    preferences: List[Tuple[str, str, str, Optional[str]]] = []
+    for user, name, seen in conn.execute('SELECT id, name, last_interaction FROM users'):
+        if name:
+            preferences.append((f'{source_name}:{user}', 'name', json.dumps(name), seen))
+    for table, column in (('facts', 'fact'), ('interests', 'interest')):
+        if table not in tables:
+            continue
+        values: Dict[int, List[str]] = {}
+        for user, value in conn.execute(f'SELECT user_id, {column} FROM {table} ORDER BY id'):
+            values.setdefault(user, []).append(value)
+        for user, items in values.items():
+            preferences.append((f'{source_name}:{user}', table, json.dumps(items, ensure_ascii=False), None))
+    if preferences:
+        storage.executemany(_INSERT_PREFERENCE_SQL, preferences)
+
+
+def with_keywords(rows: Iterable[HistoryRow], limit: int = 5, workers: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Добавляет к сообщениям ключевые слова; тексты обрабатываются пулом процессов."""
+    from .text_processor import TextProcessor
+
+    rows, texts = tee(rows)
+    keywords = TextProcessor().extract_keywords_many((row.human_message for row in texts), limit, workers)
+    for row, words in zip(rows, keywords):
+        record = row._asdict()
+        record['keywords'] = words
+        yield record
+
+
+def export(records: Iterable[Union[HistoryRow, Dict[str, Any]]], path: Union[str, Path], batch_rows: int = 10000) -> int:
+    """Пишет записи в JSON Lines (``.jsonl``, ``.jsonl.gz``) или Parquet (``.parquet``).
+
+    Записи пишутся по мере поступления; для Parquet в памяти копится не больше
+    ``batch_rows`` строк (одна группа строк файла). Возвращает число записей.
+    """
+    path = Path(path)
+    if path.suffix == '.parquet':
+        return _export_parquet(records, path, batch_rows)
+    opener = gzip.open if path.suffix == '.gz' else open
+    count = 0
+    with opener(path, 'wt', encoding='utf-8') as f:
+        for record in records:
+            if isinstance(record, tuple):
+                record = record._asdict()
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write('\n')
+            count += 1
+    return count
+
+
+def _export_parquet(records: Iterable[Union[HistoryRow, Dict[str, Any]]], path: Path, batch_rows: int) -> int:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError(f"Для выгрузки в Parquet нужен pyarrow (pip install pyarrow): {str(e)}")
+
+    writer = None
+    batch: List[Dict[str, Any]] = []
+    count = 0
+    try:
+        for record in records:
+            batch.append(record._asdict() if isinstance(record, tuple) else record)
+            if len(batch) >= batch_rows:
+                table = pa.Table.from_pylist(batch)
+                writer = writer or pq.ParquetWriter(path, table.schema, compression='zstd')
+                writer.write_table(table)
+                count += len(batch)
+                batch = []
+        if batch or writer is None:
+            table = pa.Table.from_pylist(batch)
+            writer = writer or pq.ParquetWriter(path, table.schema, compression='zstd')
+            writer.write_table(table)
+            count += len(batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='История диалогов Мики')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    merge = subparsers.add_parser('consolidate', help='перенести старые базы в одну')
+    merge.add_argument('--target', default='mika_data.db', help='итоговая база (схема DialogManager)')
+    merge.add_argument('--sources', nargs='+', default=list(LEGACY_SOURCES), help='старые базы')
+    merge.add_argument('--user', default=DEFAULT_USER_ID, help='кому приписать диалоги без пользователя')
+    merge.add_argument('--page-size', type=int, default=1000)
+    merge.add_argument('--compact', action='store_true', help='пересобрать файл базы после переноса')
+
+    dump = subparsers.add_parser('export', help='выгрузить сообщения в JSON Lines или Parquet')
+    dump.add_argument('output', help='файл .jsonl, .jsonl.gz или .parquet')
+    dump.add_argument('--db', default='mika_data.db')
+    dump.add_argument('--user', help='только сообщения пользователя')
+    dump.add_argument('--session', help='только сообщения сессии')
+    dump.add_argument('--since', help='не раньше момента, например 2024-12-01')
+    dump.add_argument('--page-size', type=int, default=1000)
+    dump.add_argument('--keywords', action='store_true', help='добавить ключевые слова сообщений')
+    dump.add_argument('--workers', type=int, help='процессов для ключевых слов')
+
+    find = subparsers.add_parser('search', help='полнотекстовый поиск по сообщениям')
+    find.add_argument('query', help='слова для поиска')
+    find.add_argument('--db', default='mika_data.db')
+    find.add_argument('--user', help='только сообщения пользователя')
+    find.add_argument('--session', help='только сообщения сессии')
+    find.add_argument('--since', help='не раньше момента, например 2024-12-01')
+    find.add_argument('--until', help='раньше момента')
+    find.add_argument('--limit', type=int, default=20, help='результатов на странице')
+    find.add_argument('--page', type=int, default=1, help='номер страницы')
+    find.add_argument('--raw', action='store_true', help='запрос в синтаксисе FTS5 (OR, NOT, NEAR, "фраза")')
+
+    stats = subparsers.add_parser('stats', help='сообщения по дням и доля запасных ответов')
+    stats.add_argument('--db', default='mika_data.db')
+    stats.add_argument('--user', help='только сообщения пользователя')
+    stats.add_argument('--days', type=int, default=30)
+    stats.add_argument('--json', action='store_true', help='вывести результат в JSON')
+
+    pack = subparsers.add_parser(
+        'compact', help='пересобрать файл базы (VACUUM) и включить возврат места после очистки'
+    )
+    pack.add_argument('--db', default='mika_data.db')
+    args = parser.parse_args()
+
+    if args.command == 'consolidate':
+        report = consolidate(args.target, args.sources, args.user, args.page_size, args.compact)
+        for source, count in report.items():
+            print(f"{source}: перенесено сообщений {count}")
+        return
+
+    if not Path(args.db).exists():
+        parser.error(f"база {args.db} не найдена")
+    if args.command in ('search', 'stats'):
+        _report(args)
+        return
+    if args.command == 'compact':
+        storage = Storage(args.db)
+        try:
+            migrate_schema(storage)
+            storage.compact()
+        finally:
+            storage.close()
+        print(f"База {args.db} пересобрана")
+        return
+    storage = Storage(args.db)
+    try:
+        migrate_schema(storage)
+        records: Iterable = iter_messages(storage, args.user, args.session, args.since, page_size=args.page_size)
+        if args.keywords:
+            records = with_keywords(records, workers=args.workers)
+        try:
+            count = export(records, args.output)
+        except RuntimeError as e:
+            parser.error(str(e))
+        print(f"Выгружено сообщений: {count}")
+    finally:
+        storage.close()
+
+
+def _report(args: argparse.Namespace):
+    manager = DialogManager(args.db)
+    try:
+        if args.command == 'search':
+            found = manager.search(
+                args.query, user_id=args.user, session_id=args.session, since=args.since, until=args.until,
+                limit=args.limit, offset=(args.page - 1) * args.limit, raw=args.raw
+            )
+            print(f"Найдено сообщений: {found['total']}")
+            for result in found['results']:
+                print(f"\n#{result['id']} {result['timestamp']} {result['user_id']}/{result['session_id']}")
+                print(f"  Пользователь: {result['human_message']}")
+                print(f"  Мика: {result['ai_message']}")
+            return
+        summary = manager.get_statistics(args.days, args.user)
+        if args.json:
+            print(json.dumps(summary, ensure_ascii=False, indent=2))
+            return
+        if not summary:
+            return
+        print(f"{'день':12} {'сообщений':>10} {'сессий':>8} {'запасных':>9}")
+        for day in summary['per_day']:
+            print(f"{day['day']:12} {day['messages']:10} {day['sessions']:8} {day['fallback_rate']:9.1%}")
+        print(f"{'всего':12} {summary['messages']:10} {summary['sessions']:8} {summary['fallback_rate']:9.1%}")
+    finally:
+        manager.close()
+
+
+if __name__ == '__main__':
+    main()
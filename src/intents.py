@@ -0,0 +1,174 @@
+"""
+Маршрутизация сообщений по намерениям.
+
+Намерения описываются таблицей фраз и один раз компилируются в автомат
+Ахо — Корасик над словами. Сообщение разбивается на слова одним регулярным
+выражением и проходится автоматом за один проход, поэтому стоимость
+разбора зависит от длины сообщения, а не от числа фраз в таблице.
+
+Фразы совпадают только целыми словами: «нет» не находится внутри
+«интернет», а «не могу» — внутри «не могут». Раньше фразы искались подстрокой,
+и чтобы не потерять словоформы, на которые полагались пользователи, слово
+фразы может оканчиваться на ``*``: «тест*» совпадает с любым словом,
+начинающимся на «тест» («тест», «тестирование», «тестирую»). Если слово
+сообщения есть в таблице целиком, оно сопоставляется как точная форма,
+а не по основе.
+"""
+
+import re
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+# Что забрать после найденной фразы
+SLOT_NONE = None
+SLOT_WORD = 'word'    # следующее слово (имя)
+SLOT_REST = 'rest'    # весь оставшийся текст (тема)
+
+INTENT_CREATOR = 'creator'
+INTENT_MIKA_NAME = 'mika_name'
+INTENT_NEGATIVE = 'negative'
+INTENT_TEST = 'test'
+INTENT_INTRODUCTION = 'introduction'
+INTENT_WIKI = 'wiki'
+
+
+class Intent(NamedTuple):
+    name: str
+    phrases: Tuple[str, ...]
+    slot: Optional[str] = SLOT_NONE
+
+
+class IntentMatch(NamedTuple):
+    intent: str
+    phrase: str
+    # Порядковый номер фразы в таблице: меньше — приоритетнее
+    rank: int
+    start: int
+    end: int
+    slot: Optional[str]
+
+
+DEFAULT_INTENTS: Tuple[Intent, ...] = (
+    Intent(INTENT_CREATOR, ('я твой создатель', 'я тебя создал*', 'я разработал* тебя')),
+    Intent(INTENT_MIKA_NAME, ('как тебя зовут',)),
+    Intent(INTENT_NEGATIVE, (
+        'не хочу', 'не хочется', 'не буду', 'не могу', 'не скажу', 'отстан*', 'нет', 'нету'
+    )),
+    Intent(INTENT_TEST, ('тест*', 'протестир*', 'проверяю', 'проверк*')),
+    Intent(INTENT_INTRODUCTION, (
+        'меня зовут', 'я', 'моё имя', 'мое имя', 'можешь называть меня', 'можешь звать меня'
+    ), SLOT_WORD),
+    Intent(INTENT_WIKI, ('что такое', 'кто такой', 'расскажи о', 'расскажи обо', 'расскажи про'), SLOT_REST),
+)
+
+# Слова и знаки препинания; знак между словами разрывает фразу
+_TOKEN_RE = re.compile(r'\w+|[^\w\s]+')
+# Слова фразы в таблице; «тест*» — совпадение по началу слова
+_PHRASE_TOKEN_RE = re.compile(r'\w+\*?|[^\w\s]+')
+
+
+class _Node:
+    __slots__ = ('next', 'fail', 'out')
+
+    def __init__(self):
+        self.next: Dict[str, '_Node'] = {}
+        self.fail: Optional['_Node'] = None
+        # (номер фразы, длина фразы в словах)
+        self.out: List[Tuple[int, int]] = []
+
+
+class IntentRouter:
+    """Находит все намерения сообщения за один проход по его словам."""
+
+    def __init__(self, intents: Iterable[Intent] = DEFAULT_INTENTS):
+        self.intents = tuple(intents)
+        # номер фразы -> (намерение, фраза, слот)
+        self._phrases: List[Tuple[str, str, Optional[str]]] = []
+        self._root = _Node()
+        # Слова фраз целиком и основы слов с «*»
+        self._words: Set[str] = set()
+        self._prefixes: Set[str] = set()
+        for intent in self.intents:
+            for phrase in intent.phrases:
+                self._add(intent, phrase)
+        self._build_links()
+        self._prefix_lengths = sorted({len(p) for p in self._prefixes}, reverse=True)
+
+    def match(self, text: str) -> List[IntentMatch]:
+        """Возвращает все совпадения в порядке появления в тексте."""
+        text_lower = text.lower()
+        tokens = [(m.group(), m.start(), m.end()) for m in _TOKEN_RE.finditer(text_lower)]
+        matches: List[IntentMatch] = []
+        node = self._root
+        for index, (word, _, end) in enumerate(tokens):
+            key = self._key(word)
+            while node is not self._root and key not in node.next:
+                node = node.fail
+            node = node.next.get(key, self._root)
+            for rank, length in node.out:
+                name, phrase, slot_kind = self._phrases[rank]
+                start = tokens[index - length + 1][1]
+                matches.append(IntentMatch(
+                    name, phrase, rank, start, end, self._slot(slot_kind, text_lower, tokens, index)
+                ))
+        matches.sort(key=lambda m: (m.start, m.rank))
+        return matches
+
+    def first(self, matches: Sequence[IntentMatch], intent: str) -> Optional[IntentMatch]:
+        """Самое приоритетное совпадение намерения: по порядку фраз в таблице."""
+        best = None
+        for match in matches:
+            if match.intent == intent and (best is None or match.rank < best.rank):
+                best = match
+        return best
+
+    def _key(self, word: str) -> str:
+        """Переход автомата для слова: само слово или самая длинная подходящая основа с «*»."""
+        if not self._prefixes or word in self._words:
+            return word
+        for length in self._prefix_lengths:
+            if length <= len(word) and word[:length] in self._prefixes:
+                return word[:length] + '*'
+        return word
+
+    @staticmethod
+    def _slot(kind: Optional[str], text: str, tokens: List[Tuple[str, int, int]], index: int) -> Optional[str]:
+        if kind == SLOT_WORD:
+            if index + 1 < len(tokens):
+                word = tokens[index + 1][0]
+                if word[0].isalnum() or word[0] == '_':
+                    return word
+            return None
+        if kind == SLOT_REST:
+            return text[tokens[index][2]:].strip() or None
+        return None
+
+    def _add(self, intent: Intent, phrase: str):
+        words = _PHRASE_TOKEN_RE.findall(phrase.lower())
+        node = self._root
+        for word in words:
+            if word.endswith('*'):
+                self._prefixes.add(word[:-1])
+            else:
+                self._words.add(word)
+            node = node.next.setdefault(word, _Node())
+        node.out.append((len(self._phrases), len(words)))
+        self._phrases.append((intent.name, phrase, intent.slot))
+
+    def _build_links(self):
+        """Суффиксные ссылки автомата (обход в ширину)."""
+        queue = deque()
+        for child in self._root.next.values():
+            child.fail = self._root
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for word, child in node.next.items():
+                fail = node.fail
+                while fail is not self._root and word not in fail.next:
+                    fail = fail.fail
+                child.fail = fail.next.get(word, self._root)
+                if child.fail is child:
+                    child.fail = self._root
+                child.out = child.out + child.fail.out
+                queue.append(child)
@@ -0,0 +1,224 @@
+"""
+Справочный слой: темы из Wikipedia через постоянный кэш SQLite.
+
+Загрузка локального дампа статей для работы без сети:
+    python -m src.knowledge load extracts.jsonl [--db mika_knowledge.db]
+
+Формат дампа — JSON Lines: {"title": "...", "extract": "..."} в каждой строке.
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Optional, Union
+
+from .storage import Storage
+
+log = logging.getLogger("mika")
+
+SOURCE_WIKI = 'wiki'
+SOURCE_DUMP = 'dump'
+
+_MIGRATIONS = [
+    (1, [
+        '''
+        CREATE TABLE IF NOT EXISTS wiki_cache (
+            topic TEXT PRIMARY KEY,
+            summary TEXT,
+            source TEXT NOT NULL,
+            fetched_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_wiki_cache_access ON wiki_cache (source, last_access)',
+    ]),
+]
+
+_SELECT_SQL = 'SELECT summary, source, fetched_at FROM wiki_cache WHERE topic = ?'
+_TOUCH_SQL = 'UPDATE wiki_cache SET last_access = ? WHERE topic = ?'
+_UPSERT_SQL = '''INSERT OR REPLACE INTO wiki_cache (topic, summary, source, fetched_at, last_access)
+                 VALUES (?, ?, ?, ?, ?)'''
+_COUNT_SQL = 'SELECT COUNT(*) FROM wiki_cache WHERE source = ?'
+_EXISTS_SQL = 'SELECT 1 FROM wiki_cache WHERE topic = ? AND source = ?'
+_EVICT_SQL = f'''DELETE FROM wiki_cache WHERE topic IN (
+                    SELECT topic FROM wiki_cache WHERE source = '{SOURCE_WIKI}'
+                    ORDER BY last_access LIMIT ?)'''
+
+_TOPIC_STRIP_RE = re.compile(r'[^\w\s\-]+')
+
+
+def normalize_topic(topic: str) -> str:
+    """Приводит тему к ключу кэша: нижний регистр, без знаков препинания и лишних пробелов."""
+    return ' '.join(_TOPIC_STRIP_RE.sub(' ', topic.lower()).split())
+
+
+class KnowledgeBase:
+    """Кэширующий справочник с TTL, вытеснением LRU и фоновой предзагрузкой.
+
+    Записи из загруженного дампа не устаревают и не вытесняются. Отсутствующие
+    статьи тоже кэшируются (на ``negative_ttl``), чтобы не запрашивать их снова.
+    Одновременные запросы одной темы объединяются в один поход в сеть.
+    """
+
+    def __init__(
+        self,
+        db_path: Union[str, Path] = 'mika_knowledge.db',
+        fetcher: Optional[Callable[[str], Optional[str]]] = None,
+        ttl: float = 7 * 24 * 3600,
+        negative_ttl: float = 24 * 3600,
+        max_entries: int = 10000,
+        offline: bool = False,
+        workers: int = 4,
+        storage: Optional[Storage] = None
+    ):
+        self.storage = storage or Storage(db_path)
+        self.storage.migrate(_MIGRATIONS)
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.offline = offline or fetcher is None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='knowledge')
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._size = self.storage.query_one(_COUNT_SQL, (SOURCE_WIKI,))[0]
+
+    @classmethod
+    def from_env(cls, fetcher: Optional[Callable[[str], Optional[str]]] = None) -> Optional['KnowledgeBase']:
+        """Включает справочник, если задана переменная MIKA_KNOWLEDGE_DB (путь к кэшу справок)."""
+        path = os.environ.get('MIKA_KNOWLEDGE_DB')
+        if not path:
+            return None
+        return cls(path, fetcher=fetcher)
+
+    def lookup(self, topic: str) -> Optional[str]:
+        """Возвращает справку по теме: из кэша, а при промахе — из сети."""
+        key = normalize_topic(topic)
+        if not key:
+            return None
+
+        found, summary = self._get_cached(key)
+        if found or self.offline:
+            return summary
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+        if not owner:
+            return future.result()
+
+        try:
+            summary = self._fetch(key)
+            future.set_result(summary)
+            return summary
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def prefetch(self, topic: str) -> 'Future[Optional[str]]':
+        """Запускает поиск справки в фоне и сразу возвращает Future."""
+        return self._executor.submit(self._safe_lookup, topic)
+
+    def load_dump(self, path: Union[str, Path]) -> int:
+        """Загружает локальный дамп статей (JSON Lines) и возвращает число записей."""
+        now = time.time()
+        rows = []
+        count = 0
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                item = json.loads(line)
+                key = normalize_topic(item.get('title', ''))
+                if key and item.get('extract'):
+                    rows.append((key, item['extract'], SOURCE_DUMP, now, now))
+                if len(rows) >= 1000:
+                    count += len(rows)
+                    self.storage.executemany(_UPSERT_SQL, rows)
+                    rows = []
+        if rows:
+            count += len(rows)
+            self.storage.executemany(_UPSERT_SQL, rows)
+        # Статьи дампа могли заменить записи из сети
+        with self._lock:
+            self._size = self.storage.query_one(_COUNT_SQL, (SOURCE_WIKI,))[0]
+        return count
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.storage.close()
+
+    def _safe_lookup(self, topic: str) -> Optional[str]:
+        try:
+            return self.lookup(topic)
+        except Exception as e:
+            log.error(f"Ошибка при получении справки по теме '{topic}': {str(e)}")
+            return None
+
+    def _get_cached(self, key: str):
+        """Возвращает (найдено, справка) с учётом срока жизни записи."""
+        row = self.storage.query_one(_SELECT_SQL, (key,))
+        if row is None:
+            return False, None
+        summary, source, fetched_at = row
+        now = time.time()
+        if source != SOURCE_DUMP:
+            ttl = self.ttl if summary is not None else self.negative_ttl
+            if now - fetched_at > ttl and not self.offline:
+                return False, None
+        self.storage.submit(_TOUCH_SQL, (now, key))
+        return True, summary
+
+    def _fetch(self, key: str) -> Optional[str]:
+        summary = self.fetcher(key)
+        now = time.time()
+        # Обновление устаревшей записи заменяет её и не увеличивает размер кэша
+        existed = self.storage.query_one(_EXISTS_SQL, (key, SOURCE_WIKI)) is not None
+        self.storage.submit(_UPSERT_SQL, (key, summary, SOURCE_WIKI, now, now))
+        with self._lock:
+            if not existed:
+                self._size += 1
+            overflow = self._size - self.max_entries
+        if overflow > 0:
+            self._evict(overflow)
+        return summary
+
+    def _evict(self, count: int):
+        """Удаляет самые давно запрошенные записи сети (дамп не трогаем)."""
+        deleted = self.storage.execute(_EVICT_SQL, (count,))
+        with self._lock:
+            self._size = self.storage.query_one(_COUNT_SQL, (SOURCE_WIKI,))[0]
+        log.debug(f"Из справочного кэша вытеснено записей: {deleted}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Справочный кэш Мики')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    load = subparsers.add_parser('load', help='загрузить локальный дамп статей')
+    load.add_argument('dump', help='файл JSON Lines с полями title и extract')
+    load.add_argument('--db', default='mika_knowledge.db')
+    args = parser.parse_args()
+
+    knowledge = KnowledgeBase(args.db, offline=True)
+    try:
+        count = knowledge.load_dump(args.dump)
+        print(f"Загружено статей: {count}")
+    finally:
+        knowledge.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import unicodedata
+
+
+class LanguageFilter:
+    """Потоковый фильтр языка ответа.
+
+    Куски с латиницей или иероглифами не показываются пользователю, а их буквы
+    учитываются как «дрейф». Как только доля чужих букв превышает порог,
+    ``drifted`` становится истинным и генерацию можно прервать, не дожидаясь
+    конца ответа. Иероглиф весит больше латинской буквы: он заменяет целое слово.
+    """
+
+    def __init__(self, max_foreign_ratio: float = 0.3, min_letters: int = 20, max_foreign: int = 60, cjk_weight: int = 3):
+        self.max_foreign_ratio = max_foreign_ratio
+        self.min_letters = min_letters
+        self.max_foreign = max_foreign
+        self.cjk_weight = cjk_weight
+        self.native = 0
+        self.foreign = 0
+        # Буквы, которые действительно ушли пользователю
+        self.accepted_letters = 0
+        self.dropped_chunks = 0
+        self.drifted = False
+
+    def feed(self, chunk: str) -> str:
+        """Возвращает кусок для показа или пустую строку, если кусок отброшен."""
+        if not chunk:
+            return ''
+        native = foreign = 0
+        for char in chunk:
+            if not char.isalpha():
+                continue
+            if 'Ѐ' <= char <= 'ӿ':
+                native += 1
+            elif char.isascii() or unicodedata.name(char, '').startswith('LATIN'):
+                foreign += 1
+            elif '一' <= char <= '鿿' or '぀' <= char <= 'ヿ':
+                foreign += self.cjk_weight
+            else:
+                native += 1
+
+        self.native += native
+        if foreign:
+            self.foreign += foreign
+            self.dropped_chunks += 1
+            self._update_drift()
+            return ''
+        self.accepted_letters += native
+        return chunk
+
+    def _update_drift(self):
+        total = self.native + self.foreign
+        if self.foreign >= self.max_foreign:
+            self.drifted = True
+        elif total >= self.min_letters and self.foreign / total > self.max_foreign_ratio:
+            self.drifted = True
@@ -0,0 +1,144 @@
+import logging
+import os
+import threading
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Collection, Dict, List, Optional, Sequence, Tuple, Union
+
+DEFAULT_LEXICON = Path(__file__).with_name('lexicons') / 'sentiment_ru.tsv'
+
+# Частица перед словом меняет его тональность: «не нравится»
+NEGATIONS = frozenset({'не', 'ни'})
+
+_stemmer_lock = threading.Lock()
+_stem: Optional[Callable[[str], str]] = None
+
+
+def stem(word: str) -> str:
+    """Основа слова стеммером Snowball; результаты кэшируются (LRU).
+
+    Без NLTK слово возвращается как есть: работают только точные формы.
+    """
+    return get_stemmer()(word)
+
+
+def get_stemmer() -> Callable[[str], str]:
+    """Кэширующий стеммер, создаётся при первом обращении (импорт NLTK небыстрый)."""
+    global _stem
+    if _stem is None:
+        with _stemmer_lock:
+            if _stem is None:
+                try:
+                    from nltk.stem.snowball import RussianStemmer
+                    _stem = lru_cache(maxsize=65536)(RussianStemmer().stem)
+                except ImportError as e:
+                    logging.warning(f"NLTK недоступен, словарь тональности работает без стемминга: {str(e)}")
+                    _stem = str
+    return _stem
+
+
+class Lexicon:
+    """Индекс тональности: основа (или точная форма) слова → вес.
+
+    Словарь приводится к основам один раз при загрузке, дальше оценка
+    сообщения — один проход по токенам со словарными поисками; основы
+    токенов берутся из общего кэша стеммера.
+    """
+
+    def __init__(self, weights: Dict[str, float], exact: Optional[Dict[str, float]] = None):
+        self.weights = weights
+        # Точные формы проверяются первыми и перекрывают совпадение по основе
+        self.exact = exact or {}
+
+    @classmethod
+    def load(cls, *paths: Union[str, Path]) -> 'Lexicon':
+        """Читает файлы «слово<TAB>вес»; при повторе слова действует последний файл."""
+        weights: Dict[str, float] = {}
+        exact: Dict[str, float] = {}
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                for number, line in enumerate(f, 1):
+                    line = line.strip()
+                    if not line or line.startswith('#'):
+                        continue
+                    try:
+                        word, weight = line.split('\t')
+                        value = float(weight)
+                    except ValueError:
+                        logging.error(f"Ошибка в словаре {path}, строка {number}: {line!r}")
+                        continue
+                    word = word.lower()
+                    if word.startswith('='):
+                        exact[word[1:]] = value
+                    else:
+                        weights[stem(word)] = value
+        return cls(weights, exact)
+
+    def stems(self, tokens: Sequence[str]) -> List[str]:
+        return list(map(get_stemmer(), tokens))
+
+    def sentiment(self, tokens: Sequence[str], stems: Optional[Sequence[str]] = None) -> Dict[str, float]:
+        """Полярность и субъективность по весам словаря с учётом отрицания перед словом."""
+        if stems is None:
+            stems = self.stems(tokens)
+        exact = self.exact
+        weights = self.weights
+        # Чаще всего в сообщении нет ни одного слова из словаря: проверка множествами без цикла
+        if weights.keys().isdisjoint(stems) and exact.keys().isdisjoint(tokens):
+            return {'polarity': 0.0, 'subjectivity': 0.0}
+        # Каждое вхождение считается отдельно: «не хорошо … хорошо» — это ноль, а не похвала
+        hits: List[float] = []
+        previous = ''
+        for token, token_stem in zip(tokens, stems):
+            weight = exact.get(token)
+            if weight is None:
+                weight = weights.get(token_stem)
+            if weight:
+                hits.append(-weight if previous in NEGATIONS else weight)
+            previous = token
+        positive = sum(w for w in hits if w > 0)
+        negative = -sum(w for w in hits if w < 0)
+        total = positive + negative
+        return {
+            'polarity': (positive - negative) / total if total else 0.0,
+            'subjectivity': len(hits) / len(tokens)
+        }
+
+    def keywords(
+        self,
+        tokens: Sequence[str],
+        stop_words: Collection[str],
+        limit: int = 5,
+        stems: Optional[Sequence[str]] = None
+    ) -> List[str]:
+        """Самые частые слова, считая формы одного слова вместе.
+
+        Слово представлено формой, встретившейся первой; при равной частоте
+        раньше идёт слово, встретившееся раньше.
+        """
+        if stems is None:
+            stems = self.stems(tokens)
+        counts: Counter = Counter()
+        forms: Dict[str, str] = {}
+        for token, token_stem in zip(tokens, stems):
+            if len(token) > 2 and token.isalnum() and token not in stop_words:
+                counts[token_stem] += 1
+                forms.setdefault(token_stem, token)
+        return [forms[token_stem] for token_stem, _ in counts.most_common(limit)]
+
+
+def load_lexicon(paths: Tuple[str, ...] = ()) -> Lexicon:
+    """Словарь по умолчанию и дополнительные файлы; каждый набор читается один раз на процесс.
+
+    Дополнительные файлы можно задать переменной окружения MIKA_LEXICON
+    (пути через os.pathsep). Переменная читается при каждом вызове и входит
+    в ключ кэша, так что её смена подхватывается без перезапуска.
+    """
+    extra = tuple(p for p in os.environ.get('MIKA_LEXICON', '').split(os.pathsep) if p)
+    return _load_lexicon(extra + tuple(paths))
+
+
+@lru_cache(maxsize=None)
+def _load_lexicon(paths: Tuple[str, ...]) -> Lexicon:
+    return Lexicon.load(DEFAULT_LEXICON, *paths)
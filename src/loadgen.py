@@ -0,0 +1,237 @@
+"""
+Нагрузочный прогон ответов Мики без модели и сети.
+
+N одновременных пользователей воспроизводят диалоги из существующих баз
+(mika.db, dialogs.db, mika_data.db); ответы генерирует встроенный имитатор
+Ollama (или настоящий сервер, если задан --ollama-url). В конце печатается
+пропускная способность и квантили времени до первого токена и всего хода.
+
+Запуск: python -m src.loadgen --users 16 --turns 20 --rate 40 --latency 0.3
+
+Несколько серверов модели за роутером (--fake-servers N, из них --dead-servers
+недоступны) проверяют распределение нагрузки и переключение при отказах.
+"""
+
+import argparse
+import json
+import logging
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+from .backend_router import OllamaRouter
+from .dialog_manager import DialogManager
+from .fake_ollama import FakeOllamaServer
+from .knowledge import KnowledgeBase
+from .message_analysis import MessageAnalyzer
+from .metrics import QUANTILES, quantile
+from .mika import Mika
+from .ollama_client import OllamaClient
+from .scheduler import GenerationScheduler
+from .storage import Storage
+from .text_processor import TextProcessor
+
+log = logging.getLogger("mika")
+
+DEFAULT_SOURCES = ('mika.db', 'dialogs.db', 'mika_data.db')
+
+# Запросы к известным схемам: (таблица, ключ диалога)
+_SOURCE_QUERIES = {
+    'dialogs': 'SELECT {key}, human_message FROM dialogs ORDER BY id',
+    'messages': 'SELECT {key}, human_message FROM messages ORDER BY id',
+}
+
+FALLBACK_DIALOG = (
+    'Привет!', 'Как у тебя дела?', 'Что такое квантовый компьютер?',
+    'Расскажи что-нибудь интересное', 'Почему небо голубое?', 'Спасибо!',
+)
+
+
+def load_dialogs(paths: Sequence[str]) -> List[List[str]]:
+    """Читает реплики пользователей из баз, сгруппированные по пользователю или сессии."""
+    dialogs: Dict[str, List[str]] = {}
+    for path in paths:
+        if not Path(path).exists():
+            continue
+        # Только чтение: базы не мигрируются и не блокируются
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for table, sql in _SOURCE_QUERIES.items():
+                if table not in tables:
+                    continue
+                columns = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+                key = next((c for c in ('session_id', 'user_id') if c in columns), "'all'")
+                for dialog_key, message in conn.execute(sql.format(key=key)):
+                    if message and message.strip():
+                        dialogs.setdefault(f'{path}:{table}:{dialog_key}', []).append(message.strip())
+        except sqlite3.Error as e:
+            log.warning(f"Не удалось прочитать диалоги из {path}: {str(e)}")
+        finally:
+            conn.close()
+    return list(dialogs.values()) or [list(FALLBACK_DIALOG)]
+
+
+class _Result:
+    __slots__ = ('ttft', 'latency', 'ok')
+
+    def __init__(self, ttft: Optional[float], latency: float, ok: bool):
+        self.ttft = ttft
+        self.latency = latency
+        self.ok = ok
+
+
+def _user(mika: Mika, dialog: Sequence[str], turns: int, think: float, deadline: float, results: List[_Result], lock: threading.Lock):
+    for turn in range(turns):
+        if time.monotonic() >= deadline:
+            break
+        message = dialog[turn % len(dialog)]
+        started = time.perf_counter()
+        ttft = None
+        for _ in mika.respond(message):
+            if ttft is None:
+                ttft = time.perf_counter() - started
+        result = _Result(ttft, time.perf_counter() - started, mika.last_generation_ok)
+        with lock:
+            results.append(result)
+        if think:
+            time.sleep(think)
+
+
+def run(
+    users: int,
+    turns: int,
+    duration: float,
+    think: float,
+    dialogs: List[List[str]],
+    ollama_urls: Sequence[str],
+    max_generations: int,
+    max_queue: int
+) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as workdir:
+        storage = Storage(Path(workdir) / 'load.db')
+        ollama: Union[OllamaClient, OllamaRouter]
+        if len(ollama_urls) > 1:
+            ollama = OllamaRouter(ollama_urls, pool_maxsize=users)
+        else:
+            ollama = OllamaClient(ollama_urls[0], pool_maxsize=users)
+        scheduler = GenerationScheduler(max_concurrent=max_generations, max_queue=max_queue)
+        text_processor = TextProcessor()
+        analyzer = MessageAnalyzer(text_processor)
+        knowledge = KnowledgeBase(Path(workdir) / 'knowledge.db', offline=True)
+        sessions = [
+            Mika(
+                ollama_client=ollama,
+                dialog_manager=DialogManager(storage=storage, session_id=f'user-{i}', user_id=f'user-{i}', analyzer=analyzer),
+                text_processor=text_processor,
+                scheduler=scheduler,
+                knowledge=knowledge
+            )
+            for i in range(users)
+        ]
+
+        results: List[_Result] = []
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration if duration else float('inf')
+        threads = [
+            threading.Thread(
+                target=_user,
+                args=(mika, dialogs[i % len(dialogs)], turns, think, deadline, results, lock),
+                name=f'loadgen-{i}'
+            )
+            for i, mika in enumerate(sessions)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        for mika in sessions:
+            mika.close()
+        knowledge.close()
+        storage.close()
+        ollama.close()
+
+    report = summarize(results, elapsed)
+    if isinstance(ollama, OllamaRouter):
+        report['failovers'] = ollama.failovers
+        for i, backend in enumerate(ollama.status()):
+            report[f'backend{i}_requests'] = backend['requests']
+    return report
+
+
+def summarize(results: Sequence[_Result], elapsed: float) -> Dict[str, float]:
+    ttfts = sorted(r.ttft for r in results if r.ttft is not None)
+    latencies = sorted(r.latency for r in results)
+    report = {
+        'turns': len(results),
+        # Остальные ходы — заготовки, отказы планировщика и ошибки генерации
+        'model_turns': sum(1 for r in results if r.ok),
+        'elapsed_s': elapsed,
+        'turns_per_s': len(results) / elapsed if elapsed else 0.0,
+    }
+    for q in QUANTILES:
+        report[f'ttft_p{round(q * 100)}_s'] = quantile(ttfts, q)
+    for q in QUANTILES:
+        report[f'latency_p{round(q * 100)}_s'] = quantile(latencies, q)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный прогон Мики')
+    parser.add_argument('--users', type=int, default=8, help='одновременных пользователей')
+    parser.add_argument('--turns', type=int, default=10, help='ходов на пользователя')
+    parser.add_argument('--duration', type=float, default=0, help='ограничение прогона по времени, с')
+    parser.add_argument('--think', type=float, default=0.0, help='пауза пользователя между ходами, с')
+    parser.add_argument('--db', nargs='*', default=list(DEFAULT_SOURCES), help='базы, из которых берутся диалоги')
+    parser.add_argument('--max-generations', type=int, default=2, help='одновременных запросов к модели')
+    parser.add_argument('--max-queue', type=int, default=16)
+    parser.add_argument('--ollama-url', nargs='+', help='настоящие серверы Ollama вместо имитатора')
+    parser.add_argument('--fake-servers', type=int, default=1, help='число имитаторов за роутером')
+    parser.add_argument('--dead-servers', type=int, default=0, help='сколько из имитаторов недоступны')
+    parser.add_argument('--rate', type=float, default=40.0, help='имитатор: токенов в секунду')
+    parser.add_argument('--latency', type=float, default=0.3, help='имитатор: задержка до первого токена, с')
+    parser.add_argument('--jitter', type=float, default=0.1, help='имитатор: разброс задержки, с')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='имитатор: доля ответов с ошибкой')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='вывести результат в JSON')
+    args = parser.parse_args()
+
+    dialogs = load_dialogs(args.db)
+    fakes: List[FakeOllamaServer] = []
+    ollama_urls = args.ollama_url
+    try:
+        if not ollama_urls:
+            for i in range(args.fake_servers):
+                fakes.append(FakeOllamaServer(
+                    rate=args.rate, latency=args.latency, jitter=args.jitter,
+                    error_rate=args.error_rate, seed=args.seed + i
+                ).start())
+            ollama_urls = [fake.url for fake in fakes]
+            # Остановленный имитатор — узел, на котором отказывает соединение
+            for fake in fakes[:args.dead_servers]:
+                fake.stop()
+        report = run(
+            args.users, args.turns, args.duration, args.think, dialogs,
+            ollama_urls, args.max_generations, args.max_queue
+        )
+    finally:
+        # Все имитаторы, включая недоступные и запущенные до ошибки; повторная остановка ничего не делает
+        for fake in fakes:
+            fake.stop()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"Диалогов для воспроизведения: {len(dialogs)}")
+        for name, value in report.items():
+            print(f"{name:18} {value:.3f}" if isinstance(value, float) else f"{name:18} {value}")
+
+
+if __name__ == '__main__':
+    main()
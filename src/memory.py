@@ -0,0 +1,257 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .embeddings import Embedder
+from .storage import Storage
+
+log = logging.getLogger("mika")
+
+# Новые ходы читаются по возрастанию id, поэтому индексатор продолжает с места остановки
+_UNINDEXED_SQL = '''SELECT id, user_id, human_message, ai_message FROM messages
+                    WHERE id > ? ORDER BY id LIMIT ?'''
+
+
+class _UserIndex:
+    """Матрица float16 (строка — ход) и id сообщений в файлах, отображённых в память."""
+
+    def __init__(self, directory: Path, user_id: str, dim: int, initial_capacity: int):
+        key = _index_key(user_id)
+        self.vectors_path = directory / f'{key}.f16'
+        self.ids_path = directory / f'{key}.ids'
+        self.meta_path = directory / f'{key}.json'
+        self.dim = dim
+        self.lock = threading.Lock()
+        self.rows = 0
+        if self.meta_path.exists():
+            meta = json.loads(self.meta_path.read_text(encoding='utf-8'))
+            if meta.get('dim') == dim:
+                self.rows = meta['rows']
+        self.capacity = max(initial_capacity, self.rows)
+        self._map(self.capacity)
+
+    def _map(self, capacity: int):
+        for path, itemsize in ((self.vectors_path, 2 * self.dim), (self.ids_path, 8)):
+            with open(path, 'ab') as f:
+                if f.tell() < capacity * itemsize:
+                    f.truncate(capacity * itemsize)
+        self.vectors = np.memmap(self.vectors_path, dtype=np.float16, mode='r+', shape=(capacity, self.dim))
+        self.ids = np.memmap(self.ids_path, dtype=np.int64, mode='r+', shape=(capacity,))
+        self.capacity = capacity
+
+    def append(self, ids: List[int], vectors: np.ndarray):
+        """Дописывает строки; вызывается под self.lock."""
+        needed = self.rows + len(ids)
+        if needed > self.capacity:
+            capacity = self.capacity
+            while capacity < needed:
+                capacity *= 2
+            self._map(capacity)
+        self.vectors[self.rows:needed] = vectors.astype(np.float16)
+        self.ids[self.rows:needed] = ids
+        self.rows = needed
+
+    def persist(self):
+        """Сбрасывает матрицу на диск, затем фиксирует число строк; вызывается под self.lock."""
+        self.vectors.flush()
+        self.ids.flush()
+        _write_json(self.meta_path, {'rows': self.rows, 'dim': self.dim})
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray, int]:
+        with self.lock:
+            return self.vectors, self.ids, self.rows
+
+
+class LongTermMemory:
+    """Долговременная память: поиск прошлых ходов пользователя по смыслу.
+
+    Сохранённые ходы индексируются в фоне по возрастанию id сообщения: каждый
+    ход превращается в нормированный вектор и дописывается в матрицу float16
+    пользователя, отображённую в память с диска. Поиск — скалярное произведение
+    по матрице кусками, так что в память Python не загружаются ни сообщения,
+    ни весь индекс; тексты найденных ходов читаются из базы по id.
+    """
+
+    def __init__(
+        self,
+        storage: Storage,
+        directory: Union[str, Path] = 'mika_memory',
+        embedder: Optional[Embedder] = None,
+        batch_size: int = 256,
+        chunk_rows: int = 16384,
+        min_score: float = 0.35,
+        skip_recent: int = 6,
+        scan_budget: float = 0.2,
+        initial_capacity: int = 1024
+    ):
+        self.storage = storage
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.embedder = embedder if embedder is not None else Embedder()
+        self.batch_size = batch_size
+        self.chunk_rows = chunk_rows
+        self.min_score = min_score
+        # Последние ходы и так есть в истории чата, их из поиска исключаем
+        self.skip_recent = skip_recent
+        # Сколько секунд можно сканировать матрицу; недосмотренными остаются самые старые ходы
+        self.scan_budget = scan_budget
+        self.initial_capacity = initial_capacity
+        self.enabled = True
+        self._indexes: Dict[str, _UserIndex] = {}
+        self._lock = threading.Lock()
+        self._cursor_path = self.directory / 'cursor.json'
+        self._cursor = 0
+        if self._cursor_path.exists():
+            self._cursor = json.loads(self._cursor_path.read_text(encoding='utf-8'))['last_id']
+        self._index_lock = threading.Lock()
+        self._index_pending = False
+        # Индексация отдельно от поиска: догоняющая индексация не задерживает ответы
+        self._index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='memory-index')
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='memory')
+
+    def schedule_index(self):
+        """Запускает фоновую индексацию новых ходов; повторные вызовы объединяются."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._index_pending:
+                return
+            self._index_pending = True
+        self._index_executor.submit(self._safe_index)
+
+    def index_pending(self) -> int:
+        """Индексирует все ещё не проиндексированные ходы и возвращает их число."""
+        total = 0
+        with self._index_lock:
+            while True:
+                rows = self.storage.query(_UNINDEXED_SQL, (self._cursor, self.batch_size))
+                if not rows:
+                    break
+                texts = [f"Пользователь: {human}\nМика: {ai}" for _, _, human, ai in rows]
+                vectors = self.embedder.encode(texts)
+                by_user: Dict[str, List[int]] = {}
+                for position, (message_id, user_id, _, _) in enumerate(rows):
+                    by_user.setdefault(user_id, []).append(position)
+                for user_id, positions in by_user.items():
+                    index = self._get_index(user_id, vectors.shape[1])
+                    with index.lock:
+                        index.append([rows[p][0] for p in positions], vectors[positions])
+                        index.persist()
+                self._cursor = rows[-1][0]
+                _write_json(self._cursor_path, {'last_id': self._cursor})
+                total += len(rows)
+                if len(rows) < self.batch_size:
+                    break
+        return total
+
+    def recall(self, user_id: str, query: str, k: int = 3) -> List[Dict[str, str]]:
+        """Возвращает до ``k`` прошлых ходов, близких по смыслу к запросу."""
+        if not self.enabled:
+            return []
+        index = self._indexes.get(user_id) or self._open_existing(user_id)
+        if index is None:
+            return []
+        vectors, ids, rows = index.snapshot()
+        rows -= self.skip_recent
+        if rows <= 0:
+            return []
+
+        query_vector = self.embedder.encode_one(query).astype(np.float32)
+        deadline = time.perf_counter() + self.scan_budget
+        buffer = np.empty((min(self.chunk_rows, rows), vectors.shape[1]), dtype=np.float32)
+        best_scores = np.empty(0, dtype=np.float32)
+        best_rows = np.empty(0, dtype=np.int64)
+        # От новых ходов к старым: при нехватке времени теряются самые давние
+        for stop in range(rows, 0, -self.chunk_rows):
+            start = max(0, stop - self.chunk_rows)
+            chunk = buffer[:stop - start]
+            chunk[...] = vectors[start:stop]
+            scores = chunk @ query_vector
+            take = min(k, len(scores))
+            top = np.argpartition(-scores, take - 1)[:take]
+            best_scores = np.concatenate([best_scores, scores[top]])
+            best_rows = np.concatenate([best_rows, top + start])
+            if time.perf_counter() > deadline:
+                log.debug(f"Поиск в памяти остановлен по времени, просмотрено ходов: {rows - start}")
+                break
+
+        order = np.argsort(-best_scores)[:k]
+        chosen = [int(ids[best_rows[i]]) for i in order if best_scores[i] >= self.min_score]
+        if not chosen:
+            return []
+        placeholders = ', '.join('?' * len(chosen))
+        found = {
+            row[0]: row for row in self.storage.query(
+                f'SELECT id, human_message, ai_message, timestamp FROM messages WHERE id IN ({placeholders})',
+                chosen
+            )
+        }
+        # Удалённые при очистке ходы просто пропускаем
+        return [
+            {'human': found[i][1], 'ai': found[i][2], 'timestamp': found[i][3]}
+            for i in chosen if i in found
+        ]
+
+    def recall_async(self, user_id: str, query: str, k: int = 3) -> 'Future[List[Dict[str, str]]]':
+        """Запускает поиск в фоне; ждать результат следует с таймаутом."""
+        return self._executor.submit(self._safe_recall, user_id, query, k)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._index_executor.shutdown(wait=True)
+
+    def _safe_index(self):
+        with self._lock:
+            self._index_pending = False
+        try:
+            self.index_pending()
+        except ImportError as e:
+            log.warning(f"sentence-transformers недоступен, долговременная память отключена: {str(e)}")
+            self.enabled = False
+        except Exception as e:
+            log.error(f"Ошибка при индексации долговременной памяти: {str(e)}")
+
+    def _safe_recall(self, user_id: str, query: str, k: int) -> List[Dict[str, str]]:
+        try:
+            return self.recall(user_id, query, k)
+        except ImportError as e:
+            log.warning(f"sentence-transformers недоступен, долговременная память отключена: {str(e)}")
+            self.enabled = False
+        except Exception as e:
+            log.error(f"Ошибка при поиске в долговременной памяти: {str(e)}")
+        return []
+
+    def _get_index(self, user_id: str, dim: int) -> _UserIndex:
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is None:
+                index = self._indexes[user_id] = _UserIndex(self.directory, user_id, dim, self.initial_capacity)
+            return index
+
+    def _open_existing(self, user_id: str) -> Optional[_UserIndex]:
+        """Открывает индекс, сохранённый в прошлых запусках, если он есть."""
+        meta_path = self.directory / f'{_index_key(user_id)}.json'
+        if not meta_path.exists():
+            return None
+        dim = json.loads(meta_path.read_text(encoding='utf-8'))['dim']
+        return self._get_index(user_id, dim)
+
+
+def _index_key(user_id: str) -> str:
+    """Имя файлов индекса пользователя: хэш, потому что в user_id могут быть любые символы."""
+    return hashlib.sha1(user_id.encode('utf-8')).hexdigest()[:16]
+
+
+def _write_json(path: Path, payload: Dict):
+    """Атомарно записывает JSON: через временный файл и переименование."""
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.write_text(json.dumps(payload), encoding='utf-8')
+    os.replace(tmp_path, path)
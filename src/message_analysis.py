@@ -0,0 +1,157 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .intents import (
+    INTENT_CREATOR, INTENT_INTRODUCTION, INTENT_MIKA_NAME, INTENT_NEGATIVE, INTENT_TEST, INTENT_WIKI,
+    IntentMatch, IntentRouter
+)
+from .text_processor import TextProcessor
+
+# Слова, по которым сообщение считается личным (ответ зависит от собеседника)
+PERSONAL_MARKERS = frozenset({
+    'я', 'мне', 'меня', 'мной', 'мой', 'моя', 'моё', 'мое', 'мои', 'моего', 'моей', 'моих', 'моим',
+    'мы', 'нас', 'нам', 'наш', 'наша', 'наше', 'наши', 'нашего', 'нашей',
+})
+
+
+class MessageAnalysis:
+    """Неизменяемый результат однократного анализа сообщения пользователя."""
+
+    __slots__ = (
+        'text', 'normalized', 'tokens', 'polarity', 'subjectivity', 'keywords',
+        'is_question', 'is_mika_name_question', 'requires_name_confirmation', 'name',
+        'wiki_topic', 'is_creator', 'is_negative', 'is_test', 'is_personal'
+    )
+
+    def __init__(self, **fields: Any):
+        for slot in self.__slots__:
+            object.__setattr__(self, slot, fields.get(slot))
+
+    def __setattr__(self, key: str, value: Any):
+        raise AttributeError('MessageAnalysis неизменяем')
+
+    def __delattr__(self, key: str):
+        raise AttributeError('MessageAnalysis неизменяем')
+
+    def __repr__(self) -> str:
+        return f'MessageAnalysis({self.text!r})'
+
+    @property
+    def sentiment(self) -> Dict[str, float]:
+        return {'polarity': self.polarity, 'subjectivity': self.subjectivity}
+
+    @property
+    def requires_wiki(self) -> bool:
+        return self.wiki_topic is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Словарь в формате прежнего ``DialogManager.process_message``.
+
+        В отличие от прежнего метода, который всегда возвращал нулевую тональность
+        и пустые ключевые слова, здесь они посчитаны, если у анализатора есть
+        ``TextProcessor``; по ним в промпт попадают настроение и ключевые слова.
+        """
+        result = {
+            'requires_name_confirmation': self.requires_name_confirmation,
+            'name': self.name,
+            'requires_wiki': self.requires_wiki,
+            'wiki_info': None,
+            'sentiment': self.sentiment,
+            'keywords': list(self.keywords)
+        }
+        if self.is_mika_name_question:
+            result['is_mika_name_question'] = True
+        return result
+
+
+class MessageAnalyzer:
+    """Анализирует сообщение за один проход и запоминает результат.
+
+    Нормализация, токенизация, тональность, ключевые слова и флаги намерений
+    считаются один раз на сообщение; повторный анализ того же текста берётся
+    из ограниченного LRU-кэша. Намерения находит общий ``IntentRouter``.
+    """
+
+    def __init__(
+        self,
+        text_processor: Optional[TextProcessor] = None,
+        cache_size: int = 256,
+        router: Optional[IntentRouter] = None
+    ):
+        self.text_processor = text_processor
+        self.cache_size = cache_size
+        self.router = router or IntentRouter()
+        self._cache: 'OrderedDict[str, MessageAnalysis]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._valid_name_re = re.compile(r'^[а-яА-ЯёЁa-zA-Z]+$')
+
+    def analyze(self, message: str) -> MessageAnalysis:
+        """Возвращает анализ сообщения, вычисляя его не более одного раза."""
+        with self._lock:
+            analysis = self._cache.get(message)
+            if analysis is not None:
+                self._cache.move_to_end(message)
+                return analysis
+
+        analysis = self._analyze(message)
+
+        with self._lock:
+            self._cache[message] = analysis
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return analysis
+
+    def _analyze(self, message: str) -> MessageAnalysis:
+        message_lower = message.lower()
+        matches = self.router.match(message)
+        intents = {match.intent for match in matches}
+        fields: Dict[str, Any] = {
+            'text': message,
+            'normalized': message_lower.strip(),
+            'tokens': (),
+            'polarity': 0,
+            'subjectivity': 0,
+            'keywords': (),
+            'is_question': False,
+            'is_mika_name_question': False,
+            'requires_name_confirmation': False,
+            'name': None,
+            'wiki_topic': None,
+            'is_creator': INTENT_CREATOR in intents,
+            'is_negative': INTENT_NEGATIVE in intents,
+            'is_test': INTENT_TEST in intents,
+            'is_personal': False,
+        }
+
+        if self.text_processor is not None:
+            text_info = self.text_processor.analyze_text(message)
+            fields['tokens'] = tuple(text_info['tokens'])
+            fields['polarity'] = text_info['sentiment']['polarity']
+            fields['subjectivity'] = text_info['sentiment']['subjectivity']
+            fields['keywords'] = tuple(text_info['keywords'])
+            fields['is_question'] = text_info['is_question']
+            fields['is_personal'] = not PERSONAL_MARKERS.isdisjoint(fields['tokens'])
+
+        # Вопрос об имени Мики исключает остальные проверки
+        if INTENT_MIKA_NAME in intents:
+            fields['is_mika_name_question'] = True
+            return MessageAnalysis(**fields)
+
+        name = self._match_name(self.router.first(matches, INTENT_INTRODUCTION))
+        fields['name'] = name
+        fields['requires_name_confirmation'] = name is not None
+        wiki = self.router.first(matches, INTENT_WIKI)
+        fields['wiki_topic'] = wiki.slot if wiki is not None else None
+        return MessageAnalysis(**fields)
+
+    def _match_name(self, match: Optional[IntentMatch]) -> Optional[str]:
+        """Проверяет имя, которым представился пользователь."""
+        if match is None or match.slot is None:
+            return None
+        name = match.slot
+        # Проверяем длину имени и наличие недопустимых символов
+        if 2 <= len(name) <= 20 and self._valid_name_re.match(name):
+            return name.capitalize()
+        return None
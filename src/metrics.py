@@ -0,0 +1,211 @@
+"""
+Замеры времени этапов хода и экспорт метрик.
+
+    metrics = Metrics(sink=JsonLinesSink('metrics.jsonl'))
+    with metrics.span('build_context'):
+        ...
+    print(metrics.render_prometheus())
+
+Выключенный реестр (``Metrics(enabled=False)``, он же ``DISABLED``) почти
+ничего не стоит: ``span`` возвращает общий пустой контекстный менеджер.
+
+Сводка по записанному журналу:
+    python -m src.metrics summary metrics.jsonl
+"""
+
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Optional, Union
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def quantile(sorted_values: Iterable[float], q: float) -> float:
+    """Квантиль отсортированной выборки (ближайший ранг)."""
+    values = list(sorted_values)
+    if not values:
+        return math.nan
+    index = min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))
+    return values[index]
+
+
+class Histogram:
+    """Счётчик, сумма и скользящее окно последних значений для квантилей."""
+
+    def __init__(self, window: int = 2048):
+        self.count = 0
+        self.sum = 0.0
+        self._window: Deque[float] = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self._window.append(value)
+
+    def quantiles(self, qs=QUANTILES) -> Dict[float, float]:
+        values = sorted(self._window)
+        return {q: quantile(values, q) for q in qs}
+
+
+class JsonLinesSink:
+    """Пишет каждое измерение строкой JSON в файл."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self._file = open(self.path, 'a', encoding='utf-8', buffering=1)
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class _Span:
+    __slots__ = ('metrics', 'name', 'labels', 'start', 'elapsed')
+
+    def __init__(self, metrics: 'Metrics', name: str, labels: Dict[str, Any]):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.elapsed = 0.0
+
+    def __enter__(self) -> '_Span':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self.start
+        self.metrics.observe(self.name, self.elapsed, **self.labels)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+    elapsed = 0.0
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Metrics:
+    """Реестр гистограмм: длительности этапов в секундах и другие величины.
+
+    Гистограммы хранятся по имени; метки идут только в журнал JSON Lines.
+    """
+
+    def __init__(self, enabled: bool = True, sink: Optional[JsonLinesSink] = None, window: int = 2048, prefix: str = 'mika'):
+        self.enabled = enabled
+        self.sink = sink
+        self.window = window
+        self.prefix = prefix
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'Metrics':
+        """Включает замеры, если задана переменная MIKA_METRICS (путь к журналу JSON Lines)."""
+        path = os.environ.get('MIKA_METRICS')
+        if not path:
+            return DISABLED
+        return cls(sink=JsonLinesSink(path))
+
+    def span(self, name: str, **labels: Any):
+        """Контекстный менеджер, замеряющий время блока."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, labels)
+
+    def observe(self, name: str, value: float, **labels: Any):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(self.window)
+            histogram.observe(value)
+        if self.sink is not None:
+            self.sink.write({'ts': time.time(), 'name': name, 'value': value, **labels})
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Сводка: число, сумма и p50/p95/p99 по каждой гистограмме."""
+        with self._lock:
+            items = list(self._histograms.items())
+            result = {}
+            for name, histogram in items:
+                row = {'count': histogram.count, 'sum': histogram.sum}
+                for q, value in histogram.quantiles().items():
+                    row[f'p{round(q * 100)}'] = value
+                result[name] = row
+        return result
+
+    def render_prometheus(self) -> str:
+        """Текстовый формат Prometheus: каждая гистограмма как summary."""
+        lines = []
+        for name, row in sorted(self.snapshot().items()):
+            metric = f'{self.prefix}_{name}'
+            lines.append(f'# TYPE {metric} summary')
+            for q in QUANTILES:
+                value = row[f'p{round(q * 100)}']
+                lines.append(f'{metric}{{quantile="{q}"}} {value:.6g}')
+            lines.append(f'{metric}_sum {row["sum"]:.6g}')
+            lines.append(f'{metric}_count {row["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
+
+
+DISABLED = Metrics(enabled=False)
+
+
+def summarize(path: Union[str, Path]) -> Dict[str, Dict[str, float]]:
+    """Считает сводку по журналу JSON Lines целиком (без скользящего окна)."""
+    values: Dict[str, list] = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                values.setdefault(record['name'], []).append(record['value'])
+    result = {}
+    for name, samples in values.items():
+        samples.sort()
+        row = {'count': len(samples), 'sum': sum(samples)}
+        for q in QUANTILES:
+            row[f'p{round(q * 100)}'] = quantile(samples, q)
+        result[name] = row
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Метрики Мики')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    summary = subparsers.add_parser('summary', help='квантили по журналу JSON Lines')
+    summary.add_argument('log', help='файл, записанный через MIKA_METRICS')
+    args = parser.parse_args()
+
+    rows = summarize(args.log)
+    print(f"{'метрика':24} {'n':>7} {'p50':>10} {'p95':>10} {'p99':>10}")
+    for name, row in sorted(rows.items()):
+        print(f"{name:24} {row['count']:7} {row['p50']:10.4f} {row['p95']:10.4f} {row['p99']:10.4f}")
+
+
+if __name__ == '__main__':
+    main()
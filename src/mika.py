@@ -1,5 +1,3 @@
-import json
-import requests
 from rich.console import Console
 from rich.logging import RichHandler
 from rich.live import Live
@@ -9,11 +7,29 @@ import logging
 import sys
 import random
 import time
-from typing import Dict, List, Generator
+from typing import Dict, List, Generator, Optional, Union, TYPE_CHECKING
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
 from datetime import datetime, timedelta
-from .dialog_manager import DialogManager
+from .dialog_manager import DialogManager, FALLBACK_RESPONSES
 from .text_processor import TextProcessor
-import re
+from .message_analysis import MessageAnalysis, MessageAnalyzer
+from .ollama_client import OllamaClient, message_text
+from .scheduler import GenerationScheduler, SchedulerOverloaded
+from .knowledge import KnowledgeBase
+from .language_filter import LanguageFilter
+from .metrics import Metrics
+from .warmup import ModelWarmer
+from .renderer import StreamRenderer
+from .context_builder import (
+    ContextBuilder, SECTION_HIGH, SECTION_LOW, SECTION_NORMAL, SECTION_REQUIRED,
+    estimate_tokens, truncate_tokens
+)
+
+if TYPE_CHECKING:
+    from .backend_router import OllamaRouter
+    # numpy и модель эмбеддингов нужны только при включённых кэше ответов и памяти
+    from .memory import LongTermMemory
+    from .response_cache import ResponseCache
 
 logging.basicConfig(
     level=logging.INFO,
@@ -23,17 +39,99 @@ logging.basicConfig(
 )
 log = logging.getLogger("mika")
 
+DEFAULT_MODEL = "marco-o1"
+
+STRICT_LANGUAGE_PROMPT = (
+    "ВАЖНО: отвечай строго на русском языке кириллицей. "
+    "Никаких английских слов, латиницы и иероглифов."
+)
+
 init()
 
+
+def _shorten(text: str, limit: int = 200) -> str:
+    """Обрезает реплику из памяти, чтобы она не вытесняла остальной контекст."""
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit].rstrip() + "…"
+
+
 class Mika:
-    def __init__(self):
+    def __init__(
+        self,
+        ollama_client: Optional[Union[OllamaClient, 'OllamaRouter']] = None,
+        generation_mode: str = 'chat',
+        keep_alive: str = '30m',
+        history_limit: int = 12,
+        dialog_manager: Optional[DialogManager] = None,
+        text_processor: Optional[TextProcessor] = None,
+        scheduler: Optional[GenerationScheduler] = None,
+        knowledge: Optional[KnowledgeBase] = None,
+        knowledge_timeout: float = 2.0,
+        response_cache: Optional['ResponseCache'] = None,
+        language_retries: int = 1,
+        metrics: Optional[Metrics] = None,
+        memory: Optional['LongTermMemory'] = None,
+        memory_k: int = 3,
+        memory_timeout: float = 0.3,
+        num_ctx: Optional[int] = None,
+        reply_tokens: int = 512,
+        model: str = DEFAULT_MODEL,
+        warmer: Optional[ModelWarmer] = None
+    ):
         self.console = Console()
-        self.api_url = "http://127.0.0.1:11434/api/generate"
-        self.dialog_manager = DialogManager()
-        self.text_processor = TextProcessor()
+        # Общие ресурсы (клиент, хранилище) закрывает тот, кто их создал
+        self._owned = []
+        # Замеры этапов хода; по умолчанию включаются переменной MIKA_METRICS
+        self.metrics = metrics if metrics is not None else self._own(Metrics.from_env())
+        self.ollama = ollama_client or self._own(OllamaClient())
+        # 'chat' — /api/chat с неизменным префиксом (системный промпт и история),
+        # который Ollama берёт из KV-кэша; 'generate' — полный промпт каждый ход
+        self.generation_mode = generation_mode
+        self.model = model
+        self.keep_alive = keep_alive
+        # Прогрев модели; в терминале создаётся при запуске chat(), сервер передаёт общий
+        self.warmer = warmer
+        self.history_limit = history_limit
+        self.chat_history: List[Dict[str, str]] = []
+        self.scheduler = scheduler
+        self.text_processor = text_processor or TextProcessor()
+        self.dialog_manager = dialog_manager or self._own(
+            DialogManager(analyzer=MessageAnalyzer(self.text_processor))
+        )
+        # Справки из Wikipedia ходят в сеть и ведут свою базу, поэтому тоже включаются явно:
+        # переданным справочником или переменной MIKA_KNOWLEDGE_DB
+        if knowledge is None:
+            knowledge = KnowledgeBase.from_env(fetcher=self.text_processor.fetch_wiki_summary)
+            if knowledge is not None:
+                self._own(knowledge)
+        self.knowledge = knowledge
+        self.knowledge_timeout = knowledge_timeout
+        # Кэш ответов включается явно: его можно разделить между сессиями
+        self.response_cache = response_cache
+        # Долговременная память о прошлых разговорах, тоже включается явно
+        self.memory = memory
+        self.memory_k = memory_k
+        self.memory_timeout = memory_timeout
+        # Бюджет токенов: окно модели (по умолчанию как у Ollama) минус место под ответ.
+        # Явно заданный num_ctx передаётся и самой модели
+        self.num_ctx_option = num_ctx
+        self.num_ctx = num_ctx or 2048
+        self.reply_tokens = reply_tokens
+        self.min_context_tokens = 64
+        self.max_message_tokens = self.num_ctx // 2
+        self.context_builder = ContextBuilder()
+        # Сколько раз перезапускать генерацию, ушедшую с русского языка
+        self.language_retries = language_retries
+        self.last_generation_ok = False
         self.last_interaction_time = datetime.now()
         self.current_context = []
+        # Перезапущенный процесс продолжает разговор с того же места
+        self._restore_state()
         self.typing_spinner = Spinner('dots2', f'{Fore.MAGENTA}🎀 Мика печатает{Style.RESET_ALL}')
+        self.renderer = StreamRenderer(
+            self.typing_spinner, header=f'{Fore.MAGENTA}🎀 Мика: ', footer=f'{Style.RESET_ALL}\n',
+            metrics=self.metrics
+        )
         
         self.idle_messages = [
             "Ты ещё тут? Я немного заскучала... 🌸",
@@ -41,6 +139,11 @@ class Mika:
             "Может, продолжим наш разговор? Мне нравится общаться с тобой 💫",
             "Я всё ещё здесь и с удовольствием послушаю, что у тебя нового! 💖"
         ]
+        self.overloaded_responses = [
+            "Ой, сейчас со мной болтает очень много людей, я не успеваю 🌸 Напиши мне через минутку?",
+            "Прости, у меня небольшая очередь из собеседников ✨ Давай продолжим чуть позже?",
+            "Я немного перегружена разговорами 💫 Повтори, пожалуйста, через минутку!"
+        ]
         self.farewell_templates = [
             "Буду скучать по нашим беседам{name}! Возвращайся скорее, я буду ждать 🌟",
             "До новых встреч{name}! Спасибо за чудесное общение 💫",
@@ -88,57 +191,161 @@ class Mika:
 
     def _check_ollama_service(self) -> bool:
         """Проверяет доступность сервиса Ollama."""
-        try:
-            response = requests.get("http://127.0.0.1:11434/api/version")
-            response.raise_for_status()
-            return True
-        except Exception as e:
-            log.error(f"Ошибка подключения к Ollama: {str(e)}")
-            return False
+        return self.ollama.check_service()
+
+    def _stream_response(self, prompt: str, user_message: Optional[str] = None) -> Generator[str, None, None]:
+        """Потоковая генерация ответа.
 
-    def _stream_response(self, prompt: str) -> Generator[str, None, None]:
-        """Потоковая генерация ответа."""
+        ``user_message`` — исходное сообщение без собранного контекста: оно
+        сохраняется в историю и базу вместо полного промпта.
+        """
         data = {
-            "model": "marco-o1",
+            "model": self.model,
             "prompt": f"Отвечай ТОЛЬКО на русском языке, не ��спользуй английские слова.\n\n{prompt}",
             "system": self.system_prompt,
-            "stream": True
+            "stream": True,
+            "keep_alive": self.keep_alive
         }
+        if self.num_ctx_option:
+            data["options"] = {"num_ctx": self.num_ctx_option}
+        
+        # Признак того, что ответ сгенерирован моделью, а не заменён заготовкой
+        self.last_generation_ok = False
+        
+        # Ждём свободный слот генерации; при перегрузке сразу отвечаем заготовкой
+        ticket = None
+        if self.scheduler is not None:
+            try:
+                with self.metrics.span('queue_wait_seconds'):
+                    ticket = self.scheduler.acquire(self.dialog_manager.session_id)
+            except SchedulerOverloaded as e:
+                log.warning(f"Генерация отклонена планировщиком: {str(e)} (в очереди {e.queue_depth})")
+                yield random.choice(self.overloaded_responses)
+                return
         
         try:
-            with requests.post(self.api_url, json=data, stream=True) as response:
-                response.raise_for_status()
-                accumulated_response = ""
+            accumulated_response = ""
+            sent_message = None
+            
+            # Повторы после ухода с языка идут в уже полученном слоте, без новой очереди
+            for attempt in range(self.language_retries + 1):
+                request = data if attempt == 0 else dict(data, prompt=f"{STRICT_LANGUAGE_PROMPT}\n\n{data['prompt']}")
+                if self.generation_mode == 'chat':
+                    payload = self._chat_payload(request)
+                    # В историю идёт исходный ход, без усиленной инструкции
+                    sent_message = sent_message or payload["messages"][-1]
+                    stream = self.ollama.stream_chat(payload)
+                else:
+                    stream = self.ollama.stream_generate(request)
                 
-                for line in response.iter_lines():
-                    if line:
-                        json_response = json.loads(line)
-                        if "response" in json_response:
-                            chunk = json_response["response"]
-                            # Пропускаем куски с китайскими или английскими символами
-                            if not any('\u4e00' <= c <= '\u9fff' for c in chunk) and not re.search(r'[a-zA-Z]', chunk):
-                                accumulated_response += chunk
-                                yield chunk
-                            time.sleep(0.02)
+                language = LanguageFilter()
+                started = time.perf_counter()
+                first_token_at = None
+                try:
+                    for json_response in stream:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                            self.metrics.observe('first_token_seconds', first_token_at - started)
+                        if json_response.get('done'):
+                            self._observe_generation(json_response)
+                        chunk = language.feed(message_text(json_response))
+                        if chunk:
+                            accumulated_response += chunk
+                            yield chunk
+                        if language.drifted:
+                            break
+                finally:
+                    # Закрытие потока рвёт соединение, и Ollama прекращает генерацию
+                    stream.close()
+                    self.metrics.observe('generation_seconds', time.perf_counter() - started)
                 
-                # Если ответ пустой или содержит английские слова, генерируем новый
-                if not accumulated_response or re.search(r'[a-zA-Z]', accumulated_response):
-                    responses = [
-                        "Изв��ни, я немного запуталась. Давай начнём сначала? 🌸",
-                        "Прости, я не совсем поняла. Можешь повторить? ✨",
-                        "Что-то я отвлеклась. О чём мы говорили? 💫",
-                        "Ой, кажется, я потеряла нить разговора. Напомни? 🌟"
-                    ]
-                    new_response = random.choice(responses)
-                    accumulated_response = new_response
-                    yield new_response
-                
-                self._update_context(prompt, accumulated_response)
-                self.dialog_manager.add_interaction(prompt, accumulated_response)
+                if not language.drifted:
+                    break
+                log.warning(
+                    f"Ответ ушёл с русского языка (отброшено кусков: {language.dropped_chunks}), генерация прервана"
+                )
+                # Повторять можно, только если пользователь ещё ничего не увидел
+                if language.accepted_letters:
+                    break
+            
+            fallback = not accumulated_response
+            if fallback:
+                new_response = random.choice(FALLBACK_RESPONSES)
+                accumulated_response = new_response
+                yield new_response
+            else:
+                self.last_generation_ok = not language.drifted
+            
+            stored_message = user_message if user_message is not None else prompt
+            self._update_context(stored_message, accumulated_response)
+            with self.metrics.span('add_interaction_seconds'):
+                self.dialog_manager.add_interaction(stored_message, accumulated_response, fallback)
+            if self.memory is not None:
+                self.memory.schedule_index()
+            if self.generation_mode == 'chat':
+                self._remember_turn(sent_message, accumulated_response)
+            self._save_state()
                 
         except Exception as e:
             log.error(f"Ошибка при генерации ответа: {str(e)}")
             yield "Извини, что-то пошло не так... Давай попробуем ещё раз? 😔"
+        finally:
+            if ticket is not None:
+                self.scheduler.release(ticket)
+            if self.warmer is not None:
+                self.warmer.touch()
+
+    def _observe_generation(self, final_message: Dict):
+        """Скорость генерации по статистике, которую Ollama присылает в последнем сообщении."""
+        eval_count = final_message.get('eval_count')
+        eval_duration = final_message.get('eval_duration')
+        if eval_count and eval_duration:
+            self.metrics.observe('tokens_per_second', eval_count / (eval_duration / 1e9))
+
+    def _chat_payload(self, data: Dict) -> Dict:
+        """Преобразует запрос /api/generate в запрос /api/chat.
+
+        Системный промпт и прошлые ходы идут первыми и не меняются между ходами,
+        поэтому Ollama вычисляет их один раз, а заново обрабатывается только новый ход.
+        """
+        payload = {key: value for key, value in data.items() if key not in ("prompt", "system")}
+        payload["messages"] = (
+            [{"role": "system", "content": data["system"]}]
+            + self.chat_history
+            + [{"role": "user", "content": data["prompt"]}]
+        )
+        return payload
+
+    def _remember_turn(self, user_message: Dict[str, str], ai_response: str):
+        """Добавляет ход в историю чата в том виде, в каком он был отправлен."""
+        self.chat_history.append(user_message)
+        self.chat_history.append({"role": "assistant", "content": ai_response})
+        # Отрезаем историю редко и сразу большим куском: каждый сдвиг окна
+        # меняет префикс и сбрасывает кэш Ollama
+        if len(self.chat_history) > self.history_limit:
+            self.chat_history = self.chat_history[-4:]
+
+    def _save_state(self):
+        """Сохраняет контекст сессии: последние реплики и историю чата."""
+        self.dialog_manager.save_state({
+            "context": [dict(message, timestamp=message["timestamp"].isoformat()) for message in self.current_context],
+            "chat_history": list(self.chat_history),
+        })
+
+    def _restore_state(self):
+        """Восстанавливает контекст сессии, сохранённый прошлым процессом."""
+        state = self.dialog_manager.load_state()
+        if not state:
+            return
+        self.current_context = [
+            dict(message, timestamp=datetime.fromisoformat(message["timestamp"]))
+            for message in state.get("context", [])
+        ]
+        if self.generation_mode == 'chat':
+            self.chat_history = list(state.get("chat_history", []))
+
+    def _history_tokens(self) -> int:
+        return sum(estimate_tokens(message["content"]) + 4 for message in self.chat_history)
 
     def _update_context(self, user_message: str, ai_response: str):
         """Обновляет текущий контекст диалога."""
@@ -167,34 +374,45 @@ class Mika:
         if len(self.current_context) > 6:
             self.current_context = self.current_context[-6:]
 
-    def _build_context(self, prompt: str) -> str:
-        """Формирует расширенный контекст для генерации ответа."""
-        context_parts = []
+    def _build_context(
+        self,
+        prompt: str,
+        analysis: Optional[MessageAnalysis] = None,
+        wiki_future: Optional[Future] = None,
+        memory_future: Optional[Future] = None
+    ) -> str:
+        """Формирует расширенный контекст для генерации ответа в пределах бюджета токенов."""
+        builder = self.context_builder
+        builder.begin()
         
-        # Анализируем текущее сообщение
-        message_info = self.dialog_manager.process_message(prompt)
+        # Анализ текущего сообщения обычно уже сделан в _generate_response
+        if analysis is None:
+            analysis = self.dialog_manager.analyze_message(prompt)
         
         # Проверяем, не создатель ли это
-        creator_phrases = {'я твой создатель', 'я тебя создал', 'я разработал тебя'}
-        is_creator = any(phrase in prompt.lower() for phrase in creator_phrases)
-        if is_creator:
-            context_parts.append("Пользователь - мой создатель. Обращаюсь к нему на 'ты', с уважением и готовностью помочь.")
-            context_parts.append("Отношусь к его предложениям с энтузиазмом и благодарностью.")
+        if analysis.is_creator:
+            builder.add('creator', "Пользователь - мой создатель. Обращаюсь к нему на 'ты', с уважением и готовностью помочь.\n"
+                        "Отношусь к его предложениям с энтузиазмом и благодарностью.", SECTION_REQUIRED)
         
         # Добавляем информацию о пользователе
-        user_preferences = self.dialog_manager.get_user_preferences()
+        with self.metrics.span('preferences_seconds'):
+            user_preferences = self.dialog_manager.get_user_preferences()
         if user_preferences.get('name'):
-            context_parts.append(f"Имя пользователя: {user_preferences['name']}")
-            context_parts.append("Обращаюсь к пользователю на 'ты', дружелюбно")
+            builder.add('user', f"Имя пользователя: {user_preferences['name']}\n"
+                        "Обращаюсь к пользователю на 'ты', дружелюбно", SECTION_HIGH)
         
         # Добавляем последние сообщения с анализом контекста
         if self.current_context:
-            context_parts.append("\nПоследний диалог:")
-            for msg in self.current_context[-4:]:  # Берём последние 2 пары сообщений
-                prefix = "Пользователь" if msg["role"] == "user" else "Мика"
-                content = msg["content"].strip()
-                if content:  # Проверяем, что сообщение не пустое
-                    context_parts.append(f"{prefix}: {content}")
+            # В режиме chat прошлые ходы уже переданы отдельными сообщениями
+            if self.generation_mode != 'chat':
+                dialog_lines = ["\nПоследний диалог:"]
+                for msg in self.current_context[-4:]:  # Берём последние 2 пары сообщений
+                    prefix = "Пользователь" if msg["role"] == "user" else "Мика"
+                    content = msg["content"].strip()
+                    if content:  # Проверяем, что сообщение не пустое
+                        dialog_lines.append(f"{prefix}: {content}")
+                # При нехватке места оставляем самые свежие реплики
+                builder.add('dialog', "\n".join(dialog_lines), SECTION_NORMAL, truncatable=True, keep_tail=True)
         
             # Анализируем последнее сообщение пользователя
             if len(self.current_context) >= 2:
@@ -203,36 +421,79 @@ class Mika:
                     # Если это короткий вопрос "почему", "зачем" и т.д., добавляем контекст
                     short_questions = {'почему', 'зачем', 'как', 'что'}
                     if any(q in last_user_msg["content"].lower() for q in short_questions):
-                        context_parts.append("\nВАЖНО: Пользователь задал уточняющий вопрос. Отвечаю в контексте предыдущего сообщения.")
+                        builder.add('clarify', "\nВАЖНО: Пользователь задал уточняющий вопрос. Отвечаю в контексте предыдущего сообщения.", SECTION_HIGH)
+        
+        # Прошлые разговоры, близкие по смыслу; ищутся параллельно в пределах memory_timeout
+        if memory_future is not None:
+            try:
+                memories = memory_future.result(timeout=self.memory_timeout)
+            except FutureTimeoutError:
+                memories = []
+                log.warning("Поиск в долговременной памяти не уложился во время")
+            if memories:
+                memory_lines = ["\nИз прошлых разговоров:"]
+                for memory in memories:
+                    memory_lines.append(f"Пользователь: {_shorten(memory['human'])}")
+                    memory_lines.append(f"Мика: {_shorten(memory['ai'])}")
+                builder.add('memory', "\n".join(memory_lines), SECTION_LOW, truncatable=True)
         
         # Анализируем тональность только если есть сообщения
-        if message_info.get("sentiment", {}).get("polarity", 0) != 0:
-            if message_info["sentiment"]["polarity"] > 0:
-                context_parts.append("\nНастроение пользователя: позитивное")
+        if analysis.polarity:
+            if analysis.polarity > 0:
+                builder.add('mood', "\nНастроение пользователя: позитивное", SECTION_LOW)
             else:
-                context_parts.append("\nНастроение пользователя: негативное")
+                builder.add('mood', "\nНастроение пользователя: негативное", SECTION_LOW)
         
         # Добавляем ключевые слова только если они есть
-        if message_info.get("keywords"):
-            keywords = [k for k in message_info["keywords"] if k.strip()]
+        if analysis.keywords:
+            keywords = [k for k in analysis.keywords if k.strip()]
             if keywords:
-                context_parts.append("\nКлючевые слова: " + ", ".join(keywords))
+                builder.add('keywords', "\nКлючевые слова: " + ", ".join(keywords), SECTION_LOW)
+        
+        # Справка запрашивалась параллельно со сборкой контекста; ждём её ограниченное время
+        if wiki_future is not None:
+            try:
+                wiki_info = wiki_future.result(timeout=self.knowledge_timeout)
+            except FutureTimeoutError:
+                wiki_info = None
+                log.warning(f"Справка по теме '{analysis.wiki_topic}' не получена вовремя")
+            if wiki_info:
+                builder.add('wiki', f"\nСправка по теме «{analysis.wiki_topic}»: {wiki_info}", SECTION_NORMAL, truncatable=True)
         
         # Добавляем напоминание о стиле общения
-        context_parts.append("\nВАЖНО: Общаюсь живым, современным русским языком. Использую эмодзи. Обращаюсь на 'ты'.")
-        context_parts.append("Отвечаю кратко и по существу, сохраняя дружелюбный тон.")
+        builder.add('style', "\nВАЖНО: Общаюсь живым, современным русским языком. Использую эмодзи. Обращаюсь на 'ты'.\n"
+                    "Отвечаю кратко и по существу, сохраняя дружелюбный тон.", SECTION_REQUIRED)
         
-        return "\n".join(context_parts)
+        context = builder.render(self._context_budget(truncate_tokens(prompt, self.max_message_tokens)))
+        if builder.last_dropped:
+            log.debug(f"Не поместились в бюджет контекста: {', '.join(builder.last_dropped)}")
+        return context
+
+    def _context_budget(self, prompt: str) -> int:
+        """Сколько токенов остаётся на контекст после системного промпта, истории, сообщения и ответа."""
+        used = estimate_tokens(self.system_prompt) + estimate_tokens(prompt) + self.reply_tokens
+        if self.generation_mode == 'chat':
+            # Если история не помещается в окно, отбрасываем самые старые ходы
+            while self.chat_history and used + self.min_context_tokens + self._history_tokens() > self.num_ctx:
+                self.chat_history = self.chat_history[2:]
+            used += self._history_tokens()
+        return max(self.min_context_tokens, self.num_ctx - used)
 
     def _generate_response(self, prompt: str) -> Generator[str, None, None]:
+        """Генерирует ответ и замеряет длительность всего хода."""
+        # Заготовки и ответы из кэша не считаются генерацией модели
+        self.last_generation_ok = False
+        with self.metrics.span('turn_seconds'):
+            yield from self._compose_response(prompt)
+
+    def _compose_response(self, prompt: str) -> Generator[str, None, None]:
         """Улучшенная генерация ответа с учётом контекста и тональности."""
-        # Обрабатываем сообщение
-        message_info = self.dialog_manager.process_message(prompt)
+        # Обрабатываем сообщение один раз за ход
+        with self.metrics.span('analyze_seconds'):
+            analysis = self.dialog_manager.analyze_message(prompt)
         
         # Проверяем, не создатель ли это
-        creator_phrases = {'я твой создатель', 'я тебя создал', 'я разработал тебя'}
-        is_creator = any(phrase in prompt.lower() for phrase in creator_phrases)
-        if is_creator:
+        if analysis.is_creator:
             responses = [
                 "Конечно, я всегда готова помочь тебе с отладкой! 🌟 Что именно нужно исправить?",
                 "Я постараюсь работать лучше! 💫 Расскажи, что нужно улучшить?",
@@ -243,13 +504,12 @@ class Mika:
             return
         
         # Если это вопрос об имени Мики
-        if message_info.get('is_mika_name_question'):
+        if analysis.is_mika_name_question:
             yield "Меня зовут Мика! 🌸 Приятно познакомиться!"
             return
         
         # Проверяем на негативные или уклончивые ответы
-        negative_phrases = {'не хочу', 'не буду', 'не могу', 'не скажу', 'отстань', 'нет'}
-        if any(phrase in prompt.lower() for phrase in negative_phrases):
+        if analysis.is_negative:
             responses = [
                 "Я понимаю, что иногда не хочется разговаривать. Ничего страшного, я буду рядом, если захочешь пообщаться 🌸",
                 "Конечно, у тебя есть право не о��вечать. Я уважаю твоё решение ✨",
@@ -260,9 +520,9 @@ class Mika:
             return
         
         # Если это подтверждение имени пользователя
-        if message_info.get('requires_name_confirmation'):
-            name = message_info['name']
-            if prompt.lower().strip() in ['да', 'yes', 'верно', 'правильно', 'точно']:
+        if analysis.requires_name_confirmation:
+            name = analysis.name
+            if analysis.normalized in ['да', 'yes', 'верно', 'правильно', 'точно']:
                 self.dialog_manager.update_user_preferences({"name": name})
                 responses = [
                     f"Отлично! Приятно познакомиться, {name}! 🌟 Расскажи, чем ты увлекаешься?",
@@ -272,13 +532,12 @@ class Mika:
                 ]
                 yield random.choice(responses)
                 return
-            elif prompt.lower().strip() in ['нет', 'no', 'неверно', 'неправильно']:
+            elif analysis.normalized in ['нет', 'no', 'неверно', 'неправильно']:
                 yield "Ой, прости за ошибку! Как же тебя зовут? 🌸"
                 return
         
         # Проверяем, не тестирование ли это
-        test_phrases = {'тест', 'тестирую', 'проверяю', 'проверка'}
-        if any(phrase in prompt.lower() for phrase in test_phrases):
+        if analysis.is_test:
             responses = [
                 "Хорошо, я готова помочь тебе с тестированием! 🌟 Что именно ты хочешь проверить?",
                 "Я всегда рада помочь! Расскажи, что конкретно ты хотел бы протестировать? 💫",
@@ -289,30 +548,79 @@ class Mika:
             return
         
         # Формируем контекст для генерации ответа
-        context = self._build_context(prompt)
+        # Повторяющиеся вопросы без личного контекста берём из кэша ответов
+        cacheable = self.response_cache is not None and self._is_cacheable(analysis)
+        if cacheable:
+            cached = self.response_cache.get(prompt)
+            if cached:
+                self._update_context(prompt, cached)
+                with self.metrics.span('add_interaction_seconds'):
+                    self.dialog_manager.add_interaction(prompt, cached)
+                if self.memory is not None:
+                    self.memory.schedule_index()
+                if self.generation_mode == 'chat':
+                    self._remember_turn({"role": "user", "content": prompt}, cached)
+                self._save_state()
+                yield cached
+                return
+        
+        # Справку ищем в фоне, пока собирается остальной контекст
+        wiki_future = None
+        if analysis.wiki_topic and self.knowledge is not None:
+            wiki_future = self.knowledge.prefetch(analysis.wiki_topic)
+        memory_future = None
+        if self.memory is not None:
+            memory_future = self.memory.recall_async(self.dialog_manager.user_id, prompt, self.memory_k)
+        with self.metrics.span('build_context_seconds'):
+            context = self._build_context(prompt, analysis, wiki_future, memory_future)
         
         # Генерируем ответ
-        for chunk in self._stream_response(f"{context}\n\nСообщение пользователя: {prompt}"):
+        parts = []
+        # Очень длинное сообщение не должно вытеснить из окна модели всё остальное
+        message = truncate_tokens(prompt, self.max_message_tokens)
+        for chunk in self._stream_response(f"{context}\n\nСообщение пользователя: {message}", prompt):
+            parts.append(chunk)
             yield chunk
+        
+        if cacheable and self.last_generation_ok:
+            response = "".join(parts)
+            name = self.dialog_manager.get_user_preferences().get("name")
+            # Ответ с именем пользователя другим не подходит
+            if not name or name.lower() not in response.lower():
+                self.response_cache.put(prompt, response)
 
-    def _check_idle_time(self) -> bool:
-        """Проверяет время бездействия."""
-        return datetime.now() - self.last_interaction_time > timedelta(minutes=5)
+    def _is_cacheable(self, analysis: MessageAnalysis) -> bool:
+        """Проверяет, что ответ не зависит от личного контекста и истории диалога."""
+        if analysis.name or analysis.is_creator or analysis.is_personal:
+            return False
+        # Короткие уточнения («а почему?») понятны только в контексте прошлых ходов
+        words = [token for token in analysis.tokens if token.isalnum()]
+        if self.current_context and len(words) < 4:
+            return False
+        return True
 
-    def chat(self):
-        """Основной метод для общения."""
-        if not self._check_ollama_service():
-            print(f"{Fore.RED}Ошибка: Не удалось подключиться к сервису Ollama. Убедитесь, что он запущен.{Style.RESET_ALL}")
-            sys.exit(1)
+    def _own(self, resource):
+        """Запоминает ресурс, созданный этим экземпляром, для закрытия в close()."""
+        self._owned.append(resource)
+        return resource
 
-        # Очищаем старые сообщения при запуске
-        self.dialog_manager.clear_old_messages()
-        
-        # Получаем информацию о пользователе
+    def close(self):
+        """Дописывает отложенные записи и освобождает собственные ресурсы."""
+        self.dialog_manager.flush()
+        for resource in self._owned:
+            resource.close()
+        self._owned = []
+
+    def respond(self, message: str) -> Generator[str, None, None]:
+        """Генерирует ответ на сообщение пользователя без вывода в терминал."""
+        self.last_interaction_time = datetime.now()
+        return self._generate_response(message)
+
+    def greeting(self) -> str:
+        """Выбирает приветствие с учётом известного имени пользователя."""
         preferences = self.dialog_manager.get_user_preferences()
         name = preferences.get("name")
         
-        # Формируем приветствие
         if name:
             greetings = [
                 f"С возвращением, {name}! 💖 Я так рада тебя видеть! Как твои дела?",
@@ -320,7 +628,6 @@ class Mika:
                 f"{name}! 🌟 Как же здорово, что ты снова здесь! Расскажешь, что нового?",
                 f"Я так рада, что ты вернулся, {name}! 🌸 Как прошёл твой день?"
             ]
-            greeting = random.choice(greetings)
         else:
             greetings = [
                 "Привет! Я Мика, и я очень рада познакомиться! 💖 Как тебя зовут?",
@@ -328,19 +635,63 @@ class Mika:
                 "Приветствую! Я Мика, твой новый друг! 🌟 Как могу к тебе обращаться?",
                 "Привет-привет! Я Мика! 🌸 Мне бы очень хотелось узнать твоё имя!"
             ]
-            greeting = random.choice(greetings)
-        
-        # Показываем эффект печатания
-        with Live(self.typing_spinner, refresh_per_second=10, transient=True) as live:
-            time.sleep(1)
+        return random.choice(greetings)
+
+    def _check_idle_time(self) -> bool:
+        """Проверяет время бездействия."""
+        return datetime.now() - self.last_interaction_time > timedelta(minutes=5)
+
+    def chat(self):
+        """Основной метод для общения."""
+        try:
+            if not self._startup():
+                print(f"{Fore.RED}Ошибка: Не удалось подключиться к сервису Ollama. Убедитесь, что он запущен.{Style.RESET_ALL}")
+                sys.exit(1)
+            self._chat_loop()
+        finally:
+            self.close()
+
+    def _startup(self) -> bool:
+        """Подготовка к диалогу; возвращает доступность Ollama.
+
+        Проверка сервиса, очистка старых сообщений и загрузка профиля идут
+        одновременно, а модель тем временем загружается в память Ollama,
+        чтобы первое сообщение не ждало чтения весов.
+        """
+        if self.warmer is None:
+            options = {"num_ctx": self.num_ctx_option} if self.num_ctx_option else None
+            self.warmer = self._own(ModelWarmer(self.ollama, self.model, self.keep_alive, options, scheduler=self.scheduler))
+        self.warmer.warm_up()
+        with self.metrics.span('startup_seconds'):
+            with ThreadPoolExecutor(max_workers=4, thread_name_prefix='mika-startup') as startup:
+                tasks = [
+                    startup.submit(self._check_ollama_service),
+                    # Только если задан срок хранения (MIKA_RETENTION_DAYS); объём очистки
+                    # ограничен, остаток удалится при следующих запусках
+                    startup.submit(self.dialog_manager.clear_old_messages, max_batches=10),
+                    # Профиль попадает в кэш и нужен уже для приветствия
+                    startup.submit(self.dialog_manager.get_user_preferences),
+                    # Словарь тональности и стеммер загружаются до первого сообщения
+                    startup.submit(lambda: self.text_processor.lexicon),
+                ]
+                # Вместо фиксированной паузы «Мика печатает» ровно столько, сколько идёт подготовка
+                with Live(self.typing_spinner, refresh_per_second=10, transient=True):
+                    wait(tasks)
+        return tasks[0].result()
+
+    def _chat_loop(self):
+        """Цикл диалога с пользователем."""
+        # Формируем приветствие с учётом информации о пользователе
+        greeting = self.greeting()
         print(f"{Fore.MAGENTA}🎀 Мика: {greeting}{Style.RESET_ALL}")
         
         while True:
             try:
                 # Проверяем время бездействия
                 if self._check_idle_time():
-                    with Live(self.typing_spinner, refresh_per_second=10, transient=True) as live:
-                        time.sleep(0.5)
+                    # После долгой паузы модель могла быть выгружена: грузим её в фоне
+                    if self.warmer is not None:
+                        self.warmer.warm_up()
                     print(f"{Fore.MAGENTA}🎀 Мика: {random.choice(self.idle_messages)}{Style.RESET_ALL}")
                 
                 # Получаем ввод пользователя
@@ -357,24 +708,11 @@ class Mika:
                     name_part = f", {name}" if name else ""
                     farewell = random.choice(self.farewell_templates).format(name=name_part)
                     
-                    with Live(self.typing_spinner, refresh_per_second=10, transient=True) as live:
-                        time.sleep(0.5)
                     print(f"{Fore.MAGENTA}🎀 Мика: {farewell}{Style.RESET_ALL}")
                     break
                 
-                # Показываем эффект печатания
-                with Live(self.typing_spinner, refresh_per_second=10, transient=True) as live:
-                    time.sleep(0.5)
-                
-                # Выводим начало ответа и генерируем ответ
-                print(f"{Fore.MAGENTA}🎀 Мика:", end="", flush=True)
-                response_text = ""
-                for chunk in self._generate_response(user_input):
-                    # Убираем возможное дублирование "Мика:"
-                    chunk = re.sub(r'^Мика:\s*', '', chunk)
-                    response_text += chunk
-                    print(chunk, end="", flush=True)
-                print(f"{Style.RESET_ALL}")
+                # Спиннер «Мика печатает» — пока не пришёл первый токен, дальше вывод кадрами
+                self.renderer.render(self._generate_response(user_input))
                 
             except KeyboardInterrupt:
                 preferences = self.dialog_manager.get_user_preferences()
@@ -382,15 +720,11 @@ class Mika:
                 name_part = f", {name}" if name else ""
                 farewell = f"\nОй, уже уходишь{name_part}? Буду ждать нашей следующей встречи! 🌸"
                 
-                with Live(self.typing_spinner, refresh_per_second=10, transient=True) as live:
-                    time.sleep(0.5)
                 print(f"{Fore.MAGENTA}🎀 Мика: {farewell}{Style.RESET_ALL}")
                 break
                 
             except Exception as e:
                 log.exception("Ошибка в диалоге")
-                with Live(self.typing_spinner, refresh_per_second=10, transient=True) as live:
-                    time.sleep(0.5)
                 print(f"{Fore.MAGENTA}🎀 Мика: Извини, что-то пошло не так... Может, начнём сначала? 😔{Style.RESET_ALL}")
 
 if __name__ == "__main__":
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncGenerator, Dict, Generator, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger("mika")
+
+_DONE = object()
+
+
+class OllamaError(Exception):
+    """Ошибка при обращении к сервису Ollama."""
+
+
+class OllamaTimeout(OllamaError):
+    """Сервис Ollama не ответил за отведённое время."""
+
+
+class OllamaClient:
+    """Клиент Ollama с пулом keep-alive соединений и потоковой генерацией.
+
+    Все запросы идут через одну ``requests.Session``, поэтому TCP-соединения
+    переиспользуются между ходами диалога. Ожидание первого токена и пауза
+    между последующими строками потока ограничены отдельными таймаутами.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://127.0.0.1:11434",
+        connect_timeout: float = 3.0,
+        read_timeout: float = 30.0,
+        first_token_timeout: float = 120.0,
+        retries: int = 3,
+        backoff: float = 0.5,
+        pool_maxsize: int = 16,
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.first_token_timeout = first_token_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_maxsize = pool_maxsize
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def check_service(self) -> bool:
+        """Проверяет доступность сервиса Ollama."""
+        try:
+            response = self._request('GET', '/api/version', timeout=(self.connect_timeout, self.read_timeout))
+            response.raise_for_status()
+            return True
+        except Exception as e:
+            log.error(f"Ошибка подключения к Ollama: {str(e)}")
+            return False
+
+    def ping(self, timeout: Optional[float] = None) -> bool:
+        """Быстрая проверка доступности: одна попытка, без повторов и записи в журнал."""
+        try:
+            response = self.session.get(f"{self.base_url}/api/version", timeout=timeout or self.connect_timeout)
+            return response.ok
+        except requests.exceptions.RequestException:
+            return False
+
+    def warm_up(self, model: str, keep_alive: Any = '30m', options: Optional[Dict[str, Any]] = None) -> bool:
+        """Загружает модель в память без генерации: запрос /api/generate без промпта."""
+        payload: Dict[str, Any] = {'model': model, 'keep_alive': keep_alive, 'stream': False}
+        if options:
+            payload['options'] = options
+        try:
+            # Загрузка весов может идти долго, как и ожидание первого токена
+            response = self._request(
+                'POST', '/api/generate',
+                json=payload,
+                timeout=(self.connect_timeout, self.first_token_timeout)
+            )
+            response.raise_for_status()
+            return True
+        except Exception as e:
+            log.warning(f"Не удалось прогреть модель {model}: {str(e)}")
+            return False
+
+    def stream_generate(self, payload: Dict[str, Any]) -> Generator[Dict[str, Any], None, None]:
+        """Потоковая генерация через /api/generate: отдаёт разобранные строки NDJSON.
+
+        Закрытие генератора закрывает HTTP-ответ, и Ollama прекращает генерацию.
+        """
+        return self._stream('/api/generate', payload)
+
+    def stream_chat(self, payload: Dict[str, Any]) -> Generator[Dict[str, Any], None, None]:
+        """Потоковая генерация через /api/chat по списку сообщений."""
+        return self._stream('/api/chat', payload)
+
+    def astream_generate(self, payload: Dict[str, Any]) -> AsyncGenerator[Dict[str, Any], None]:
+        """Асинхронный вариант ``stream_generate`` для использования в ``async for``."""
+        return self._astream('/api/generate', payload)
+
+    def astream_chat(self, payload: Dict[str, Any]) -> AsyncGenerator[Dict[str, Any], None]:
+        """Асинхронный вариант ``stream_chat``."""
+        return self._astream('/api/chat', payload)
+
+    def _stream(self, path: str, payload: Dict[str, Any]) -> Generator[Dict[str, Any], None, None]:
+        response = self._open_stream(path, payload)
+        try:
+            for message in self._iter_messages(response):
+                yield message
+        finally:
+            response.close()
+
+    async def _astream(self, path: str, payload: Dict[str, Any]) -> AsyncGenerator[Dict[str, Any], None]:
+        """Асинхронный поток NDJSON.
+
+        Блокирующее чтение сокета выполняется в пуле потоков клиента, поэтому
+        цикл событий не блокируется; отмена задачи закрывает HTTP-ответ.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        response = await loop.run_in_executor(executor, self._open_stream, path, payload)
+        messages = self._iter_messages(response)
+        try:
+            while True:
+                message = await loop.run_in_executor(executor, next, messages, _DONE)
+                if message is _DONE:
+                    break
+                yield message
+        finally:
+            response.close()
+
+    def close(self):
+        """Закрывает пул соединений и пул потоков."""
+        self.session.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.pool_maxsize, thread_name_prefix='ollama')
+        return self._executor
+
+    def _request(self, method: str, path: str, **kwargs) -> requests.Response:
+        """Выполняет запрос с повтором и экспоненциальной задержкой при ошибках соединения."""
+        url = f"{self.base_url}{path}"
+        for attempt in range(self.retries + 1):
+            try:
+                return self.session.request(method, url, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                # ConnectTimeout тоже наследует ConnectionError; ReadTimeout — нет
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                log.warning(f"Не удалось подключиться к Ollama, повтор через {delay:.1f} с: {str(e)}")
+                time.sleep(delay)
+
+    def _open_stream(self, path: str, payload: Dict[str, Any]) -> requests.Response:
+        """Открывает потоковый запрос; до первого токена действует first_token_timeout."""
+        try:
+            response = self._request(
+                'POST', path,
+                json=payload,
+                stream=True,
+                timeout=(self.connect_timeout, self.first_token_timeout)
+            )
+        except requests.exceptions.ReadTimeout as e:
+            raise OllamaTimeout(f"Нет ответа от Ollama за {self.first_token_timeout} с") from e
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            response.close()
+            raise OllamaError(str(e)) from e
+        return response
+
+    def _iter_messages(self, response: requests.Response) -> Generator[Dict[str, Any], None, None]:
+        """Разбирает поток NDJSON; после первой строки включает read_timeout."""
+        first = True
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                if first:
+                    _set_read_timeout(response, self.read_timeout)
+                    first = False
+                message = json.loads(line)
+                if 'error' in message:
+                    raise OllamaError(message['error'])
+                yield message
+        except requests.exceptions.ConnectionError as e:
+            # urllib3 сообщает о таймауте чтения тела ответа как об ошибке соединения
+            if 'timed out' in str(e).lower():
+                raise OllamaTimeout(f"Поток Ollama прервался по таймауту: {str(e)}") from e
+            raise
+
+
+def message_text(message: Dict[str, Any]) -> str:
+    """Возвращает текст очередной строки потока /api/generate или /api/chat."""
+    if 'response' in message:
+        return message['response']
+    return message.get('message', {}).get('content', '')
+
+
+def _set_read_timeout(response: requests.Response, timeout: float):
+    """Меняет таймаут чтения сокета уже открытого ответа."""
+    connection = getattr(response.raw, 'connection', None) or getattr(response.raw, '_connection', None)
+    sock = getattr(connection, 'sock', None)
+    if sock is not None:
+        sock.settimeout(timeout)
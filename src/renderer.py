@@ -0,0 +1,96 @@
+import re
+import sys
+import threading
+from contextlib import nullcontext
+from typing import Iterable, Iterator, List, Optional, TextIO
+
+from rich.live import Live
+from rich.spinner import Spinner
+
+from .metrics import Metrics
+
+# Модель иногда начинает ответ с собственного имени; пробелы в начале тоже лишние
+_PREFIX = 'Мика:'
+_PREFIX_RE = re.compile(r'^\s*(?:Мика:\s*)?')
+
+
+class StreamRenderer:
+    """Печатает ответ, приходящий потоком токенов, не чаще ``fps`` кадров в секунду.
+
+    Пока нет первого токена, крутится спиннер «Мика печатает». Дальше токены
+    копятся в буфере, и отдельный поток раз в кадр выводит накопленное одной
+    записью с flush, а не по вызову на каждый токен. Повтор «Мика:» в начале
+    ответа убирается один раз.
+    """
+
+    def __init__(
+        self,
+        spinner: Spinner,
+        header: str = '',
+        footer: str = '\n',
+        fps: float = 30.0,
+        metrics: Optional[Metrics] = None,
+        out: Optional[TextIO] = None
+    ):
+        self.spinner = spinner
+        self.header = header
+        self.footer = footer
+        self.interval = 1.0 / fps
+        self.metrics = metrics
+        # По умолчанию sys.stdout на момент вывода: colorama подменяет его при init()
+        self.out = out
+
+    def render(self, chunks: Iterable[str]) -> str:
+        """Выводит поток и возвращает напечатанный текст целиком."""
+        out = self.out or sys.stdout
+        iterator = iter(chunks)
+        text = self._wait_first(iterator)
+        parts: List[str] = [text]
+        pending: List[str] = []
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def paint():
+            with lock:
+                if not pending:
+                    return
+                frame = ''.join(pending)
+                pending.clear()
+            out.write(frame)
+            out.flush()
+
+        def paint_loop():
+            while not stop.wait(self.interval):
+                paint()
+
+        out.write(self.header + text)
+        out.flush()
+        painter = threading.Thread(target=paint_loop, name='mika-render', daemon=True)
+        painter.start()
+        try:
+            for chunk in iterator:
+                parts.append(chunk)
+                with lock:
+                    pending.append(chunk)
+        finally:
+            stop.set()
+            painter.join()
+            pending.append(self.footer)
+            paint()
+        return ''.join(parts)
+
+    def _wait_first(self, iterator: Iterator[str]) -> str:
+        """Показывает спиннер до первого видимого текста и убирает «Мика:» в начале."""
+        head = ''
+        with self.metrics.span('spinner_seconds') if self.metrics is not None else nullcontext():
+            with Live(self.spinner, refresh_per_second=10, transient=True):
+                for chunk in iterator:
+                    head += chunk
+                    start = head.lstrip()
+                    # Начало ещё может оказаться префиксом «Мика:», ждём следующий кусок
+                    if len(start) < len(_PREFIX) and _PREFIX.startswith(start):
+                        continue
+                    # После «Мика:» ждём видимый текст, чтобы убрать и пробел за префиксом
+                    if _PREFIX_RE.sub('', head, count=1):
+                        break
+        return _PREFIX_RE.sub('', head, count=1)
@@ -0,0 +1,157 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+from .embeddings import Embedder
+
+log = logging.getLogger("mika")
+
+_NORMALIZE_RE = re.compile(r'[^\w\s]+')
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Нормализует вопрос для точного совпадения: регистр, пунктуация, пробелы."""
+    return ' '.join(_NORMALIZE_RE.sub(' ', prompt.lower().replace('ё', 'е')).split())
+
+
+class ResponseCache:
+    """Кэш ответов на повторяющиеся вопросы.
+
+    Сначала ищется точное совпадение нормализованного текста, затем ближайший
+    сосед по эмбеддингу: все векторы лежат в одной матрице NumPy, и поиск —
+    это одно матричное умножение. Ответ берётся из кэша, если близость не
+    ниже ``threshold``. При заполнении вытесняется запись, к которой дольше
+    всего не обращались. Без sentence-transformers кэш работает только по
+    точному совпадению.
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        threshold: float = 0.92,
+        max_entries: int = 2048,
+        ttl: Optional[float] = 24 * 3600
+    ):
+        self.embedder = embedder if embedder is not None else Embedder()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._created = np.zeros(max_entries, dtype=np.float64)
+        self._valid = np.zeros(max_entries, dtype=bool)
+        self._responses = [None] * max_entries
+        self._keys = [None] * max_entries
+        self._slot_by_key: Dict[str, int] = {}
+        self._free = list(range(max_entries - 1, -1, -1))
+        # Векторы последних запросов, чтобы put() не считал эмбеддинг повторно
+        self._recent_vectors: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+        self._semantic = True
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._slot_by_key)
+
+    def get(self, prompt: str) -> Optional[str]:
+        """Возвращает сохранённый ответ на такой же или близкий по смыслу вопрос."""
+        key = normalize_prompt(prompt)
+        if not key:
+            return None
+        now = time.time()
+
+        with self._lock:
+            slot = self._slot_by_key.get(key)
+            if slot is not None and self._is_fresh(slot, now):
+                return self._hit(slot, now)
+
+        vector = self._embed(key)
+        if vector is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            if self._matrix is not None and self._valid.any():
+                scores = self._matrix @ vector
+                scores[~self._valid] = -1.0
+                if self.ttl is not None:
+                    scores[now - self._created > self.ttl] = -1.0
+                slot = int(np.argmax(scores))
+                if scores[slot] >= self.threshold:
+                    return self._hit(slot, now)
+            self.misses += 1
+            return None
+
+    def put(self, prompt: str, response: str):
+        """Сохраняет ответ; при заполнении вытесняет давно не использованную запись."""
+        key = normalize_prompt(prompt)
+        if not key or not response:
+            return
+        vector = self._embed(key)
+        now = time.time()
+
+        with self._lock:
+            slot = self._slot_by_key.get(key)
+            if slot is None:
+                if self._free:
+                    slot = self._free.pop()
+                else:
+                    slot = int(np.argmin(self._last_used))
+                    self._slot_by_key.pop(self._keys[slot], None)
+            if vector is not None:
+                if self._matrix is None:
+                    self._matrix = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._matrix[slot] = vector
+                self._valid[slot] = True
+            else:
+                # Без вектора запись доступна только по точному совпадению
+                self._valid[slot] = False
+            self._keys[slot] = key
+            self._responses[slot] = response
+            self._created[slot] = now
+            self._last_used[slot] = now
+            self._slot_by_key[key] = slot
+
+    def clear(self):
+        with self._lock:
+            self._valid[:] = False
+            self._last_used[:] = 0
+            self._slot_by_key.clear()
+            self._free = list(range(self.max_entries - 1, -1, -1))
+            self._responses = [None] * self.max_entries
+            self._keys = [None] * self.max_entries
+
+    def _is_fresh(self, slot: int, now: float) -> bool:
+        return self.ttl is None or now - self._created[slot] <= self.ttl
+
+    def _hit(self, slot: int, now: float) -> str:
+        """Отмечает попадание; вызывается под self._lock."""
+        self._last_used[slot] = now
+        self.hits += 1
+        return self._responses[slot]
+
+    def _embed(self, key: str) -> Optional[np.ndarray]:
+        if not self._semantic:
+            return None
+        with self._lock:
+            vector = self._recent_vectors.get(key)
+        if vector is not None:
+            return vector
+        try:
+            vector = self.embedder.encode_one(key)
+        except ImportError as e:
+            log.warning(f"sentence-transformers недоступен, кэш ответов работает только по точному совпадению: {str(e)}")
+            self._semantic = False
+            return None
+        with self._lock:
+            self._recent_vectors[key] = vector
+            if len(self._recent_vectors) > 64:
+                self._recent_vectors.popitem(last=False)
+        return vector
@@ -0,0 +1,139 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, Optional
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+
+
+class SchedulerOverloaded(Exception):
+    """Генерация не допущена: очередь переполнена или ожидание слишком долгое."""
+
+    def __init__(self, message: str, queue_depth: int = 0):
+        super().__init__(message)
+        self.queue_depth = queue_depth
+
+
+class _Ticket:
+    __slots__ = ('session_id', 'priority', 'granted')
+
+    def __init__(self, session_id: str, priority: int):
+        self.session_id = session_id
+        self.priority = priority
+        self.granted = False
+
+
+class GenerationScheduler:
+    """Ограничивает число одновременных запросов к модели и делит очередь между сессиями.
+
+    Свободный слот получает ожидающий с наивысшим приоритетом; внутри одного
+    приоритета сессии обслуживаются по кругу, поэтому активная сессия не
+    вытесняет остальных. При переполнении очереди запрос сразу отклоняется.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 2,
+        max_queue: int = 16,
+        max_queue_per_session: int = 2,
+        queue_timeout: float = 60.0
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queue_per_session = max_queue_per_session
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._running = 0
+        self._queued = 0
+        # приоритет -> сессия -> очередь билетов; порядок сессий задаёт круговой обход
+        self._queues: Dict[int, 'OrderedDict[str, Deque[_Ticket]]'] = {}
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def acquire(self, session_id: str, priority: int = PRIORITY_NORMAL, timeout: Optional[float] = None) -> _Ticket:
+        """Ждёт свободный слот генерации; при перегрузке бросает SchedulerOverloaded."""
+        timeout = self.queue_timeout if timeout is None else timeout
+        ticket = _Ticket(session_id, priority)
+        with self._cond:
+            if self._running < self.max_concurrent and not self._queued:
+                self._running += 1
+                ticket.granted = True
+                return ticket
+
+            sessions = self._queues.setdefault(priority, OrderedDict())
+            session_queue = sessions.get(session_id)
+            # Короткие запросы высокого приоритета не упираются в общий лимит очереди
+            queue_full = priority > PRIORITY_HIGH and self._queued >= self.max_queue
+            if queue_full or (
+                session_queue is not None and len(session_queue) >= self.max_queue_per_session
+            ):
+                raise SchedulerOverloaded('Очередь генерации переполнена', self._queued)
+
+            if session_queue is None:
+                session_queue = sessions[session_id] = deque()
+            session_queue.append(ticket)
+            self._queued += 1
+
+            deadline = time.monotonic() + timeout
+            while not ticket.granted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._remove(ticket)
+                    raise SchedulerOverloaded('Превышено время ожидания в очереди генерации', self._queued)
+                self._cond.wait(remaining)
+            return ticket
+
+    def release(self, ticket: _Ticket):
+        """Освобождает слот и передаёт его следующему в очереди."""
+        with self._cond:
+            if not ticket.granted:
+                return
+            ticket.granted = False
+            self._running -= 1
+            self._grant_next()
+
+    @contextmanager
+    def slot(self, session_id: str, priority: int = PRIORITY_NORMAL, timeout: Optional[float] = None) -> Iterator[None]:
+        """Контекстный менеджер вокруг acquire/release."""
+        ticket = self.acquire(session_id, priority, timeout)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def _grant_next(self):
+        """Выдаёт освободившиеся слоты; вызывается под self._cond."""
+        granted = False
+        while self._running < self.max_concurrent and self._queued:
+            priority = min(p for p, sessions in self._queues.items() if sessions)
+            sessions = self._queues[priority]
+            session_id, session_queue = next(iter(sessions.items()))
+            ticket = session_queue.popleft()
+            if session_queue:
+                sessions.move_to_end(session_id)
+            else:
+                del sessions[session_id]
+            self._queued -= 1
+            self._running += 1
+            ticket.granted = True
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _remove(self, ticket: _Ticket):
+        """Убирает билет из очереди после таймаута; вызывается под self._cond."""
+        sessions = self._queues.get(ticket.priority, {})
+        session_queue = sessions.get(ticket.session_id)
+        if session_queue is not None and ticket in session_queue:
+            session_queue.remove(ticket)
+            self._queued -= 1
+            if not session_queue:
+                del sessions[ticket.session_id]
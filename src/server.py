@@ -0,0 +1,443 @@
+"""
+Асинхронный HTTP-сервер, обслуживающий много сессий Мики в одном процессе.
+
+Маршруты:
+    POST   /sessions/<id>/messages   {"message": "...", "user_id": "..."} — ответ потоком SSE
+    GET    /sessions/<id>/greeting   приветствие для сессии (JSON), можно ?user_id=...
+    DELETE /sessions/<id>            завершить сессию
+    GET    /health                   проверка доступности
+    GET    /metrics                  замеры этапов хода в формате Prometheus
+
+Без user_id пользователем сессии считается она сама, поэтому разные сессии
+не делят профиль и память. Сессия привязывается к пользователю при первом
+запросе, привязка хранится в базе; запрос с другим user_id получает 409.
+
+Запуск: python -m src.server --host 127.0.0.1 --port 8080
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .backend_router import OllamaRouter
+from .dialog_manager import DialogManager, migrate_schema
+from .message_analysis import MessageAnalyzer
+from .mika import DEFAULT_MODEL, Mika
+from .ollama_client import OllamaClient
+from .scheduler import GenerationScheduler
+from .session_state import SessionStateCache
+from .embeddings import Embedder
+from .knowledge import KnowledgeBase
+from .memory import LongTermMemory
+from .metrics import JsonLinesSink, Metrics
+from .response_cache import ResponseCache
+from .storage import Storage
+from .text_processor import TextProcessor
+from .warmup import ModelWarmer
+
+log = logging.getLogger("mika")
+
+_DONE = object()
+_SESSION_PATH_RE = re.compile(r'^/sessions/([A-Za-z0-9_.\-]{1,64})(/messages|/greeting)?$')
+_MAX_BODY = 64 * 1024
+
+_REASONS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    409: 'Conflict', 413: 'Payload Too Large', 500: 'Internal Server Error',
+}
+
+
+class HTTPError(Exception):
+    """Ошибка запроса с HTTP-кодом ответа."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Session:
+    """Сессия: собственный экземпляр Мики и блокировка, упорядочивающая ходы."""
+
+    __slots__ = ('session_id', 'mika', 'lock')
+
+    def __init__(self, session_id: str, mika: Mika):
+        self.session_id = session_id
+        self.mika = mika
+        self.lock = asyncio.Lock()
+
+
+class MikaServer:
+    """Сервер сессий поверх asyncio.
+
+    Хранилище, клиент Ollama и анализатор текста общие для всех сессий;
+    контекст диалога и профиль у каждой сессии свои. Генерация идёт в пуле
+    потоков, токены отправляются клиенту по мере поступления от Ollama.
+    """
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 8080,
+        db_path: str = 'mika_data.db',
+        knowledge_db_path: Optional[str] = None,
+        ollama_client: Optional[OllamaClient] = None,
+        scheduler: Optional[GenerationScheduler] = None,
+        response_cache: Optional[ResponseCache] = None,
+        metrics: Optional[Metrics] = None,
+        memory_dir: Optional[str] = None,
+        embedder: Optional[Embedder] = None,
+        max_sessions: int = 1000,
+        workers: int = 32,
+        mika_options: Optional[Dict[str, Any]] = None
+    ):
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        self.mika_options = mika_options or {}
+        self.storage = Storage(db_path)
+        # Привязка сессий к пользователям проверяется до создания первой сессии
+        migrate_schema(self.storage)
+        # Профили и контекст сессий в памяти; выгруженная сессия восстанавливается из базы
+        self.state_cache = SessionStateCache(self.storage, max_entries=max(4096, max_sessions * 2))
+        self.ollama = ollama_client or OllamaClient(pool_maxsize=workers)
+        # Очередь ожидания должна быть меньше пула потоков, иначе ожидающие
+        # генерации займут все потоки и задержат быстрые ответы-заготовки
+        self.scheduler = scheduler or GenerationScheduler(max_queue=max(1, workers // 2))
+        self.text_processor = TextProcessor()
+        self.analyzer = MessageAnalyzer(self.text_processor)
+        self.response_cache = response_cache
+        self.metrics = metrics or Metrics()
+        # Долговременная память индексирует общую базу диалогов сразу для всех пользователей
+        self.memory = LongTermMemory(self.storage, memory_dir, embedder) if memory_dir else None
+        # Справки из Wikipedia включаются путём к их кэшу
+        self.knowledge = (
+            KnowledgeBase(knowledge_db_path, fetcher=self.text_processor.fetch_wiki_summary)
+            if knowledge_db_path else None
+        )
+        # Модель общая для всех сессий, поэтому и прогрев один
+        num_ctx = self.mika_options.get('num_ctx')
+        self.warmer = ModelWarmer(
+            self.ollama,
+            self.mika_options.get('model', DEFAULT_MODEL),
+            self.mika_options.get('keep_alive', '30m'),
+            {'num_ctx': num_ctx} if num_ctx else None,
+            scheduler=self.scheduler
+        )
+        self.sessions: 'OrderedDict[str, Session]' = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mika-session')
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        """Начинает принимать соединения; модель тем временем загружается в фоне."""
+        self.warmer.warm_up()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        sockname = self._server.sockets[0].getsockname()
+        self.port = sockname[1]
+        log.info(f"Сервер Мики слушает http://{sockname[0]}:{sockname[1]}")
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        """Останавливает сервер и освобождает общие ресурсы."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for session in self.sessions.values():
+            session.mika.close()
+        self.sessions.clear()
+        self._executor.shutdown(wait=True)
+        self.warmer.close()
+        self.storage.close()
+        if self.memory is not None:
+            self.memory.close()
+        if self.knowledge is not None:
+            self.knowledge.close()
+        self.ollama.close()
+        self.metrics.close()
+
+    def get_session(self, session_id: str, user_id: Optional[str] = None) -> Session:
+        """Возвращает сессию, создавая её при первом обращении.
+
+        Новая сессия без ``user_id`` принадлежит пользователю с id сессии.
+        Владелец берётся из привязки в базе, а не из таблицы сессий в памяти,
+        поэтому запрос от имени другого пользователя получает 409 и после
+        выгрузки сессии или перезапуска сервера.
+        """
+        owner = self.state_cache.session_owner(session_id, user_id or session_id)
+        if user_id is not None and user_id != owner:
+            raise HTTPError(409, f'Сессия {session_id} принадлежит другому пользователю')
+        session = self.sessions.get(session_id)
+        if session is not None:
+            self.sessions.move_to_end(session_id)
+            return session
+        user_id = owner
+
+        dialog_manager = DialogManager(
+            storage=self.storage,
+            session_id=session_id,
+            user_id=user_id,
+            analyzer=self.analyzer,
+            state_cache=self.state_cache
+        )
+        mika = Mika(
+            ollama_client=self.ollama,
+            dialog_manager=dialog_manager,
+            text_processor=self.text_processor,
+            scheduler=self.scheduler,
+            knowledge=self.knowledge,
+            response_cache=self.response_cache,
+            metrics=self.metrics,
+            memory=self.memory,
+            warmer=self.warmer,
+            **self.mika_options
+        )
+        session = Session(session_id, mika)
+        self.sessions[session_id] = session
+        self._evict_sessions()
+        return session
+
+    def _evict_sessions(self):
+        """Выгружает давно неактивные сессии сверх лимита (их история остаётся в БД)."""
+        for session_id in list(self.sessions):
+            if len(self.sessions) <= self.max_sessions:
+                break
+            session = self.sessions[session_id]
+            if not session.lock.locked():
+                del self.sessions[session_id]
+                session.mika.close()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {'error': str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, query, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                try:
+                    await self._dispatch(writer, method, path, query, body, keep_alive)
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {'error': str(e)}, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception:
+            log.exception("Ошибка при обработке соединения")
+        finally:
+            writer.close()
+
+    async def _read_request(
+        self, reader: asyncio.StreamReader
+    ) -> Optional[Tuple[str, str, Dict[str, str], Dict[str, str], bytes]]:
+        """Читает один HTTP-запрос; None — клиент закрыл соединение."""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            raise HTTPError(400, 'Некорректная строка запроса')
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0) or 0)
+        except ValueError:
+            raise HTTPError(400, 'Некорректный Content-Length')
+        if length < 0:
+            raise HTTPError(400, 'Некорректный Content-Length')
+        if length > _MAX_BODY:
+            raise HTTPError(413, 'Слишком большое тело запроса')
+        body = await reader.readexactly(length) if length else b''
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        return method.upper(), url.path, query, headers, body
+
+    async def _dispatch(
+        self, writer: asyncio.StreamWriter, method: str, path: str,
+        query: Dict[str, str], body: bytes, keep_alive: bool
+    ):
+        if path == '/health':
+            await self._send_json(writer, 200, {
+                'status': 'ok',
+                'sessions': len(self.sessions),
+                'generations_running': self.scheduler.running,
+                'generations_queued': self.scheduler.queue_depth,
+                'backends': self.ollama.status() if isinstance(self.ollama, OllamaRouter) else None,
+            }, keep_alive)
+            return
+        if path == '/metrics':
+            await self._send_body(
+                writer, 200, self.metrics.render_prometheus().encode('utf-8'),
+                'text/plain; version=0.0.4; charset=utf-8', keep_alive
+            )
+            return
+
+        match = _SESSION_PATH_RE.match(path)
+        if not match:
+            raise HTTPError(404, 'Маршрут не найден')
+        session_id, action = match.groups()
+
+        if action == '/messages' and method == 'POST':
+            payload = _parse_json(body)
+            message = str(payload.get('message', '')).strip()
+            if not message:
+                raise HTTPError(400, 'Пустое сообщение')
+            user_id = payload.get('user_id')
+            session = self.get_session(session_id, str(user_id) if user_id else None)
+            await self._stream_reply(writer, session, message, keep_alive)
+        elif action == '/greeting' and method == 'GET':
+            session = self.get_session(session_id, query.get('user_id') or None)
+            loop = asyncio.get_running_loop()
+            greeting = await loop.run_in_executor(self._executor, session.mika.greeting)
+            await self._send_json(writer, 200, {'greeting': greeting}, keep_alive)
+        elif action is None and method == 'DELETE':
+            session = self.sessions.pop(session_id, None)
+            if session is not None:
+                async with session.lock:
+                    session.mika.close()
+            await self._send_json(writer, 200, {'closed': session is not None}, keep_alive)
+        else:
+            raise HTTPError(405, 'Метод не поддерживается')
+
+    async def _stream_reply(self, writer: asyncio.StreamWriter, session: Session, message: str, keep_alive: bool):
+        """Отправляет ответ Мики потоком SSE поверх chunked transfer encoding."""
+        loop = asyncio.get_running_loop()
+        async with session.lock:
+            writer.write(_status_line(200) + _headers({
+                'Content-Type': 'text/event-stream; charset=utf-8',
+                'Cache-Control': 'no-cache',
+                'Transfer-Encoding': 'chunked',
+                'Connection': 'keep-alive' if keep_alive else 'close',
+            }))
+            chunks = session.mika.respond(message)
+            parts = []
+            try:
+                while True:
+                    chunk = await loop.run_in_executor(self._executor, next, chunks, _DONE)
+                    if chunk is _DONE:
+                        break
+                    parts.append(chunk)
+                    await _write_chunk(writer, _sse({'token': chunk}))
+                await _write_chunk(writer, _sse({'text': ''.join(parts)}, event='done'))
+                writer.write(b'0\r\n\r\n')
+                await writer.drain()
+            finally:
+                # При обрыве соединения закрываем генератор: это прерывает запрос к Ollama
+                await loop.run_in_executor(self._executor, chunks.close)
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any], keep_alive: bool = True):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        await self._send_body(writer, status, body, 'application/json; charset=utf-8', keep_alive)
+
+    async def _send_body(self, writer: asyncio.StreamWriter, status: int, body: bytes, content_type: str, keep_alive: bool = True):
+        writer.write(_status_line(status) + _headers({
+            'Content-Type': content_type,
+            'Content-Length': str(len(body)),
+            'Connection': 'keep-alive' if keep_alive else 'close',
+        }) + body)
+        await writer.drain()
+
+
+def _parse_json(body: bytes) -> Dict[str, Any]:
+    try:
+        payload = json.loads(body or b'{}')
+    except ValueError:
+        raise HTTPError(400, 'Тело запроса должно быть JSON')
+    if not isinstance(payload, dict):
+        raise HTTPError(400, 'Тело запроса должно быть JSON-объектом')
+    return payload
+
+
+def _status_line(status: int) -> bytes:
+    return f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n".encode('latin-1')
+
+
+def _headers(headers: Dict[str, str]) -> bytes:
+    return ''.join(f"{name}: {value}\r\n" for name, value in headers.items()).encode('latin-1') + b'\r\n'
+
+
+def _sse(data: Dict[str, Any], event: Optional[str] = None) -> bytes:
+    prefix = f"event: {event}\n" if event else ''
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8')
+
+
+async def _write_chunk(writer: asyncio.StreamWriter, data: bytes):
+    writer.write(f"{len(data):x}\r\n".encode('latin-1') + data + b'\r\n')
+    await writer.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Сервер Мики для множества сессий')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--db', default='mika_data.db', help='путь к базе диалогов')
+    parser.add_argument('--ollama-url', default='http://127.0.0.1:11434')
+    parser.add_argument('--backend', action='append', metavar='URL[=MODEL]',
+                        help='сервер Ollama (можно несколько); запросы распределяются между ними')
+    parser.add_argument('--workers', type=int, default=32, help='число одновременных генераций')
+    parser.add_argument('--max-sessions', type=int, default=1000)
+    parser.add_argument('--max-generations', type=int, default=2, help='одновременных запросов к модели')
+    parser.add_argument('--max-queue', type=int, default=16, help='длина очереди генераций до отказа')
+    parser.add_argument('--response-cache', action='store_true', help='отвечать на повторные вопросы из кэша')
+    parser.add_argument('--cache-threshold', type=float, default=0.92, help='минимальная близость для ответа из кэша')
+    parser.add_argument('--knowledge-db', help='включить справки из Wikipedia с кэшем в этой базе')
+    parser.add_argument('--memory-dir', help='включить долговременную память с индексом в этом каталоге')
+    parser.add_argument('--metrics-log', help='дописывать каждое измерение в файл JSON Lines')
+    args = parser.parse_args()
+
+    # Одна модель эмбеддингов на кэш ответов и память
+    embedder = Embedder() if args.response_cache or args.memory_dir else None
+    server = MikaServer(
+        host=args.host,
+        port=args.port,
+        db_path=args.db,
+        knowledge_db_path=args.knowledge_db,
+        ollama_client=(
+            OllamaRouter(args.backend, pool_maxsize=args.workers) if args.backend
+            else OllamaClient(args.ollama_url, pool_maxsize=args.workers)
+        ),
+        scheduler=GenerationScheduler(max_concurrent=args.max_generations, max_queue=args.max_queue),
+        response_cache=ResponseCache(embedder, threshold=args.cache_threshold) if args.response_cache else None,
+        metrics=Metrics(sink=JsonLinesSink(args.metrics_log) if args.metrics_log else None),
+        memory_dir=args.memory_dir,
+        embedder=embedder,
+        max_sessions=args.max_sessions,
+        workers=args.workers
+    )
+
+    async def run():
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .storage import Storage
+
+_UPSERT_PREFERENCE_SQL = '''INSERT OR REPLACE INTO user_preferences (user_id, key, value, timestamp)
+                           VALUES (?, ?, ?, CURRENT_TIMESTAMP)'''
+_SELECT_PREFERENCES_SQL = 'SELECT key, value FROM user_preferences WHERE user_id = ?'
+_UPSERT_STATE_SQL = '''INSERT OR REPLACE INTO session_state (session_id, user_id, state, updated)
+                      VALUES (?, ?, ?, CURRENT_TIMESTAMP)'''
+_SELECT_STATE_SQL = '''SELECT state FROM session_state
+                      WHERE session_id = ? AND user_id = ? AND updated >= datetime('now', ?)'''
+# Сессия, у которой уже есть история (например, перенесённая из старой базы), принадлежит автору истории
+_BIND_SESSION_SQL = '''INSERT OR IGNORE INTO sessions (session_id, user_id)
+                       VALUES (?, COALESCE((SELECT user_id FROM messages WHERE session_id = ? ORDER BY id LIMIT 1), ?))'''
+_SELECT_OWNER_SQL = 'SELECT user_id FROM sessions WHERE session_id = ?'
+
+
+class SessionStateCache:
+    """Профили пользователей и контекст сессий в памяти со сквозной записью в базу.
+
+    Профиль читается из базы и декодируется из JSON один раз, дальше ход берёт
+    его из памяти; изменения сначала пишутся в базу, затем в кэш. Контекст
+    сессии (последние реплики и история чата) после каждого хода ставится
+    в очередь отложенной записи, поэтому перезапущенный процесс продолжает
+    разговор с того же места. Снимки старше ``max_age`` секунд не
+    восстанавливаются: такой разговор уже закончился.
+
+    Сессия привязывается к пользователю при первом обращении, и привязка
+    хранится в базе: контекст сессии отдаётся только её владельцу, даже после
+    выгрузки сессии из памяти или перезапуска.
+
+    Кэш можно разделить между сессиями одного хранилища. Если базу меняет
+    другой процесс, кэш сбрасывается явно через ``invalidate``.
+    """
+
+    def __init__(self, storage: Storage, max_entries: int = 4096, max_age: float = 24 * 3600):
+        self.storage = storage
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._preferences: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        # Ключ — (сессия, пользователь): чужой пользователь не получит контекст из памяти
+        self._states: 'OrderedDict[Tuple[str, str], Optional[Dict[str, Any]]]' = OrderedDict()
+        self._owners: 'OrderedDict[str, str]' = OrderedDict()
+        # Загрузка из базы тоже под блокировкой: иначе запись, пришедшая во время
+        # чтения, затёрлась бы устаревшими данными
+        self._lock = threading.Lock()
+
+    def preferences(self, user_id: str) -> Dict[str, Any]:
+        """Возвращает копию профиля пользователя."""
+        with self._lock:
+            cached = self._preferences.get(user_id)
+            if cached is None:
+                rows = self.storage.query(_SELECT_PREFERENCES_SQL, (user_id,))
+                cached = {key: json.loads(value) for key, value in rows}
+                self._put(self._preferences, user_id, cached)
+            else:
+                self._preferences.move_to_end(user_id)
+            return dict(cached)
+
+    def update_preferences(self, user_id: str, preferences: Dict[str, Any]):
+        """Записывает настройки в базу и, если профиль уже в памяти, обновляет его."""
+        with self._lock:
+            # Профиль (имя, интересы) меняется редко и терять его нельзя: фиксируем с FULL
+            self.storage.executemany(
+                _UPSERT_PREFERENCE_SQL,
+                [(user_id, key, json.dumps(value)) for key, value in preferences.items()],
+                durable=True
+            )
+            cached = self._preferences.get(user_id)
+            if cached is not None:
+                cached.update(preferences)
+
+    def session_owner(self, session_id: str, user_id: str) -> str:
+        """Владелец сессии; сессия без владельца привязывается к ``user_id``.
+
+        Привязка фиксируется в базе сразу (с synchronous=FULL) и больше не
+        меняется, поэтому её можно держать в памяти.
+        """
+        with self._lock:
+            owner = self._owners.get(session_id)
+            if owner is None:
+                with self.storage.transaction(durable=True) as conn:
+                    conn.execute(_BIND_SESSION_SQL, (session_id, session_id, user_id))
+                    owner = conn.execute(_SELECT_OWNER_SQL, (session_id,)).fetchone()[0]
+                self._put(self._owners, session_id, owner)
+            else:
+                self._owners.move_to_end(session_id)
+            return owner
+
+    def load_state(self, session_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Последний сохранённый контекст сессии этого пользователя или None."""
+        key = (session_id, user_id)
+        with self._lock:
+            if key in self._states:
+                self._states.move_to_end(key)
+                return self._states[key]
+            row = self.storage.query_one(_SELECT_STATE_SQL, (session_id, user_id, f'-{int(self.max_age)} seconds'))
+            state = json.loads(row[0]) if row else None
+            self._put(self._states, key, state)
+            return state
+
+    def save_state(self, session_id: str, user_id: str, state: Dict[str, Any]):
+        """Запоминает контекст сессии и ставит его в очередь записи в базу."""
+        payload = json.dumps(state, ensure_ascii=False)
+        with self._lock:
+            self._put(self._states, (session_id, user_id), state)
+        self.storage.submit(_UPSERT_STATE_SQL, (session_id, user_id, payload))
+
+    def invalidate(self, user_id: Optional[str] = None, session_id: Optional[str] = None):
+        """Сбрасывает профиль пользователя и/или контекст сессии; без аргументов — всё."""
+        with self._lock:
+            if user_id is None and session_id is None:
+                self._preferences.clear()
+                self._states.clear()
+                self._owners.clear()
+                return
+            if user_id is not None:
+                self._preferences.pop(user_id, None)
+            if session_id is not None:
+                for key in [key for key in self._states if key[0] == session_id]:
+                    del self._states[key]
+
+    def _put(self, entries: 'OrderedDict[Any, Any]', key: Any, value: Any):
+        """Кладёт запись, вытесняя давно не используемые; вызывается под self._lock."""
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
@@ -0,0 +1,252 @@
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Уровни PRAGMA synchronous по возрастанию надёжности
+_SYNCHRONOUS_LEVELS = {'OFF': 0, 'NORMAL': 1, 'FULL': 2, 'EXTRA': 3}
+
+
+class Storage:
+    """Хранилище SQLite с одним постоянным соединением и отложенной групповой записью.
+
+    Соединение открывается один раз в режиме WAL, подготовленные выражения
+    кэшируются модулем sqlite3 по тексту запроса. Записи, переданные через
+    ``submit``, копятся в очереди и фиксируются фоновым потоком пачками
+    в одной транзакции. Чтения видят все ранее отправленные записи: перед
+    запросом очередь дописывается в базу под той же блокировкой.
+
+    Надёжность записи — компромисс ради скорости хода. ``submit`` возвращает
+    управление до фиксации: при падении процесса теряются записи последних
+    ``flush_interval`` секунд, точкой сохранности служат ``flush`` и ``close``.
+    По умолчанию ``synchronous=NORMAL``: в режиме WAL база не повреждается,
+    но при отключении питания могут пропасть последние зафиксированные
+    транзакции (с FULL, как было раньше, — нет). Уровень задаётся параметром
+    ``synchronous`` или переменной окружения MIKA_DB_SYNCHRONOUS, а записи,
+    которые нельзя терять (профиль пользователя), выполняются с
+    ``durable=True`` — их транзакция фиксируется с synchronous=FULL.
+    """
+
+    def __init__(
+        self,
+        db_path: Union[str, Path],
+        batch_size: int = 256,
+        flush_interval: float = 0.05,
+        cached_statements: int = 128,
+        synchronous: Optional[str] = None,
+    ):
+        synchronous = (synchronous or os.environ.get('MIKA_DB_SYNCHRONOUS') or 'NORMAL').upper()
+        if synchronous not in _SYNCHRONOUS_LEVELS:
+            raise ValueError(f"Неизвестный режим synchronous: {synchronous!r}")
+        self.db_path = Path(db_path)
+        self.synchronous = synchronous
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # _conn_lock защищает соединение, _pending — очередь записей.
+        # Очередь забирается только под _conn_lock, поэтому порядок записей сохраняется.
+        self._conn_lock = threading.RLock()
+        self._pending_cond = threading.Condition(threading.Lock())
+        self._pending: List[Tuple[str, Tuple[Any, ...]]] = []
+        self._closed = False
+
+        self._conn = sqlite3.connect(
+            str(self.db_path),
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=cached_statements,
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(f'PRAGMA synchronous={synchronous}')
+
+        self._writer = threading.Thread(
+            target=self._writer_loop,
+            name=f'storage-writer:{self.db_path.name}',
+            daemon=True
+        )
+        self._writer.start()
+        atexit.register(self.close)
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def submit(self, sql: str, params: Sequence[Any] = ()):
+        """Ставит запись в очередь отложенной записи."""
+        with self._pending_cond:
+            if self._closed:
+                raise sqlite3.ProgrammingError('Хранилище закрыто')
+            self._pending.append((sql, tuple(params)))
+            self._pending_cond.notify_all()
+
+    def execute(self, sql: str, params: Sequence[Any] = (), durable: bool = False) -> int:
+        """Синхронно выполняет запись и возвращает число затронутых строк."""
+        with self.transaction(durable) as conn:
+            return conn.execute(sql, params).rowcount
+
+    def executemany(self, sql: str, seq_of_params: Sequence[Sequence[Any]], durable: bool = False) -> int:
+        """Синхронно выполняет запись для набора параметров."""
+        with self.transaction(durable) as conn:
+            return conn.executemany(sql, seq_of_params).rowcount
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[Tuple]:
+        """Выполняет запрос на чтение и возвращает все строки."""
+        with self._conn_lock:
+            self._drain_locked()
+            return self._conn.execute(sql, params).fetchall()
+
+    def query_one(self, sql: str, params: Sequence[Any] = ()) -> Optional[Tuple]:
+        """Выполняет запрос на чтение и возвращает первую строку."""
+        with self._conn_lock:
+            self._drain_locked()
+            return self._conn.execute(sql, params).fetchone()
+
+    @contextmanager
+    def transaction(self, durable: bool = False) -> Iterator[sqlite3.Connection]:
+        """Открывает явную транзакцию на постоянном соединении.
+
+        ``durable`` фиксирует транзакцию с synchronous=FULL: она переживёт
+        и отключение питания.
+        """
+        with self._conn_lock:
+            self._drain_locked()
+            upgrade = durable and _SYNCHRONOUS_LEVELS[self.synchronous] < _SYNCHRONOUS_LEVELS['FULL']
+            if upgrade:
+                self._conn.execute('PRAGMA synchronous=FULL')
+            try:
+                self._conn.execute('BEGIN')
+                try:
+                    yield self._conn
+                except BaseException:
+                    self._conn.execute('ROLLBACK')
+                    raise
+                else:
+                    self._conn.execute('COMMIT')
+            finally:
+                if upgrade:
+                    self._conn.execute(f'PRAGMA synchronous={self.synchronous}')
+
+    def migrate(self, migrations: Sequence[Tuple[int, Sequence[str]]]) -> int:
+        """Применяет версионные миграции схемы и возвращает итоговую версию.
+
+        Каждая миграция — пара (версия, список SQL-выражений); текущая версия
+        хранится в ``PRAGMA user_version``, каждая миграция выполняется в
+        отдельной транзакции.
+        """
+        with self._conn_lock:
+            version = self._conn.execute('PRAGMA user_version').fetchone()[0]
+            for target, statements in sorted(migrations, key=lambda m: m[0]):
+                if target <= version:
+                    continue
+                with self.transaction() as conn:
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(f'PRAGMA user_version={int(target)}')
+                logging.info(f"Схема {self.db_path.name} обновлена до версии {target}")
+                version = target
+            return version
+
+    def enable_incremental_vacuum(self) -> bool:
+        """Включает incremental auto_vacuum, если для этого не нужно пересобирать файл.
+
+        Пустая (новая) база переводится в этот режим сразу. Существующую
+        переводит только ``compact``: полный VACUUM большой истории слишком
+        долог, чтобы выполнять его при запуске. Возвращает True, если режим
+        включён.
+        """
+        with self._conn_lock:
+            self._drain_locked()
+            if self._conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+                return True
+            if self._conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()[0]:
+                return False
+            # В режиме WAL новый режим вступает в силу только после VACUUM; пустая база пересобирается мгновенно
+            self._conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            self._conn.execute('VACUUM')
+            return True
+
+    def incremental_vacuum(self, pages: int = 0):
+        """Возвращает системе до ``pages`` свободных страниц (0 — все)."""
+        with self._conn_lock:
+            self._drain_locked()
+            self._conn.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+
+    def compact(self):
+        """Полностью пересобирает файл базы (VACUUM) и обновляет статистику планировщика.
+
+        Заодно база переводится в режим incremental auto_vacuum, после чего
+        ``incremental_vacuum`` возвращает системе место, освобождённое очисткой.
+        """
+        with self._conn_lock:
+            self._drain_locked()
+            self._conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            self._conn.execute('VACUUM')
+            self._conn.execute('PRAGMA optimize')
+
+    def flush(self):
+        """Фиксирует все записи, поставленные в очередь до вызова."""
+        with self._conn_lock:
+            if not self._closed:
+                self._drain_locked()
+
+    def close(self):
+        """Дописывает очередь, останавливает фоновый поток и закрывает соединение."""
+        with self._pending_cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._pending_cond.notify_all()
+        self._writer.join()
+        with self._conn_lock:
+            self._drain_locked()
+            try:
+                self._conn.execute('PRAGMA wal_checkpoint(PASSIVE)')
+            except sqlite3.Error as e:
+                logging.warning(f"Не удалось выполнить checkpoint WAL: {str(e)}")
+            self._conn.close()
+        atexit.unregister(self.close)
+
+    def _writer_loop(self):
+        while True:
+            with self._pending_cond:
+                self._pending_cond.wait_for(lambda: self._pending or self._closed)
+                if self._closed:
+                    return
+                # Даём накопиться пачке, если она ещё не заполнена
+                if len(self._pending) < self.batch_size:
+                    self._pending_cond.wait_for(
+                        lambda: len(self._pending) >= self.batch_size or self._closed,
+                        self.flush_interval
+                    )
+            with self._conn_lock:
+                self._drain_locked()
+
+    def _drain_locked(self):
+        """Дописывает все ожидающие записи; вызывается под _conn_lock."""
+        with self._pending_cond:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        if self._conn.in_transaction:
+            # Внутри открытой транзакции записи становятся её частью
+            for sql, params in batch:
+                self._conn.execute(sql, params)
+            return
+        try:
+            self._conn.execute('BEGIN')
+            for sql, params in batch:
+                self._conn.execute(sql, params)
+            self._conn.execute('COMMIT')
+        except sqlite3.Error as e:
+            if self._conn.in_transaction:
+                self._conn.execute('ROLLBACK')
+            logging.error(f"Ошибка групповой записи, повторяем по одной: {str(e)}")
+            for sql, params in batch:
+                try:
+                    self._conn.execute(sql, params)
+                except sqlite3.Error as e:
+                    logging.error(f"Ошибка при записи в БД: {str(e)}")
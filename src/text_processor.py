@@ -1,117 +1,167 @@
-import nltk
-from nltk.tokenize import word_tokenize, sent_tokenize
-from nltk.corpus import stopwords
-import wikipediaapi
 import logging
-from typing import List, Dict, Optional
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set
 import re
-from textblob import TextBlob
 
-# Загружаем необходимые ресурсы NLTK
-try:
-    nltk.download('punkt', quiet=True)
-    nltk.download('stopwords', quiet=True)
-except Exception as e:
-    logging.warning(f"Не удалось загрузить ресурсы NLTK: {str(e)}")
+from .lexicon import Lexicon, load_lexicon
 
-class TextProcessor:
-    def __init__(self):
-        self.wiki = wikipediaapi.Wikipedia(
-            language='ru',
-            extract_format=wikipediaapi.ExtractFormat.WIKI,
-            user_agent='MikaAssistant/1.0 (daniil@example.com)'
-        )
+# Наличие ресурсов NLTK проверяется локально и один раз; в сеть не ходим
+_nltk_resources: Dict[str, bool] = {}
+_nltk_lock = threading.Lock()
+
+# Базовые стоп-слова, используются и без корпуса NLTK
+BASE_STOP_WORDS = frozenset({
+    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как',
+    'а', 'то', 'все', 'она', 'так', 'его', 'но', 'да', 'ты', 'к',
+    'у', 'же', 'вы', 'за', 'бы', 'по', 'только', 'ее', 'мне',
+    'было', 'вот', 'от', 'меня', 'еще', 'нет', 'о', 'из', 'ему'
+})
+
+QUESTION_WORDS = frozenset({'что', 'где', 'когда', 'почему', 'зачем', 'как', 'кто', 'чей', 'какой'})
+
+_TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+_PUNCT_RE = re.compile(r'[^\w\s]')
+
+
+def has_nltk_resource(resource: str) -> bool:
+    """Проверяет, установлен ли ресурс NLTK (например, 'tokenizers/punkt'), без загрузки."""
+    if resource in _nltk_resources:
+        return _nltk_resources[resource]
+    with _nltk_lock:
+        if resource in _nltk_resources:
+            return _nltk_resources[resource]
         try:
-            self.stop_words = set(stopwords.words('russian'))
-        except:
-            self.stop_words = set()
-            logging.warning("Не удалось загрузить стоп-слова, используем пустой список")
-        
-        # Добавляем базовые стоп-слова
-        self.stop_words.update({
-            'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как',
-            'а', 'то', 'все', 'она', 'так', 'его', 'но', 'да', 'ты', 'к',
-            'у', 'же', 'вы', 'за', 'бы', 'по', 'только', 'ее', 'мне',
-            'было', 'вот', 'от', 'меня', 'еще', 'нет', 'о', 'из', 'ему'
-        })
+            import nltk
+            nltk.data.find(resource)
+            _nltk_resources[resource] = True
+        except (ImportError, LookupError):
+            name = resource.rsplit('/', 1)[-1]
+            logging.warning(
+                f"Ресурс NLTK {resource} не найден, используем упрощённую обработку. "
+                f"Установка: python -m nltk.downloader {name}"
+            )
+            _nltk_resources[resource] = False
+    return _nltk_resources[resource]
+
+
+class TextProcessor:
+    def __init__(self, lexicon: Optional[Lexicon] = None):
+        # Клиент Wikipedia, стоп-слова и словарь тональности создаются при первом обращении
+        self._wiki = None
+        self._stop_words: Optional[Set[str]] = None
+        self._lexicon = lexicon
+    
+    @property
+    def wiki(self):
+        if self._wiki is None:
+            import wikipediaapi
+            self._wiki = wikipediaapi.Wikipedia(
+                language='ru',
+                extract_format=wikipediaapi.ExtractFormat.WIKI,
+                user_agent='MikaAssistant/1.0 (daniil@example.com)'
+            )
+        return self._wiki
+    
+    @property
+    def stop_words(self) -> Set[str]:
+        if self._stop_words is None:
+            stop_words = set(BASE_STOP_WORDS)
+            if has_nltk_resource('corpora/stopwords'):
+                from nltk.corpus import stopwords
+                stop_words.update(stopwords.words('russian'))
+            self._stop_words = stop_words
+        return self._stop_words
+    
+    @property
+    def lexicon(self) -> Lexicon:
+        if self._lexicon is None:
+            self._lexicon = load_lexicon()
+        return self._lexicon
         
     def analyze_text(self, text: str) -> Dict:
-        """Комплексный анализ текста."""
-        # Используем TextBlob для анализа тональности
-        blob = TextBlob(text)
+        """Комплексный анализ текста (токенизация и стемминг выполняются один раз)."""
+        tokens = self.tokenize(text)
+        stems = self.lexicon.stems(tokens)
         
         return {
-            'sentiment': self._analyze_sentiment(text),
-            'keywords': self.extract_keywords(text),
-            'is_question': self._is_question(text)
+            'tokens': tokens,
+            'sentiment': self.lexicon.sentiment(tokens, stems),
+            'keywords': self.lexicon.keywords(tokens, self.stop_words, 5, stems),
+            'is_question': self._is_question(text, tokens)
         }
     
-    def _analyze_sentiment(self, text: str) -> Dict[str, float]:
-        """Анализ тона��ьности текста."""
-        # Простой анализ на основе ключевых слов
-        positive_words = {
-            'хорошо', 'отлично', 'замечательно', 'прекрасно', 'великолепно',
-            'рад', 'счастлив', 'доволен', 'люблю', 'нравится', 'спасибо'
-        }
-        negative_words = {
-            'плохо', 'ужасно', 'отвратительно', 'грустно', 'печально',
-            'жаль', 'жалко', 'обидно', 'ненавижу', 'злюсь', 'раздражает'
-        }
-        
-        words = set(word.lower() for word in word_tokenize(text))
-        pos_count = len(words.intersection(positive_words))
-        neg_count = len(words.intersection(negative_words))
-        total = pos_count + neg_count if pos_count + neg_count > 0 else 1
-        
-        return {
-            'polarity': (pos_count - neg_count) / total,
-            'subjectivity': (pos_count + neg_count) / len(words) if words else 0
-        }
+    def analyze_many(self, texts: Iterable[str], workers: Optional[int] = None, chunk_size: int = 256) -> Iterator[Dict]:
+        """Анализирует поток текстов; результаты отдаются по мере готовности в исходном порядке.
+
+        Большие входы делятся на куски по ``chunk_size`` и раздаются пулу
+        процессов (``workers``, по умолчанию по числу ядер); вход не читается
+        целиком, в работе одновременно не больше двух кусков на процесс.
+        """
+        return _map_chunks(self, _analyze_chunk, texts, workers, chunk_size, self.analyze_text)
     
-    def extract_keywords(self, text: str, limit: int = 5) -> List[str]:
-        """Извлечение ключевых слов из текста."""
+    def extract_keywords_many(self, texts: Iterable[str], limit: int = 5, workers: Optional[int] = None, chunk_size: int = 256) -> Iterator[List[str]]:
+        """Ключевые слова для потока текстов; параллельно, как ``analyze_many``."""
+        return _map_chunks(
+            self, _keywords_chunk, texts, workers, chunk_size,
+            lambda text: self.extract_keywords(text, limit), limit
+        )
+    
+    def tokenize(self, text: str) -> List[str]:
+        """Разбивает текст на токены в нижнем регистре."""
+        if has_nltk_resource('tokenizers/punkt'):
+            from nltk.tokenize import word_tokenize
+            return word_tokenize(text.lower())
+        # Модель punkt недоступна — токенизируем регулярным выражением
+        return _TOKEN_RE.findall(text.lower())
+    
+    def split_sentences(self, text: str) -> List[str]:
+        """Разбивает текст на предложения."""
+        if has_nltk_resource('tokenizers/punkt'):
+            from nltk.tokenize import sent_tokenize
+            return sent_tokenize(text)
+        return [s for s in re.split(r'(?<=[.!?…])\s+', text.strip()) if s]
+    
+    def _analyze_sentiment(self, text: str, tokens: Optional[Sequence[str]] = None) -> Dict[str, float]:
+        """Анализ тональности текста по словарю (все формы слова)."""
+        return self.lexicon.sentiment(tokens if tokens is not None else self.tokenize(text))
+    
+    def extract_keywords(self, text: str, limit: int = 5, tokens: Optional[Sequence[str]] = None) -> List[str]:
+        """Извлечение ключевых слов из текста; формы одного слова считаются вместе."""
         # Токенизация и приведение к нижнему регистру
-        tokens = word_tokenize(text.lower())
-        
-        # Удаление стоп-слов и пунктуации
-        words = [word for word in tokens 
-                if word.isalnum() and 
-                word not in self.stop_words and 
-                len(word) > 2]
-        
-        # Подсчет частоты слов
-        word_freq = {}
-        for word in words:
-            word_freq[word] = word_freq.get(word, 0) + 1
-        
-        # Сортировка по частоте и возврат топ-N слов
-        sorted_words = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)
-        return [word for word, freq in sorted_words[:limit]]
+        if tokens is None:
+            tokens = self.tokenize(text)
+        return self.lexicon.keywords(tokens, self.stop_words, limit)
     
-    def _is_question(self, text: str) -> bool:
+    def _is_question(self, text: str, tokens: Optional[Sequence[str]] = None) -> bool:
         """Определяет, является ли текст вопросом."""
         # Проверяем наличие вопросительного знака
         if '?' in text:
             return True
         
         # Проверяем наличие вопросительных слов
-        question_words = {'что', 'где', 'когда', 'почему', 'зачем', 'как', 'кто', 'чей', 'какой'}
-        words = set(word.lower() for word in word_tokenize(text))
-        return bool(words.intersection(question_words))
+        words = set(tokens if tokens is not None else self.tokenize(text))
+        return not QUESTION_WORDS.isdisjoint(words)
     
     def get_wiki_info(self, query: str, sentences: int = 3) -> Optional[str]:
         """Получение информации из Wikipedia."""
         try:
-            page = self.wiki.page(query)
-            if page.exists():
-                # Получаем первые N предложений
-                text = ' '.join(sent_tokenize(page.summary)[:sentences])
-                return text
-            return None
+            return self.fetch_wiki_summary(query, sentences)
         except Exception as e:
             logging.error(f"Ошибка при получении информации из Wikipedia: {str(e)}")
             return None
     
+    def fetch_wiki_summary(self, query: str, sentences: int = 3) -> Optional[str]:
+        """Запрашивает начало статьи Wikipedia; None — статьи нет, ошибки сети пробрасываются."""
+        page = self.wiki.page(query)
+        if page.exists():
+            # Получаем первые N предложений
+            return ' '.join(self.split_sentences(page.summary)[:sentences])
+        return None
+    
     def find_entities(self, text: str) -> Dict[str, List[str]]:
         """Находит именованные сущности в тексте."""
         # Простой поиск сущностей на основе заглавных букв
@@ -121,7 +171,7 @@ class TextProcessor:
         for word in words:
             if word and word[0].isupper() and not word.isupper():
                 # Убираем знаки препинания
-                clean_word = re.sub(r'[^\w\s]', '', word)
+                clean_word = _PUNCT_RE.sub('', word)
                 if clean_word:
                     proper_nouns.append(clean_word)
         
@@ -135,4 +185,54 @@ class TextProcessor:
         text = re.sub(r'[^\w\s\.\,\!\?\-]', '', text)
         # Заменяем множественные пробелы на один
         text = re.sub(r'\s+', ' ', text)
-        return text.strip() 
\ No newline at end of file
+        return text.strip() 
+
+
+# Пакетная обработка в пуле процессов: у каждого процесса свой TextProcessor
+# с тем же словарём, что и у вызывающего
+_worker_processor: Optional[TextProcessor] = None
+
+
+def _init_worker(lexicon: Lexicon):
+    global _worker_processor
+    _worker_processor = TextProcessor(lexicon)
+
+
+def _analyze_chunk(texts: List[str]) -> List[Dict]:
+    return [_worker_processor.analyze_text(text) for text in texts]
+
+
+def _keywords_chunk(texts: List[str], limit: int) -> List[List[str]]:
+    return [_worker_processor.extract_keywords(text, limit) for text in texts]
+
+
+def _map_chunks(
+    processor: TextProcessor,
+    chunk_func: Callable[..., List[Any]],
+    texts: Iterable[str],
+    workers: Optional[int],
+    chunk_size: int,
+    single: Callable[[str], Any],
+    *args: Any
+) -> Iterator[Any]:
+    """Применяет ``chunk_func`` к кускам входа в пуле процессов, сохраняя порядок."""
+    iterator = iter(texts)
+    workers = workers or os.cpu_count() or 1
+    first = list(islice(iterator, chunk_size))
+    # Маленький вход или один процесс — пул не окупает запуск
+    if workers == 1 or len(first) < chunk_size:
+        for text in first:
+            yield single(text)
+        for text in iterator:
+            yield single(text)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(processor.lexicon,)) as executor:
+        pending = deque([executor.submit(chunk_func, first, *args)])
+        while pending:
+            while len(pending) < workers * 2:
+                chunk = list(islice(iterator, chunk_size))
+                if not chunk:
+                    break
+                pending.append(executor.submit(chunk_func, chunk, *args))
+            yield from pending.popleft().result()
@@ -0,0 +1,157 @@
+import logging
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional, Union
+
+from .ollama_client import OllamaClient
+from .scheduler import PRIORITY_HIGH, GenerationScheduler, SchedulerOverloaded
+
+log = logging.getLogger("mika")
+
+# Очередь планировщика, в которой ждут прогревы
+WARMUP_SESSION = '__warmup__'
+
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+
+def parse_duration(value: Union[str, int, float]) -> Optional[float]:
+    """Переводит keep_alive Ollama ('30m', '1h30m', 300) в секунды.
+
+    None — модель не выгружается сама (отрицательное значение) или выгружается
+    сразу (ноль): в обоих случаях повторный прогрев не нужен.
+    """
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        text = value.strip()
+        try:
+            seconds = float(text)
+        except ValueError:
+            parts = _DURATION_RE.findall(text)
+            if not parts or ''.join(number + unit for number, unit in parts) != text.lstrip('-'):
+                raise ValueError(f"Непонятная длительность keep_alive: {value!r}")
+            seconds = sum(float(number) * _UNITS[unit] for number, unit in parts)
+            if text.startswith('-'):
+                seconds = -seconds
+    return seconds if seconds > 0 else None
+
+
+class ModelWarmer:
+    """Держит модель загруженной в память Ollama.
+
+    ``warm_up`` в фоне загружает модель пустым запросом, чтобы первое
+    сообщение не ждало чтения весов с диска. Пока пользователь молчит, модель
+    прогревается заново незадолго до того, как Ollama выгрузит её по
+    ``keep_alive``; после ``max_idle`` секунд тишины прогрев прекращается,
+    и память освобождается. ``touch`` вызывается после каждого обращения
+    к модели: оно и так продлевает ``keep_alive``.
+
+    С планировщиком прогрев занимает слот генерации в очереди высокого
+    приоритета, чтобы не превышать лимит одновременных запросов к Ollama.
+    Ждёт он не дольше ``slot_timeout`` секунд: если все слоты заняты,
+    модель уже загружена идущими генерациями, и прогрев пропускается
+    с записью в журнал, а не держит очередь и половину ёмкости на время
+    загрузки весов.
+    """
+
+    def __init__(
+        self,
+        client: OllamaClient,
+        model: str,
+        keep_alive: Union[str, int, float] = '30m',
+        options: Optional[Dict[str, Any]] = None,
+        margin: float = 0.8,
+        max_idle: float = 2 * 3600,
+        scheduler: Optional[GenerationScheduler] = None,
+        slot_timeout: float = 1.0
+    ):
+        self.client = client
+        self.model = model
+        self.keep_alive = keep_alive
+        # Параметры, от которых зависит загрузка (num_ctx): с другими Ollama перезагрузит модель
+        self.options = options
+        keep_alive_seconds = parse_duration(keep_alive)
+        self.period = keep_alive_seconds * margin if keep_alive_seconds else None
+        self.max_idle = max_idle
+        self.scheduler = scheduler
+        self.slot_timeout = slot_timeout
+        self.warm_ups = 0
+        self.skipped = 0
+        self._cond = threading.Condition()
+        self._last_use = time.monotonic()
+        self._last_warm = float('-inf')
+        self._future: Optional[Future] = None
+        self._closed = False
+        self._watcher: Optional[threading.Thread] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ollama-warmup')
+
+    def warm_up(self) -> 'Future[bool]':
+        """Запускает прогрев в фоне; вызовы во время идущего прогрева объединяются."""
+        with self._cond:
+            if self._closed:
+                future: 'Future[bool]' = Future()
+                future.set_result(False)
+                return future
+            if self._future is None or self._future.done():
+                self._future = self._executor.submit(self._warm)
+            if self._watcher is None and self.period:
+                self._watcher = threading.Thread(target=self._watch, name='ollama-rewarm', daemon=True)
+                self._watcher.start()
+            return self._future
+
+    def touch(self):
+        """Отмечает обращение к модели; таймер повторного прогрева отсчитывается заново."""
+        self._last_use = time.monotonic()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False)
+
+    def _warm(self) -> bool:
+        started = time.perf_counter()
+        ticket = None
+        if self.scheduler is not None:
+            try:
+                ticket = self.scheduler.acquire(WARMUP_SESSION, PRIORITY_HIGH, timeout=self.slot_timeout)
+            except SchedulerOverloaded as e:
+                # Все слоты заняты генерацией — модель и так загружена или загружается
+                self.skipped += 1
+                self._last_warm = time.monotonic()
+                log.info(f"Прогрев модели {self.model} пропущен: слоты генерации заняты ({str(e)})")
+                return False
+        try:
+            ok = self.client.warm_up(self.model, self.keep_alive, self.options)
+        finally:
+            if ticket is not None:
+                self.scheduler.release(ticket)
+        # Неудачная попытка тоже сдвигает таймер, чтобы не долбить недоступный сервис
+        self._last_warm = time.monotonic()
+        if ok:
+            self.warm_ups += 1
+            log.debug(f"Модель {self.model} прогрета за {time.perf_counter() - started:.2f} с")
+        return ok
+
+    def _watch(self):
+        with self._cond:
+            while not self._closed:
+                now = time.monotonic()
+                due = max(self._last_use, self._last_warm) + self.period
+                if now < due:
+                    self._cond.wait(due - now)
+                    continue
+                if now - self._last_use > self.max_idle:
+                    # Пользователь давно ушёл: пусть Ollama выгрузит модель
+                    self._cond.wait(self.period)
+                    continue
+                self._cond.release()
+                try:
+                    self.warm_up().result()
+                except Exception as e:
+                    log.error(f"Ошибка при прогреве модели: {str(e)}")
+                finally:
+                    self._cond.acquire()
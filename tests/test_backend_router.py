@@ -0,0 +1,160 @@
+"""Роутер серверов модели на имитаторах Ollama: выбор сервера, отключение, переключение."""
+
+import asyncio
+import socket
+import time
+
+import pytest
+
+from src.backend_router import OllamaRouter
+from src.fake_ollama import FakeOllamaServer
+from src.ollama_client import OllamaError
+
+PAYLOAD = {'model': 'marco-o1', 'prompt': 'Привет', 'stream': True}
+
+
+class MidStreamFailure(FakeOllamaServer):
+    """Имитатор, который всегда обрывает поток после первого токена."""
+
+    def plan(self):
+        plan = super().plan()
+        plan['fail_at'] = 1
+        return plan
+
+
+def dead_url() -> str:
+    # Порт, который только что был свободен: соединение с ним отклоняется
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f'http://127.0.0.1:{port}'
+
+
+@pytest.fixture
+def fake():
+    servers = []
+
+    def make(cls=FakeOllamaServer, **options):
+        options = dict(dict(latency=0.0, jitter=0.0, rate=0, tokens=(3, 3)), **options)
+        server = cls(**options).start()
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def make_router():
+    routers = []
+
+    def make(endpoints, **options):
+        router = OllamaRouter(endpoints, probe_interval=0, connect_timeout=1.0, **options)
+        routers.append(router)
+        return router
+
+    yield make
+    for router in routers:
+        router.close()
+
+
+def state(router, url):
+    return next(item['state'] for item in router.status() if item['url'] == url)
+
+
+def test_least_outstanding(fake, make_router):
+    first, second = fake(rate=20, tokens=(5, 5)), fake(rate=20, tokens=(5, 5))
+    router = make_router([first.url, second.url])
+
+    streams = [router.stream_generate(PAYLOAD) for _ in range(2)]
+    for stream in streams:
+        next(stream)
+    # Пока первый поток идёт, второй запрос уходит на свободный сервер
+    assert [item['outstanding'] for item in router.status()] == [1, 1]
+    assert (first.requests, second.requests) == (1, 1)
+
+    for stream in streams:
+        stream.close()
+    assert [item['outstanding'] for item in router.status()] == [0, 0]
+
+
+def test_failover_before_first_token(fake, make_router):
+    live = fake()
+    dead = dead_url()
+    router = make_router([dead, live.url])
+
+    for _ in range(2):
+        messages = list(router.stream_generate(PAYLOAD))
+        assert messages[-1]['done']
+    # По кругу один из двух запросов сначала попал на мёртвый сервер
+    assert router.failovers == 1
+    assert live.requests == 2
+    assert [item['errors'] for item in router.status()] == [1, 0]
+
+
+def test_no_failover_after_first_token(fake, make_router):
+    broken, live = fake(MidStreamFailure), fake()
+    router = make_router([broken.url, live.url])
+
+    outcomes = []
+    for _ in range(2):
+        received = []
+        try:
+            for message in router.stream_generate(PAYLOAD):
+                received.append(message)
+        except OllamaError:
+            outcomes.append(('error', len(received)))
+        else:
+            outcomes.append(('ok', len(received)))
+    # Оборванный поток не повторяется: пользователь уже видел часть ответа
+    assert sorted(outcomes) == [('error', 1), ('ok', 4)]
+    assert router.failovers == 0
+    assert (broken.requests, live.requests) == (1, 1)
+
+
+def test_circuit_open_half_open_closed(fake, make_router):
+    flaky = fake(tokens=(0, 0), error_rate=1.0)
+    live = fake(tokens=(0, 0))
+    router = make_router([flaky.url, live.url], failure_threshold=2, cooldown=0.3)
+
+    for _ in range(4):
+        assert list(router.stream_generate(PAYLOAD))[-1]['done']
+    assert flaky.requests == 2
+    assert state(router, flaky.url) == 'open'
+
+    # Отключённый сервер не получает запросов
+    for _ in range(3):
+        list(router.stream_generate(PAYLOAD))
+    assert flaky.requests == 2
+
+    time.sleep(0.35)
+    assert state(router, flaky.url) == 'half-open'
+    # Неудачный пробный запрос снова отключает сервер
+    for _ in range(2):
+        list(router.stream_generate(PAYLOAD))
+    assert flaky.requests == 3
+    assert state(router, flaky.url) == 'open'
+
+    time.sleep(0.35)
+    flaky.error_rate = 0.0
+    for _ in range(2):
+        list(router.stream_generate(PAYLOAD))
+    assert flaky.requests == 4
+    assert state(router, flaky.url) == 'closed'
+
+
+def test_async_stream_fails_over(fake, make_router):
+    live = fake()
+    router = make_router([dead_url(), live.url])
+
+    async def collect():
+        return [[message async for message in router.astream_chat(
+            {'model': 'marco-o1', 'messages': [{'role': 'user', 'content': 'Привет'}], 'stream': True}
+        )] for _ in range(2)]
+
+    for messages in asyncio.run(collect()):
+        assert messages[-1]['done']
+    assert router.failovers == 1
+    assert live.requests == 2
+    assert [item['outstanding'] for item in router.status()] == [0, 0]
@@ -0,0 +1,83 @@
+"""Сборка контекста в пределах бюджета токенов."""
+
+from src.context_builder import (
+    SECTION_HIGH, SECTION_LOW, SECTION_NORMAL, SECTION_REQUIRED, ContextBuilder, estimate_tokens, truncate_tokens
+)
+
+LONG_TEXT = ' '.join(f'слово{i}' for i in range(100))
+
+
+def test_estimate_tokens():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('кот') == 1
+    assert estimate_tokens('Да!') == 2
+    # Длинное слово режется на несколько токенов
+    assert estimate_tokens('достопримечательность') == 4
+
+
+def test_truncate_tokens():
+    assert truncate_tokens('коротко', 10) == 'коротко'
+    assert truncate_tokens(LONG_TEXT, 0) == ''
+
+    head = truncate_tokens(LONG_TEXT, 20)
+    assert head.startswith('слово0 ') and head.endswith('…')
+    assert estimate_tokens(head) <= 20
+
+    tail = truncate_tokens(LONG_TEXT, 20, keep_tail=True)
+    assert tail.startswith('…') and tail.endswith(' слово99')
+    assert estimate_tokens(tail) <= 20
+
+
+def test_everything_fits_in_order_of_adding():
+    builder = ContextBuilder()
+    builder.add('persona', 'Ты Мика.', SECTION_REQUIRED)
+    builder.add('facts', 'Пользователя зовут Аня.', SECTION_LOW)
+    builder.add('history', 'Аня: Привет!', SECTION_HIGH)
+    assert builder.render(100) == 'Ты Мика.\nПользователя зовут Аня.\nАня: Привет!'
+    assert builder.last_dropped == []
+    assert builder.last_tokens == sum(estimate_tokens(t) + 1 for t in (
+        'Ты Мика.', 'Пользователя зовут Аня.', 'Аня: Привет!'
+    ))
+
+
+def test_low_priority_dropped_first():
+    builder = ContextBuilder()
+    builder.add('persona', 'Ты Мика.', SECTION_REQUIRED)
+    builder.add('wiki', LONG_TEXT, SECTION_LOW)
+    builder.add('history', 'Аня: Привет!', SECTION_HIGH)
+    assert builder.render(30) == 'Ты Мика.\nАня: Привет!'
+    assert builder.last_dropped == ['wiki']
+    assert builder.last_tokens <= 30
+
+
+def test_truncatable_section_fills_remaining_budget():
+    builder = ContextBuilder()
+    builder.add('persona', 'Ты Мика.', SECTION_REQUIRED)
+    builder.add('history', LONG_TEXT, SECTION_NORMAL, truncatable=True, keep_tail=True)
+    result = builder.render(40)
+    persona, history = result.split('\n')
+    assert history.startswith('…') and history.endswith('слово99')
+    assert builder.last_dropped == []
+    assert builder.last_tokens <= 40
+
+
+def test_required_section_ignores_budget():
+    builder = ContextBuilder()
+    builder.add('persona', LONG_TEXT, SECTION_REQUIRED)
+    builder.add('history', 'Аня: Привет!', SECTION_HIGH)
+    assert builder.render(10) == LONG_TEXT
+    assert builder.last_dropped == ['history']
+
+
+def test_same_sections_reuse_previous_result():
+    builder = ContextBuilder()
+    builder.add('persona', 'Ты Мика.', SECTION_REQUIRED)
+    first = builder.render(50)
+    # Следующий ход с теми же разделами; пустой раздел не добавляется
+    builder.begin()
+    builder.add('persona', 'Ты Мика.', SECTION_REQUIRED)
+    builder.add('facts', '', SECTION_LOW)
+    assert builder.render(50) is first
+    builder.begin()
+    builder.add('persona', 'Ты Мика!', SECTION_REQUIRED)
+    assert builder.render(50) == 'Ты Мика!'
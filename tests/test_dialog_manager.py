@@ -0,0 +1,91 @@
+"""Схема истории: обновление базы исходного формата до текущей версии и срок хранения."""
+
+import json
+import sqlite3
+
+import pytest
+
+from src.dialog_manager import (
+    DEFAULT_SESSION_ID, DEFAULT_USER_ID, FALLBACK_RESPONSES, _MIGRATIONS, DialogManager
+)
+
+LATEST_VERSION = max(version for version, _ in _MIGRATIONS)
+
+
+def create_baseline_db(path):
+    """База в том виде, в каком её создавала первая версия Мики (без user_version)."""
+    conn = sqlite3.connect(str(path))
+    conn.executescript('''
+        CREATE TABLE messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            human_message TEXT,
+            ai_message TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE user_preferences (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+    conn.executemany('INSERT INTO messages (human_message, ai_message) VALUES (?, ?)', [
+        ('Привет, меня зовут Аня', 'Привет, Аня! Рада знакомству'),
+        ('Расскажи про котиков', 'Котики любят спать на солнце'),
+        ('А ты что-нибудь знаешь?', FALLBACK_RESPONSES[0]),
+    ])
+    conn.execute('INSERT INTO user_preferences (key, value) VALUES (?, ?)', ('name', json.dumps('Аня')))
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.delenv('MIKA_RETENTION_DAYS', raising=False)
+    path = tmp_path / 'mika_data.db'
+    create_baseline_db(path)
+    manager = DialogManager(path)
+    yield manager
+    manager.close()
+
+
+def columns(manager, table):
+    return [row[1] for row in manager.storage.query(f'PRAGMA table_info({table})')]
+
+
+def test_baseline_db_is_upgraded(manager):
+    storage = manager.storage
+    assert storage.query_one('PRAGMA user_version')[0] == LATEST_VERSION
+    assert columns(manager, 'messages') == [
+        'id', 'human_message', 'ai_message', 'timestamp', 'session_id', 'user_id', 'fallback'
+    ]
+    assert columns(manager, 'user_preferences') == ['user_id', 'key', 'value', 'timestamp']
+    tables = {row[0] for row in storage.query("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {'history_imports', 'session_state', 'messages_fts'} <= tables
+    # Полная пересборка файла при запуске не выполняется
+    assert storage.query_one('PRAGMA auto_vacuum')[0] == 0
+
+
+def test_old_rows_are_kept(manager):
+    rows = manager.storage.query('SELECT session_id, user_id FROM messages ORDER BY id')
+    assert rows == [(DEFAULT_SESSION_ID, DEFAULT_USER_ID)] * 3
+    # Профиль перенесён на пользователя по умолчанию
+    assert manager.get_user_preferences() == {'name': 'Аня'}
+    assert len(manager.get_recent_messages(limit=10)) == 6
+
+
+def test_migrations_are_idempotent(tmp_path, manager):
+    manager.add_interaction('Новое сообщение', 'Новый ответ')
+    manager.close()
+    reopened = DialogManager(tmp_path / 'mika_data.db')
+    try:
+        assert reopened.storage.query_one('PRAGMA user_version')[0] == LATEST_VERSION
+        assert reopened.storage.query_one('SELECT COUNT(*) FROM messages')[0] == 4
+    finally:
+        reopened.close()
+
+
+def test_history_is_kept_without_retention(manager):
+    manager.storage.execute("UPDATE messages SET timestamp = datetime('now', '-30 days')")
+    assert manager.clear_old_messages() == 0
+    assert manager.clear_old_messages(days=7, batch_size=2) == 3
+    assert manager.storage.query_one('SELECT COUNT(*) FROM messages')[0] == 0
@@ -0,0 +1,214 @@
+"""История диалогов: перенос старых баз, защита от повторного переноса, выгрузка, поиск и статистика."""
+
+import gzip
+import json
+import logging
+import shutil
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+from src import history
+from src.dialog_manager import DEFAULT_USER_ID
+from src.history import consolidate, export, iter_messages, with_keywords
+from src.storage import Storage
+
+ROOT = Path(__file__).resolve().parent.parent
+# Базы трёх прежних схем, которые лежат в репозитории
+LEGACY = ('mika.db', 'dialogs.db', 'mika_data.db')
+
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    monkeypatch.delenv('MIKA_RETENTION_DAYS', raising=False)
+    folder = tmp_path / 'legacy'
+    folder.mkdir()
+    for name in LEGACY:
+        shutil.copy(ROOT / name, folder / name)
+    return [folder / name for name in LEGACY]
+
+
+@pytest.fixture
+def target(tmp_path):
+    return tmp_path / 'target.db'
+
+
+def legacy_count(path, table):
+    conn = sqlite3.connect(str(path))
+    try:
+        return conn.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE COALESCE(human_message, '') != '' OR COALESCE(ai_message, '') != ''"
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def query(path, sql, params=()):
+    storage = Storage(path)
+    try:
+        return storage.query(sql, params)
+    finally:
+        storage.close()
+
+
+def append_dialog(path, human):
+    conn = sqlite3.connect(str(path))
+    conn.execute("INSERT INTO dialogs (human_message, ai_message) VALUES (?, 'Ответ')", (human,))
+    conn.commit()
+    conn.close()
+
+
+def test_consolidate_legacy_schemas(sources, target):
+    mika_db, dialogs_db, old_data_db = sources
+    report = consolidate(target, sources)
+    assert report == {
+        str(mika_db): legacy_count(mika_db, 'dialogs'),
+        str(dialogs_db): legacy_count(dialogs_db, 'dialogs'),
+        str(old_data_db): legacy_count(old_data_db, 'messages'),
+    }
+
+    # Пользователи mika.db различаются, диалоги без пользователя приписаны пользователю по умолчанию
+    users = dict(query(target, 'SELECT user_id, COUNT(*) FROM messages GROUP BY user_id'))
+    assert users[DEFAULT_USER_ID] == report[str(dialogs_db)] + report[str(old_data_db)]
+    assert users['mika.db:1'] >= 1
+    preferences = dict(query(target, "SELECT user_id, value FROM user_preferences WHERE key = 'name'"))
+    assert json.loads(preferences['mika.db:1']) == 'Даня'
+    facts = query(target, "SELECT value FROM user_preferences WHERE user_id = 'mika.db:3' AND key = 'facts'")
+    assert json.loads(facts[0][0]) == ['меня зовут даня, запомни это', 'как меня зовут?']
+    # Время приведено к формату SQLite и сохранено
+    assert query(target, "SELECT timestamp FROM messages WHERE user_id = 'mika.db:1' ORDER BY id LIMIT 1") == [
+        ('2024-12-24 06:20:31',)
+    ]
+
+
+def test_repeated_consolidate_imports_only_new_rows(sources, target):
+    first = consolidate(target, sources)
+    total = sum(first.values())
+    assert set(consolidate(target, sources).values()) == {0}
+
+    append_dialog(sources[1], 'Новый вопрос')
+    assert consolidate(target, sources)[str(sources[1])] == 1
+    assert query(target, 'SELECT COUNT(*) FROM messages') == [(total + 1,)]
+
+
+def test_moved_source_is_not_imported_again(sources, target, tmp_path):
+    consolidate(target, sources)
+    total = query(target, 'SELECT COUNT(*) FROM messages')[0][0]
+
+    moved = tmp_path / 'archive' / 'renamed.db'
+    moved.parent.mkdir()
+    shutil.move(str(sources[1]), moved)
+    assert consolidate(target, [moved]) == {str(moved): 0}
+
+    # Копия тоже узнаётся, а дописанное после переноса догружается
+    copy = tmp_path / 'copy.db'
+    shutil.copy(moved, copy)
+    append_dialog(copy, 'Вопрос из копии')
+    assert consolidate(target, [copy]) == {str(copy): 1}
+    assert query(target, 'SELECT COUNT(*) FROM messages') == [(total + 1,)]
+
+
+def test_imports_recorded_by_path_are_respected(sources, target):
+    dialogs_db = sources[1]
+    storage = Storage(target)
+    try:
+        history.migrate_schema(storage)
+        # Отметка прежней версии переноса: ключ — абсолютный путь
+        storage.execute(
+            'INSERT INTO history_imports (source, source_table, last_id, imported) VALUES (?, ?, ?, ?)',
+            (str(dialogs_db.resolve()), 'dialogs', 10 ** 6, 8)
+        )
+    finally:
+        storage.close()
+    assert consolidate(target, [dialogs_db]) == {str(dialogs_db): 0}
+
+
+def test_empty_source_and_target_as_source(sources, target, tmp_path):
+    empty = tmp_path / 'empty.db'
+    conn = sqlite3.connect(str(empty))
+    conn.execute('CREATE TABLE dialogs (id INTEGER PRIMARY KEY, human_message TEXT, ai_message TEXT, timestamp TEXT)')
+    conn.close()
+    assert consolidate(target, [empty, target, tmp_path / 'missing.db']) == {str(empty): 0}
+
+
+def test_retention_warning(sources, target, monkeypatch, caplog):
+    with caplog.at_level(logging.WARNING, logger='mika'):
+        consolidate(target, sources[:1])
+    assert 'MIKA_RETENTION_DAYS' not in caplog.text
+
+    # Перенесённые диалоги 2024 года старше срока хранения
+    monkeypatch.setenv('MIKA_RETENTION_DAYS', '30')
+    append_dialog(sources[1], 'Свежий вопрос')
+    with caplog.at_level(logging.WARNING, logger='mika'):
+        consolidate(target, sources[1:2])
+    expiring = query(target, "SELECT COUNT(*) FROM messages WHERE timestamp < datetime('now', '-30 days')")[0][0]
+    assert f'В базе {expiring} сообщений старше 30 дней' in caplog.text
+
+
+def test_iter_messages_pages_and_filters(sources, target):
+    consolidate(target, sources)
+    storage = Storage(target)
+    try:
+        everything = list(iter_messages(storage))
+        assert [row.id for row in everything] == sorted(row.id for row in everything)
+        assert list(iter_messages(storage, page_size=2)) == everything
+        assert {row.user_id for row in iter_messages(storage, user_id='mika.db:1')} == {'mika.db:1'}
+        recent = list(iter_messages(storage, since='2024-12-24 06:20:00'))
+        assert recent and all(row.timestamp >= '2024-12-24 06:20:00' for row in recent)
+        assert list(iter_messages(storage, after_id=everything[-2].id)) == everything[-1:]
+    finally:
+        storage.close()
+
+
+@pytest.mark.parametrize('name', ['history.jsonl', 'history.jsonl.gz'])
+def test_export_jsonl(sources, target, tmp_path, name):
+    consolidate(target, sources)
+    storage = Storage(target)
+    try:
+        rows = list(iter_messages(storage))
+        output = tmp_path / name
+        assert export(iter(rows), output) == len(rows)
+    finally:
+        storage.close()
+    opener = gzip.open if name.endswith('.gz') else open
+    with opener(output, 'rt', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    assert records == [row._asdict() for row in rows]
+
+
+def test_export_with_keywords(tmp_path):
+    rows = [history.HistoryRow(i, 's', 'u', f'котики и собаки номер{i}', 'Ответ', '2024-01-01') for i in range(3)]
+    output = tmp_path / 'keywords.jsonl'
+    assert export(with_keywords(rows, limit=2, workers=1), output) == 3
+    records = [json.loads(line) for line in output.read_text(encoding='utf-8').splitlines()]
+    assert [record['id'] for record in records] == [0, 1, 2]
+    assert all(record['keywords'][0] == 'котики' for record in records)
+
+
+def test_export_parquet_needs_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    with pytest.raises(RuntimeError, match='pyarrow'):
+        export([], tmp_path / 'history.parquet')
+
+
+def run_cli(monkeypatch, capsys, *args):
+    monkeypatch.setattr(sys, 'argv', ['history', *map(str, args)])
+    history.main()
+    return capsys.readouterr().out
+
+
+def test_cli_search_and_stats(sources, target, monkeypatch, capsys):
+    out = run_cli(monkeypatch, capsys, 'consolidate', '--target', target, '--sources', *sources)
+    assert f'{sources[0]}: перенесено сообщений' in out
+
+    out = run_cli(monkeypatch, capsys, 'search', 'Даня', '--db', target, '--user', 'mika.db:1')
+    assert out.startswith('Найдено сообщений: 1\n')
+    assert '[Даня]' in out
+
+    out = run_cli(monkeypatch, capsys, 'stats', '--db', target, '--days', 100000, '--json')
+    stats = json.loads(out)
+    assert stats['messages'] == query(target, 'SELECT COUNT(*) FROM messages')[0][0]
+    assert stats['users'] == len(query(target, 'SELECT DISTINCT user_id FROM messages'))
+    assert sum(day['messages'] for day in stats['per_day']) == stats['messages']
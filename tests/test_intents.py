@@ -0,0 +1,78 @@
+"""Маршрутизация по намерениям: фразы по словам, слоты и приоритет по порядку в таблице."""
+
+from src.intents import (
+    INTENT_CREATOR, INTENT_INTRODUCTION, INTENT_NEGATIVE, INTENT_TEST, INTENT_WIKI, SLOT_REST, Intent, IntentRouter
+)
+
+router = IntentRouter()
+
+
+def intents(text):
+    return [(m.intent, m.phrase, m.slot) for m in router.match(text)]
+
+
+def test_name_slot():
+    assert intents('Привет, меня зовут Аня') == [(INTENT_INTRODUCTION, 'меня зовут', 'аня')]
+    assert intents('Я Аня') == [(INTENT_INTRODUCTION, 'я', 'аня')]
+    # После фразы нет слова — нет и имени
+    assert intents('меня зовут...') == [(INTENT_INTRODUCTION, 'меня зовут', None)]
+
+
+def test_rest_slot():
+    match = router.match('Что такое Python?')[0]
+    assert (match.intent, match.slot) == (INTENT_WIKI, 'python?')
+    assert 'Что такое Python?'[match.start:match.end].lower() == 'что такое'
+
+
+def test_whole_words_only():
+    assert intents('нетушки') == []
+    assert intents('нет интернета') == [(INTENT_NEGATIVE, 'нет', None)]
+    assert intents('хочу в интернет') == []
+    assert intents('они не могут') == []
+
+
+def test_prefix_words_keep_inflected_forms():
+    for text in ('тест', 'Тестирование модели', 'тестовый запуск', 'сейчас протестирую', 'нужна проверка'):
+        assert [m.intent for m in router.match(text)] == [INTENT_TEST], text
+    assert [m.intent for m in router.match('Отстаньте!')] == [INTENT_NEGATIVE]
+    assert [m.intent for m in router.match('Я тебя создала')][0] == INTENT_CREATOR
+    assert intents('Расскажи обо всём') == [(INTENT_WIKI, 'расскажи обо', 'всём')]
+
+
+def test_exact_word_wins_over_prefix():
+    custom = IntentRouter([Intent('stem', ('кот*',)), Intent('exact', ('котлета',))])
+    assert [m.intent for m in custom.match('котики')] == ['stem']
+    assert [m.intent for m in custom.match('котлета')] == ['exact']
+    assert custom.match('кто') == []
+
+
+def test_punctuation_breaks_phrase():
+    assert intents('меня, зовут Аня') == []
+
+
+def test_all_matches_in_text_order():
+    matches = router.match('Не хочу и не буду')
+    assert [(m.phrase, m.start) for m in matches] == [('не хочу', 0), ('не буду', 10)]
+    assert {m.intent for m in matches} == {INTENT_NEGATIVE}
+
+
+def test_table_order_is_priority():
+    matches = router.match('Я твой создатель')
+    # «я» тоже совпало, но создатель стоит в таблице раньше
+    assert [m.intent for m in matches] == [INTENT_CREATOR, INTENT_INTRODUCTION]
+    assert router.first(matches, INTENT_INTRODUCTION).slot == 'твой'
+    assert router.first(matches, INTENT_WIKI) is None
+
+
+def test_overlapping_phrases():
+    custom = IntentRouter([
+        Intent('long', ('раз два три',)),
+        Intent('short', ('два', 'два три'), SLOT_REST),
+    ])
+    matches = custom.match('раз два три четыре')
+    assert [(m.intent, m.phrase, m.slot) for m in matches] == [
+        ('long', 'раз два три', None),
+        ('short', 'два', 'три четыре'),
+        ('short', 'два три', 'четыре'),
+    ]
+    assert custom.first(matches, 'short').phrase == 'два'
@@ -0,0 +1,172 @@
+"""Справочный кэш с локальной заменой Wikipedia: TTL, LRU, объединение запросов, дамп."""
+
+import json
+import threading
+import time
+
+import pytest
+
+from src.dialog_manager import DialogManager
+from src.knowledge import KnowledgeBase
+from src.mika import Mika
+
+
+class StubWiki:
+    """Заменяет запросы к Wikipedia: считает обращения, может придержать ответ."""
+
+    def __init__(self, articles=None):
+        self.articles = articles or {}
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+        self._lock = threading.Lock()
+
+    def __call__(self, topic):
+        with self._lock:
+            self.calls.append(topic)
+        self.release.wait(5)
+        return self.articles.get(topic, f'Справка: {topic}')
+
+
+@pytest.fixture
+def make_kb(tmp_path):
+    created = []
+
+    def make(**options):
+        kb = KnowledgeBase(tmp_path / 'knowledge.db', **options)
+        created.append(kb)
+        return kb
+
+    yield make
+    for kb in created:
+        kb.close()
+
+
+def test_cache_hit_and_ttl_expiry(make_kb):
+    wiki = StubWiki()
+    kb = make_kb(fetcher=wiki, ttl=0.2)
+    assert kb.lookup('Python') == 'Справка: python'
+    assert kb.lookup('python!') == 'Справка: python'
+    assert wiki.calls == ['python']
+
+    time.sleep(0.3)
+    kb.lookup('Python')
+    assert wiki.calls == ['python', 'python']
+
+
+def test_missing_article_is_cached(make_kb):
+    wiki = StubWiki({'нет такой': None})
+    kb = make_kb(fetcher=wiki)
+    assert kb.lookup('нет такой') is None
+    assert kb.lookup('нет такой') is None
+    assert len(wiki.calls) == 1
+
+
+def test_lru_eviction(make_kb):
+    wiki = StubWiki()
+    kb = make_kb(fetcher=wiki, max_entries=2)
+    kb.lookup('a')
+    time.sleep(0.01)
+    kb.lookup('b')
+    time.sleep(0.01)
+    # Обращение к a делает вытесняемой b
+    kb.lookup('a')
+    time.sleep(0.01)
+    kb.lookup('c')
+
+    wiki.calls.clear()
+    kb.lookup('a')
+    kb.lookup('c')
+    assert wiki.calls == []
+    kb.lookup('b')
+    assert wiki.calls == ['b']
+
+
+def test_refresh_does_not_count_as_new_entry(make_kb):
+    wiki = StubWiki()
+    kb = make_kb(fetcher=wiki, ttl=0.2, max_entries=2)
+    kb.lookup('a')
+    time.sleep(0.3)
+    kb.lookup('b')
+    # Устаревшая a обновляется на месте и не вытесняет свежую b
+    kb.lookup('a')
+    kb.lookup('b')
+    assert wiki.calls == ['a', 'b', 'a']
+
+
+def test_concurrent_lookups_share_one_fetch(make_kb):
+    wiki = StubWiki()
+    wiki.release.clear()
+    kb = make_kb(fetcher=wiki)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(kb.lookup('Python'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 2
+    while not wiki.calls:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    time.sleep(0.1)
+    wiki.release.set()
+    for thread in threads:
+        thread.join()
+    assert wiki.calls == ['python']
+    assert results == ['Справка: python'] * 8
+
+
+def test_offline_dump(make_kb, tmp_path):
+    dump = tmp_path / 'extracts.jsonl'
+    dump.write_text('\n'.join(json.dumps(item, ensure_ascii=False) for item in (
+        {'title': 'Python', 'extract': 'Язык программирования.'},
+        {'title': 'Пустая', 'extract': ''},
+        {'title': 'Москва', 'extract': 'Столица России.'},
+    )) + '\n', encoding='utf-8')
+    kb = make_kb(offline=True)
+    assert kb.load_dump(dump) == 2
+    assert kb.lookup('python') == 'Язык программирования.'
+    assert kb.lookup('Москва?') == 'Столица России.'
+    assert kb.lookup('Пустая') is None
+    assert kb.lookup('Неизвестно') is None
+
+
+def test_dump_entries_do_not_expire(make_kb, tmp_path):
+    dump = tmp_path / 'extracts.jsonl'
+    dump.write_text(json.dumps({'title': 'Python', 'extract': 'Из дампа.'}) + '\n', encoding='utf-8')
+    wiki = StubWiki()
+    kb = make_kb(fetcher=wiki, ttl=0)
+    kb.load_dump(dump)
+    time.sleep(0.01)
+    assert kb.lookup('Python') == 'Из дампа.'
+    assert wiki.calls == []
+
+
+def test_from_env(tmp_path, monkeypatch):
+    monkeypatch.delenv('MIKA_KNOWLEDGE_DB', raising=False)
+    assert KnowledgeBase.from_env() is None
+    monkeypatch.setenv('MIKA_KNOWLEDGE_DB', str(tmp_path / 'wiki.db'))
+    kb = KnowledgeBase.from_env(fetcher=StubWiki())
+    try:
+        assert kb.lookup('Python') == 'Справка: python'
+        assert (tmp_path / 'wiki.db').exists()
+    finally:
+        kb.close()
+
+
+def test_mika_enables_knowledge_explicitly(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('MIKA_KNOWLEDGE_DB', raising=False)
+    dialog_manager = DialogManager(tmp_path / 'mika_data.db')
+    try:
+        mika = Mika(ollama_client=object(), dialog_manager=dialog_manager)
+        # По умолчанию справочник выключен: ни сети, ни базы в текущем каталоге
+        assert mika.knowledge is None
+        mika.close()
+        assert not (tmp_path / 'mika_knowledge.db').exists()
+
+        monkeypatch.setenv('MIKA_KNOWLEDGE_DB', str(tmp_path / 'wiki.db'))
+        mika = Mika(ollama_client=object(), dialog_manager=dialog_manager)
+        assert isinstance(mika.knowledge, KnowledgeBase)
+        mika.close()
+        assert (tmp_path / 'wiki.db').exists()
+    finally:
+        dialog_manager.close()
@@ -0,0 +1,57 @@
+"""Потоковый фильтр языка: отбрасывание чужих кусков и признак дрейфа."""
+
+from src.language_filter import LanguageFilter
+
+
+def test_russian_chunks_pass_through():
+    language = LanguageFilter()
+    chunks = ['Привет', ', ', 'как', ' дела? ', '😊', '42']
+    assert [language.feed(chunk) for chunk in chunks] == chunks
+    assert language.accepted_letters == len('Приветкакдела')
+    assert language.dropped_chunks == 0
+    assert not language.drifted
+
+
+def test_foreign_chunks_are_dropped():
+    language = LanguageFilter()
+    assert language.feed('') == ''
+    assert language.feed('Hello') == ''
+    assert language.feed('Привет, мой друг') == 'Привет, мой друг'
+    # Кусок со смешанным текстом отбрасывается целиком
+    assert language.feed(' мир world') == ''
+    assert language.dropped_chunks == 2
+    assert language.accepted_letters == len('Приветмойдруг')
+
+
+def test_drift_by_ratio():
+    language = LanguageFilter(max_foreign_ratio=0.3, min_letters=20)
+    language.feed('Хорошо')
+    language.feed('okay')
+    # Чужих много, но букв пока мало для вывода
+    assert not language.drifted
+    language.feed('sure thing again')
+    assert language.drifted
+
+
+def test_no_drift_for_rare_foreign_words():
+    language = LanguageFilter()
+    language.feed('Я очень люблю писать программы на языке ')
+    language.feed('Python')
+    language.feed(', это мой любимый язык.')
+    assert language.dropped_chunks == 1
+    assert not language.drifted
+
+
+def test_drift_by_absolute_count():
+    language = LanguageFilter(max_foreign=10)
+    language.feed('Это длинный ответ на русском языке, в нём много букв и слов. ' * 5)
+    language.feed('abcdefghij')
+    assert language.drifted
+
+
+def test_cjk_weighs_more():
+    latin, cjk = LanguageFilter(), LanguageFilter()
+    latin.feed('ab')
+    cjk.feed('你好')
+    assert cjk.foreign == latin.foreign * cjk.cjk_weight
+    assert LanguageFilter().feed('カタカナ') == ''
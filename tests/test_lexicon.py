@@ -0,0 +1,87 @@
+"""Словарь тональности: совпадение по основе, точные формы «=», отрицание и дополнительные файлы."""
+
+import pytest
+
+from src.lexicon import Lexicon, load_lexicon, stem
+
+
+@pytest.fixture
+def lexicon(tmp_path):
+    path = tmp_path / 'sentiment.tsv'
+    path.write_text(
+        '# тестовый словарь\n'
+        'рад\t1\n'
+        'нравится\t1\n'
+        'грустно\t-1\n'
+        '=ура\t2\n'
+        '=радио\t0\n'
+        'строка без веса\n',
+        encoding='utf-8'
+    )
+    return Lexicon.load(path)
+
+
+def test_load(lexicon):
+    assert lexicon.weights == {stem('рад'): 1.0, stem('нравится'): 1.0, stem('грустно'): -1.0}
+    assert lexicon.exact == {'ура': 2.0, 'радио': 0.0}
+
+
+def test_word_forms_share_weight(lexicon):
+    assert lexicon.sentiment(['я', 'рада'])['polarity'] == 1.0
+    assert lexicon.sentiment(['мне', 'грустно'])['polarity'] == -1.0
+    assert lexicon.sentiment(['обычный', 'день']) == {'polarity': 0.0, 'subjectivity': 0.0}
+
+
+def test_exact_forms_override_stems(lexicon):
+    # «радио» совпадает с «рад» по основе, но точная форма с весом 0 её исключает
+    assert stem('радио') == stem('рад')
+    assert lexicon.sentiment(['включи', 'радио']) == {'polarity': 0.0, 'subjectivity': 0.0}
+    # Точная форма не стеммится и не задевает другие формы
+    result = lexicon.sentiment(['ура', 'мне', 'грустно'])
+    assert result['polarity'] == pytest.approx((2 - 1) / 3)
+
+
+def test_negation_flips_weight(lexicon):
+    assert lexicon.sentiment(['мне', 'не', 'нравится'])['polarity'] == -1.0
+    assert lexicon.sentiment(['ни', 'капли', 'не', 'грустно'])['polarity'] == 1.0
+    # Отрицание действует только на следующее слово
+    assert lexicon.sentiment(['не', 'знаю', 'но', 'рад'])['polarity'] == 1.0
+
+
+def test_every_occurrence_counts(lexicon):
+    result = lexicon.sentiment(['рад', 'рад', 'рада', 'грустно'])
+    assert result['polarity'] == pytest.approx((3 - 1) / 4)
+    assert result['subjectivity'] == 1.0
+    # Отрицание у первого вхождения не перекрывается вторым
+    result = lexicon.sentiment(['мне', 'не', 'нравится', 'но', 'тебе', 'нравится'])
+    assert result['polarity'] == 0.0
+    assert result['subjectivity'] == pytest.approx(2 / 6)
+
+
+def test_keywords_group_forms(lexicon):
+    tokens = ['котики', 'это', 'котик', 'и', 'собаки', 'собака', 'котиков', 'мы']
+    assert lexicon.keywords(tokens, stop_words={'это'}, limit=2) == ['котики', 'собаки']
+
+
+def test_default_lexicon():
+    lexicon = load_lexicon()
+    assert lexicon.sentiment(['спасибо', 'всё', 'отлично'])['polarity'] == 1.0
+    assert lexicon.sentiment(['слушаю', 'радио']) == {'polarity': 0.0, 'subjectivity': 0.0}
+
+
+def test_env_lexicon_is_read_on_every_call(tmp_path, monkeypatch):
+    extra = tmp_path / 'extra.tsv'
+    extra.write_text('кринж\t-1\n', encoding='utf-8')
+    monkeypatch.delenv('MIKA_LEXICON', raising=False)
+    plain = load_lexicon()
+    assert plain.sentiment(['кринж'])['polarity'] == 0.0
+
+    monkeypatch.setenv('MIKA_LEXICON', str(extra))
+    custom = load_lexicon()
+    assert custom is not plain
+    assert custom.sentiment(['кринж'])['polarity'] == -1.0
+    # Тот же набор файлов читается один раз
+    assert load_lexicon() is custom
+
+    monkeypatch.delenv('MIKA_LEXICON')
+    assert load_lexicon() is plain
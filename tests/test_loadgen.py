@@ -0,0 +1,147 @@
+"""Нагрузочный прогон: чтение диалогов из старых схем, сводка и остановка имитаторов."""
+
+import json
+import math
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+from src import loadgen
+from src.dialog_manager import DialogManager
+from src.fake_ollama import FakeOllamaServer
+from src.loadgen import FALLBACK_DIALOG, _Result, load_dialogs, summarize
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def user_messages(path, sql):
+    conn = sqlite3.connect(str(path))
+    try:
+        return [row for row in conn.execute(sql) if row[-1] and row[-1].strip()]
+    finally:
+        conn.close()
+
+
+def test_mika_db_dialogs_grouped_by_user():
+    path = ROOT / 'mika.db'
+    rows = user_messages(path, 'SELECT user_id, human_message FROM dialogs ORDER BY id')
+    dialogs = load_dialogs([str(path)])
+    assert len(dialogs) == len({user for user, _ in rows})
+    assert sorted(sum(dialogs, [])) == sorted(message.strip() for _, message in rows)
+    # Реплики одного пользователя идут в исходном порядке
+    first_user = rows[0][0]
+    assert dialogs[0] == [message.strip() for user, message in rows if user == first_user]
+
+
+@pytest.mark.parametrize('name, table', [('dialogs.db', 'dialogs'), ('mika_data.db', 'messages')])
+def test_schemas_without_users_are_one_dialog(name, table):
+    path = ROOT / name
+    rows = user_messages(path, f'SELECT human_message FROM {table} ORDER BY id')
+    assert load_dialogs([str(path)]) == [[message.strip() for (message,) in rows]]
+
+
+def test_current_schema_grouped_by_session(tmp_path):
+    path = tmp_path / 'mika_data.db'
+    for session in ('s1', 's2'):
+        manager = DialogManager(path, session_id=session, user_id='alice')
+        manager.add_interaction(f'Привет из {session}', 'Привет!')
+        manager.add_interaction('  ', 'Пустая реплика пропускается')
+        manager.close()
+    assert load_dialogs([str(path)]) == [['Привет из s1'], ['Привет из s2']]
+
+
+def test_all_sources_together():
+    paths = [str(ROOT / name) for name in loadgen.DEFAULT_SOURCES]
+    assert load_dialogs(paths) == sum((load_dialogs([path]) for path in paths), [])
+
+
+def test_missing_or_broken_sources_fall_back(tmp_path):
+    broken = tmp_path / 'broken.db'
+    broken.write_bytes(b'not a database at all' * 100)
+    assert load_dialogs([str(tmp_path / 'missing.db'), str(broken)]) == [list(FALLBACK_DIALOG)]
+
+
+def test_summarize():
+    results = [
+        _Result(0.1, 1.0, True),
+        _Result(0.3, 2.0, True),
+        _Result(None, 0.5, False),
+        _Result(0.2, 3.0, False),
+    ]
+    report = summarize(results, elapsed=2.0)
+    assert (report['turns'], report['model_turns'], report['turns_per_s']) == (4, 2, 2.0)
+    assert (report['ttft_p50_s'], report['ttft_p99_s']) == (0.2, 0.3)
+    assert (report['latency_p50_s'], report['latency_p95_s']) == (1.0, 3.0)
+
+
+def test_summarize_without_results():
+    report = summarize([], elapsed=0.0)
+    assert (report['turns'], report['turns_per_s']) == (0, 0.0)
+    assert math.isnan(report['ttft_p50_s']) and math.isnan(report['latency_p99_s'])
+
+
+def test_fake_server_stop_is_idempotent():
+    server = FakeOllamaServer().start()
+    server.stop()
+    server.stop()
+    # Сервер, который так и не запускали, тоже останавливается без зависания
+    FakeOllamaServer().stop()
+
+
+class TrackedFake(FakeOllamaServer):
+    created = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        TrackedFake.created.append(self)
+
+
+@pytest.fixture
+def tracked(monkeypatch):
+    TrackedFake.created = []
+    monkeypatch.setattr(loadgen, 'FakeOllamaServer', TrackedFake)
+    return TrackedFake.created
+
+
+def run_main(monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['loadgen', *map(str, args)])
+    loadgen.main()
+
+
+def test_all_fakes_stopped_when_run_fails(tracked, monkeypatch):
+    def failing_run(*args, **kwargs):
+        raise RuntimeError('прогон упал')
+
+    monkeypatch.setattr(loadgen, 'run', failing_run)
+    with pytest.raises(RuntimeError):
+        run_main(monkeypatch, '--fake-servers', 3, '--dead-servers', 1, '--db')
+    assert len(tracked) == 3
+    assert all(fake._stopped for fake in tracked)
+
+
+def test_started_fakes_stopped_when_startup_fails(tracked, monkeypatch):
+    class FailingThird(TrackedFake):
+        def __init__(self, *args, **kwargs):
+            if len(TrackedFake.created) == 2:
+                raise OSError('порт занят')
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(loadgen, 'FakeOllamaServer', FailingThird)
+    with pytest.raises(OSError):
+        run_main(monkeypatch, '--fake-servers', 3, '--db')
+    assert len(tracked) == 2
+    assert all(fake._stopped for fake in tracked)
+
+
+def test_main_reports_json(tracked, monkeypatch, capsys):
+    run_main(
+        monkeypatch, '--users', 2, '--turns', 2, '--latency', 0, '--jitter', 0, '--rate', 0,
+        '--fake-servers', 2, '--dead-servers', 1, '--json', '--db', ROOT / 'dialogs.db'
+    )
+    report = json.loads(capsys.readouterr().out)
+    assert report['turns'] == 4
+    # Запросы к остановленному имитатору переданы живому
+    assert report['failovers'] >= 1 and report['backend1_requests'] >= 1
+    assert all(fake._stopped for fake in tracked)
@@ -0,0 +1,169 @@
+"""Долговременная память: индексы пользователей в memmap float16, рост файлов и порядок найденного."""
+
+import numpy as np
+import pytest
+
+from src.dialog_manager import DialogManager
+from src.memory import LongTermMemory, _index_key
+
+DIM = 64
+
+
+class WordEmbedder:
+    """Мешок слов вместо модели: у каждого слова своя координата."""
+
+    def __init__(self):
+        self.vocabulary = {}
+        self.encoded = 0
+
+    def encode(self, texts):
+        self.encoded += len(texts)
+        return np.stack([self.encode_one(text) for text in texts])
+
+    def encode_one(self, text):
+        vector = np.zeros(DIM, dtype=np.float32)
+        for word in text.lower().replace(':', ' ').split():
+            vector[self.vocabulary.setdefault(word, len(self.vocabulary)) % DIM] += 1.0
+        return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.delenv('MIKA_RETENTION_DAYS', raising=False)
+    manager = DialogManager(tmp_path / 'mika_data.db')
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def embedder():
+    return WordEmbedder()
+
+
+@pytest.fixture
+def make_memory(manager, embedder, tmp_path):
+    created = []
+
+    def make(**options):
+        options = dict(dict(embedder=embedder, skip_recent=0, min_score=0.0), **options)
+        memory = LongTermMemory(manager.storage, tmp_path / 'memory', **options)
+        created.append(memory)
+        return memory
+
+    yield make
+    for memory in created:
+        memory.close()
+
+
+def add(manager, user_id, human, ai='ладно'):
+    manager.storage.execute(
+        'INSERT INTO messages (session_id, user_id, human_message, ai_message) VALUES (?, ?, ?, ?)',
+        (user_id, user_id, human, ai)
+    )
+
+
+def humans(found):
+    return [item['human'] for item in found]
+
+
+def test_users_have_separate_indexes(manager, make_memory, tmp_path):
+    add(manager, 'alice', 'люблю котиков')
+    add(manager, 'bob', 'люблю котиков и собак')
+    add(manager, 'alice', 'еду на море')
+    memory = make_memory()
+    assert memory.index_pending() == 3
+
+    assert humans(memory.recall('alice', 'котиков', k=5)) == ['люблю котиков', 'еду на море']
+    assert humans(memory.recall('bob', 'котиков', k=5)) == ['люблю котиков и собак']
+    assert memory.recall('carol', 'котиков') == []
+    # У каждого пользователя свои файлы, имя — хэш user_id
+    assert _index_key('alice') != _index_key('bob')
+    for user_id in ('alice', 'bob'):
+        assert (tmp_path / 'memory' / f'{_index_key(user_id)}.f16').exists()
+
+
+def test_float16_round_trip_and_reopen(manager, make_memory, embedder):
+    for i in range(3):
+        add(manager, 'alice', f'вопрос номер {i}')
+    memory = make_memory()
+    memory.index_pending()
+
+    index = memory._indexes['alice']
+    stored = np.asarray(index.vectors[:index.rows], dtype=np.float32)
+    expected = embedder.encode([f'Пользователь: вопрос номер {i}\nМика: ладно' for i in range(3)])
+    assert index.vectors.dtype == np.float16
+    np.testing.assert_allclose(stored, expected, atol=1e-3)
+    assert list(index.ids[:index.rows]) == [1, 2, 3]
+    before = humans(memory.recall('alice', 'вопрос номер 2', k=3))
+
+    # Новый процесс продолжает с сохранённого места и читает индекс с диска
+    add(manager, 'alice', 'последний вопрос')
+    reopened = make_memory()
+    assert humans(reopened.recall('alice', 'вопрос номер 2', k=3)) == before
+    encoded = embedder.encoded
+    assert reopened.index_pending() == 1
+    assert embedder.encoded == encoded + 1
+    assert reopened._indexes['alice'].rows == 4
+
+
+def test_index_grows_by_doubling(manager, make_memory):
+    memory = make_memory(initial_capacity=2, batch_size=2)
+    for i in range(5):
+        add(manager, 'alice', f'ход {i}')
+    assert memory.index_pending() == 5
+
+    index = memory._indexes['alice']
+    assert (index.rows, index.capacity) == (5, 8)
+    assert index.vectors_path.stat().st_size == 8 * DIM * 2
+    assert index.ids_path.stat().st_size == 8 * 8
+    assert sorted(humans(memory.recall('alice', 'ход', k=10))) == [f'ход {i}' for i in range(5)]
+
+
+def test_recall_order_threshold_and_recent(manager, make_memory):
+    add(manager, 'alice', 'погода сегодня хорошая')
+    add(manager, 'alice', 'погода')
+    add(manager, 'alice', 'купил хлеб')
+    add(manager, 'alice', 'погода завтра')
+    memory = make_memory(min_score=0.4)
+    memory.index_pending()
+
+    # Самое близкое первым, далёкое отсекается порогом
+    assert humans(memory.recall('alice', 'погода', k=5)) == [
+        'погода', 'погода завтра', 'погода сегодня хорошая'
+    ]
+    assert humans(memory.recall('alice', 'погода', k=1)) == ['погода']
+
+    # Последние ходы уже есть в истории чата и в поиск не попадают
+    memory.skip_recent = 2
+    assert humans(memory.recall('alice', 'погода', k=5)) == ['погода', 'погода сегодня хорошая']
+
+
+def test_small_chunks_give_same_result(manager, make_memory):
+    for i in range(9):
+        add(manager, 'alice', f'сообщение {i} ' + ' '.join(['кот'] * i))
+    whole = make_memory(chunk_rows=100)
+    whole.index_pending()
+    chunked = make_memory(chunk_rows=2)
+    assert humans(chunked.recall('alice', 'кот', k=3)) == humans(whole.recall('alice', 'кот', k=3))
+
+
+def test_deleted_messages_are_skipped(manager, make_memory):
+    add(manager, 'alice', 'погода')
+    add(manager, 'alice', 'погода завтра')
+    memory = make_memory()
+    memory.index_pending()
+    manager.storage.execute('DELETE FROM messages WHERE id = 1')
+    assert humans(memory.recall('alice', 'погода', k=5)) == ['погода завтра']
+
+
+def test_missing_sentence_transformers_disables_memory(manager, make_memory):
+    class Unavailable:
+        def encode(self, texts):
+            raise ImportError('No module named sentence_transformers')
+
+    add(manager, 'alice', 'погода')
+    memory = make_memory(embedder=Unavailable())
+    memory.schedule_index()
+    memory._index_executor.submit(lambda: None).result(timeout=2)
+    assert memory.enabled is False
+    assert memory.recall('alice', 'погода') == []
@@ -0,0 +1,105 @@
+"""Анализ сообщения: однократный расчёт с LRU-кэшем, неизменяемость, личные сообщения, тональность в промпте."""
+
+import pytest
+
+from src.dialog_manager import DialogManager
+from src.message_analysis import MessageAnalysis, MessageAnalyzer
+from src.mika import Mika
+from src.text_processor import TextProcessor
+
+
+class CountingProcessor(TextProcessor):
+    """Обработчик текста, считающий вызовы анализа."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def analyze_text(self, text):
+        self.calls.append(text)
+        return super().analyze_text(text)
+
+
+@pytest.fixture
+def processor():
+    return CountingProcessor()
+
+
+def test_analysis_is_memoized_with_lru_eviction(processor):
+    analyzer = MessageAnalyzer(processor, cache_size=2)
+    first = analyzer.analyze('первое')
+    analyzer.analyze('второе')
+    # Повтор берётся из кэша и становится самым свежим
+    assert analyzer.analyze('первое') is first
+    analyzer.analyze('третье')
+    assert processor.calls == ['первое', 'второе', 'третье']
+
+    # Вытеснено самое давнее — «второе», а не «первое»
+    assert analyzer.analyze('первое') is first
+    analyzer.analyze('второе')
+    assert processor.calls == ['первое', 'второе', 'третье', 'второе']
+
+
+def test_analysis_is_immutable(processor):
+    analysis = MessageAnalyzer(processor).analyze('Меня зовут Аня')
+    with pytest.raises(AttributeError):
+        analysis.name = 'Оля'
+    with pytest.raises(AttributeError):
+        del analysis.tokens
+    assert analysis.name == 'Аня'
+    assert isinstance(analysis.tokens, tuple) and isinstance(analysis.keywords, tuple)
+    # Словарь для старых вызовов — копия, его изменение не трогает кэш
+    analysis.to_dict()['keywords'].append('лишнее')
+    assert 'лишнее' not in analysis.keywords
+
+
+@pytest.mark.parametrize('text, personal', [
+    ('Мне сегодня грустно', True),
+    ('Как прошёл наш разговор вчера?', True),
+    ('Мой кот спит', True),
+    ('Что такое фотосинтез?', False),
+    ('Почему небо голубое', False),
+    # Маркер — отдельное слово, а не часть другого
+    ('Мнение экспертов', False),
+])
+def test_personal_markers(processor, text, personal):
+    assert MessageAnalyzer(processor).analyze(text).is_personal is personal
+
+
+def test_without_text_processor_only_intents():
+    analysis = MessageAnalyzer().analyze('Мне грустно, я тестирую')
+    assert analysis.is_test and not analysis.is_personal
+    assert (analysis.polarity, analysis.keywords, analysis.tokens) == (0, (), ())
+
+
+def test_process_message_reports_sentiment_and_keywords(tmp_path):
+    # Прежний process_message всегда возвращал нулевую тональность и пустые ключевые слова
+    manager = DialogManager(tmp_path / 'mika_data.db', analyzer=MessageAnalyzer(TextProcessor()))
+    try:
+        sad = manager.process_message('Мне очень грустно, котики опять болеют')
+        assert sad['sentiment']['polarity'] < 0
+        assert 'котики' in sad['keywords']
+        assert manager.process_message('Спасибо, всё отлично!')['sentiment']['polarity'] > 0
+    finally:
+        manager.close()
+
+
+def test_mood_and_keywords_reach_the_prompt(tmp_path):
+    manager = DialogManager(tmp_path / 'mika_data.db', analyzer=MessageAnalyzer(TextProcessor()))
+    mika = Mika(ollama_client=object(), dialog_manager=manager)
+    try:
+        context = mika._build_context('Мне очень грустно, котики опять болеют')
+        assert 'Настроение пользователя: негативное' in context
+        assert 'Ключевые слова: ' in context and 'котики' in context
+        # Нейтральное сообщение без слов словаря секции настроения не получает
+        assert 'Настроение' not in mika._build_context('Который час')
+    finally:
+        mika.close()
+        manager.close()
+
+
+def test_analysis_repr_and_wiki_flag(processor):
+    analysis = MessageAnalyzer(processor).analyze('Расскажи про Марс')
+    assert isinstance(analysis, MessageAnalysis)
+    assert repr(analysis) == "MessageAnalysis('Расскажи про Марс')"
+    assert analysis.requires_wiki and analysis.wiki_topic == 'марс'
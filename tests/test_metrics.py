@@ -0,0 +1,106 @@
+"""Метрики: квантили гистограмм, формат Prometheus, журнал JSON Lines и включение через MIKA_METRICS."""
+
+import json
+import math
+import re
+import time
+
+import pytest
+
+from src.metrics import DISABLED, Histogram, JsonLinesSink, Metrics, quantile, summarize
+
+
+def test_quantile_nearest_rank():
+    values = list(range(1, 101))
+    assert [quantile(values, q) for q in (0.5, 0.95, 0.99, 1.0)] == [50, 95, 99, 100]
+    assert quantile(values, 0.0) == 1
+    assert quantile([7.0], 0.99) == 7.0
+    assert math.isnan(quantile([], 0.5))
+
+
+def test_histogram_window_and_totals():
+    histogram = Histogram(window=10)
+    for value in range(100):
+        histogram.observe(float(value))
+    # Квантили — по последним 10 значениям, счётчик и сумма — по всем
+    assert (histogram.count, histogram.sum) == (100, sum(range(100)))
+    assert histogram.quantiles() == {0.5: 94.0, 0.95: 99.0, 0.99: 99.0}
+
+
+def test_snapshot_and_span():
+    metrics = Metrics()
+    for value in (0.1, 0.2, 0.3, 0.4):
+        metrics.observe('queue_wait_seconds', value)
+    with metrics.span('build_context_seconds') as span:
+        time.sleep(0.01)
+    snapshot = metrics.snapshot()
+    assert snapshot['queue_wait_seconds'] == {
+        'count': 4, 'sum': pytest.approx(1.0), 'p50': 0.2, 'p95': 0.4, 'p99': 0.4
+    }
+    assert snapshot['build_context_seconds']['count'] == 1
+    assert snapshot['build_context_seconds']['sum'] == span.elapsed >= 0.01
+
+
+def test_render_prometheus():
+    metrics = Metrics(prefix='mika')
+    for value in (1, 2, 3, 4):
+        metrics.observe('tokens_per_second', value)
+    metrics.observe('first_token_seconds', 0.123456789)
+    text = metrics.render_prometheus()
+    assert text.endswith('\n')
+    assert text.splitlines() == [
+        '# TYPE mika_first_token_seconds summary',
+        'mika_first_token_seconds{quantile="0.5"} 0.123457',
+        'mika_first_token_seconds{quantile="0.95"} 0.123457',
+        'mika_first_token_seconds{quantile="0.99"} 0.123457',
+        'mika_first_token_seconds_sum 0.123457',
+        'mika_first_token_seconds_count 1',
+        '# TYPE mika_tokens_per_second summary',
+        'mika_tokens_per_second{quantile="0.5"} 2',
+        'mika_tokens_per_second{quantile="0.95"} 4',
+        'mika_tokens_per_second{quantile="0.99"} 4',
+        'mika_tokens_per_second_sum 10',
+        'mika_tokens_per_second_count 4',
+    ]
+    # Каждая строка значения — имя, необязательные метки и число
+    sample = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[a-z]+="[^"]*"\})? \S+$')
+    assert all(sample.match(line) for line in text.splitlines() if not line.startswith('#'))
+
+
+def test_empty_registry_renders_empty_text():
+    assert Metrics().render_prometheus() == '\n'
+
+
+def test_disabled_metrics_record_nothing():
+    assert DISABLED.span('x') is DISABLED.span('y')
+    with DISABLED.span('x'):
+        pass
+    DISABLED.observe('x', 1.0)
+    assert DISABLED.snapshot() == {}
+
+
+def test_from_env(tmp_path, monkeypatch):
+    monkeypatch.delenv('MIKA_METRICS', raising=False)
+    assert Metrics.from_env() is DISABLED
+
+    path = tmp_path / 'metrics.jsonl'
+    monkeypatch.setenv('MIKA_METRICS', str(path))
+    metrics = Metrics.from_env()
+    assert metrics.enabled and isinstance(metrics.sink, JsonLinesSink)
+    metrics.observe('generation_seconds', 1.5, session='s1')
+    metrics.close()
+
+    record = json.loads(path.read_text(encoding='utf-8'))
+    assert (record['name'], record['value'], record['session']) == ('generation_seconds', 1.5, 's1')
+
+
+def test_summarize_log_without_window(tmp_path):
+    path = tmp_path / 'metrics.jsonl'
+    metrics = Metrics(sink=JsonLinesSink(path), window=2)
+    for value in range(1, 11):
+        metrics.observe('queue_wait_seconds', float(value))
+    metrics.close()
+    # Сводка по журналу учитывает все записи, а не окно реестра
+    assert summarize(path)['queue_wait_seconds'] == {
+        'count': 10, 'sum': 55.0, 'p50': 5.0, 'p95': 10.0, 'p99': 10.0
+    }
@@ -0,0 +1,84 @@
+"""Запросы Мики к модели: неизменный префикс /api/chat между ходами и keep_alive."""
+
+import json
+
+import pytest
+
+from src.dialog_manager import DialogManager
+from src.fake_ollama import FakeOllamaServer
+from src.mika import Mika
+from src.ollama_client import OllamaClient
+from src.warmup import ModelWarmer
+
+TURNS = ('Расскажи сказку про дракона', 'Почему небо голубое', 'Какие бывают облака')
+
+
+@pytest.fixture
+def fake():
+    server = FakeOllamaServer(latency=0.0, jitter=0.0, rate=0, tokens=(5, 5), record=True).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def make_mika(fake, tmp_path):
+    created = []
+
+    def make(**options):
+        client = OllamaClient(fake.url)
+        dialog_manager = DialogManager(tmp_path / f'mika_data_{len(created)}.db')
+        mika = Mika(ollama_client=client, dialog_manager=dialog_manager, **options)
+        created.append((mika, client, dialog_manager))
+        return mika
+
+    yield make
+    for mika, client, dialog_manager in created:
+        mika.close()
+        client.close()
+        dialog_manager.close()
+
+
+def without_last_turn(body: bytes) -> bytes:
+    """Тело запроса до последнего сообщения пользователя — та часть, которую Ollama берёт из KV-кэша."""
+    return body[:body.rindex(b'{"role": "user"')]
+
+
+def test_chat_prefix_is_byte_identical_between_turns(fake, make_mika):
+    mika = make_mika()
+    replies = [''.join(mika.respond(text)) for text in TURNS]
+    assert all(replies)
+    assert len(fake.payloads) == len(TURNS)
+
+    for previous, current in zip(fake.payloads, fake.payloads[1:]):
+        # Всё, что было отправлено на прошлом ходу, повторяется в начале следующего запроса байт в байт
+        assert current.startswith(previous[:-2])
+        assert len(without_last_turn(current)) > len(without_last_turn(previous))
+
+    messages = json.loads(fake.payloads[-1])['messages']
+    assert [m['role'] for m in messages] == ['system', 'user', 'assistant', 'user', 'assistant', 'user']
+    assert messages[0]['content'] == mika.system_prompt
+    assert messages[2]['content'] == replies[0]
+
+
+def test_keep_alive_in_every_request(fake, make_mika):
+    mika = make_mika(keep_alive='45m', num_ctx=4096)
+    for text in TURNS[:2]:
+        ''.join(mika.respond(text))
+    for body in fake.payloads:
+        payload = json.loads(body)
+        assert payload['keep_alive'] == '45m'
+        assert payload['options'] == {'num_ctx': 4096}
+        assert payload['stream'] is True
+
+
+def test_warm_up_loads_model_with_same_keep_alive(fake):
+    client = OllamaClient(fake.url)
+    warmer = ModelWarmer(client, 'marco-o1', keep_alive='45m', options={'num_ctx': 4096})
+    try:
+        assert warmer.warm_up().result(timeout=2)
+    finally:
+        warmer.close()
+        client.close()
+    payload = json.loads(fake.payloads[0])
+    # Загрузка без промпта: модель остаётся в памяти на тот же срок, что и при генерации
+    assert payload == {'model': 'marco-o1', 'keep_alive': '45m', 'stream': False, 'options': {'num_ctx': 4096}}
@@ -0,0 +1,169 @@
+"""Клиент Ollama на имитаторе: повторы с задержкой, таймауты до и после первого токена, отмена потока."""
+
+import asyncio
+import socket
+import time
+
+import pytest
+import requests
+
+from src import ollama_client
+from src.fake_ollama import FakeOllamaServer
+from src.ollama_client import OllamaClient, OllamaError, OllamaTimeout, message_text
+
+PAYLOAD = {'model': 'marco-o1', 'messages': [{'role': 'user', 'content': 'Привет'}], 'stream': True}
+
+
+def dead_url() -> str:
+    # Порт, который только что был свободен: соединение с ним отклоняется
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f'http://127.0.0.1:{port}'
+
+
+@pytest.fixture
+def fake():
+    servers = []
+
+    def make(**options):
+        options = dict(dict(latency=0.0, jitter=0.0, rate=0, tokens=(3, 3)), **options)
+        server = FakeOllamaServer(**options).start()
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def make_client():
+    clients = []
+
+    def make(url, **options):
+        client = OllamaClient(url, **options)
+        clients.append(client)
+        return client
+
+    yield make
+    for client in clients:
+        client.close()
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_connection_errors_are_retried_with_backoff(make_client, monkeypatch):
+    delays = []
+    monkeypatch.setattr(ollama_client.time, 'sleep', delays.append)
+    client = make_client(dead_url(), retries=3, backoff=0.5)
+    attempts = []
+    request = client.session.request
+    monkeypatch.setattr(client.session, 'request', lambda *a, **k: attempts.append(a) or request(*a, **k))
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        next(client.stream_chat(PAYLOAD))
+    assert len(attempts) == 4
+    # Задержка удваивается с каждой попыткой, после последней её нет
+    assert delays == [0.5, 1.0, 2.0]
+    assert client.check_service() is False
+
+
+def test_retry_reaches_server_that_came_up(fake, make_client, monkeypatch):
+    server = fake()
+    client = make_client(server.url, retries=2, backoff=0.01)
+    request = client.session.request
+    failures = [requests.exceptions.ConnectionError('refused')]
+
+    def flaky(*args, **kwargs):
+        if failures:
+            raise failures.pop()
+        return request(*args, **kwargs)
+
+    monkeypatch.setattr(client.session, 'request', flaky)
+    messages = list(client.stream_chat(PAYLOAD))
+    assert messages[-1]['done']
+    assert server.requests == 1
+
+
+def test_http_errors_are_not_retried(fake, make_client):
+    server = fake(tokens=(0, 0), error_rate=1.0)
+    client = make_client(server.url, retries=3, backoff=0.01)
+    with pytest.raises(OllamaError):
+        list(client.stream_chat(PAYLOAD))
+    assert server.requests == 1
+
+
+def test_first_token_timeout(fake, make_client):
+    server = fake(latency=1.0)
+    client = make_client(server.url, first_token_timeout=0.2, read_timeout=5.0, retries=0)
+    started = time.monotonic()
+    with pytest.raises(OllamaTimeout):
+        list(client.stream_chat(PAYLOAD))
+    assert time.monotonic() - started < 0.8
+
+
+def test_read_timeout_applies_after_first_token(fake, make_client):
+    # Первый токен через 0.4 с — дольше read_timeout, но в пределах first_token_timeout
+    server = fake(latency=0.4, rate=100, tokens=(5, 5))
+    client = make_client(server.url, first_token_timeout=2.0, read_timeout=0.2, retries=0)
+    messages = list(client.stream_chat(PAYLOAD))
+    assert ''.join(map(message_text, messages)).count(' ') == 4
+    assert messages[-1]['done']
+
+    # После первого токена пауза в 0.5 с между строками уже превышает read_timeout
+    server.rate = 2
+    stream = client.stream_chat(PAYLOAD)
+    assert not next(stream)['done']
+    with pytest.raises(OllamaTimeout):
+        list(stream)
+
+
+def test_closing_stream_aborts_generation(fake, make_client):
+    server = fake(rate=20, tokens=(100, 100))
+    client = make_client(server.url)
+    stream = client.stream_generate({'model': 'marco-o1', 'prompt': 'Привет', 'stream': True})
+    assert message_text(next(stream))
+    stream.close()
+    assert wait_for(lambda: server.aborted == 1)
+
+
+def test_async_stream_cancellation_aborts_generation(fake, make_client):
+    server = fake(rate=20, tokens=(100, 100))
+    client = make_client(server.url)
+    received = []
+
+    async def consume():
+        async for message in client.astream_chat(PAYLOAD):
+            received.append(message)
+
+    async def main():
+        task = asyncio.create_task(consume())
+        while not received:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert len(received) < 100
+    assert wait_for(lambda: server.aborted == 1)
+
+
+def test_async_stream_reads_whole_response(fake, make_client):
+    server = fake(tokens=(4, 4))
+    client = make_client(server.url)
+
+    async def collect():
+        return [message async for message in client.astream_chat(PAYLOAD)]
+
+    messages = asyncio.run(collect())
+    assert len(messages) == 5 and messages[-1]['done']
+    assert messages[-1]['eval_count'] == 4
@@ -0,0 +1,45 @@
+"""Вывод потока токенов: префикс «Мика:» убирается один раз, текст не теряется."""
+
+import io
+
+import pytest
+from rich.spinner import Spinner
+
+from src.renderer import StreamRenderer
+
+
+def render(chunks, **options):
+    out = io.StringIO()
+    renderer = StreamRenderer(Spinner('dots'), header='> ', footer='\n', fps=1000, out=out, **options)
+    return renderer.render(chunks), out.getvalue()
+
+
+@pytest.mark.parametrize('chunks', [
+    ['Мика: Привет!'],
+    ['  Мика', ':', ' При', 'вет!'],
+    ['\n', 'М', 'и', 'ка', ':', ' ', 'Привет!'],
+])
+def test_prefix_is_stripped(chunks):
+    assert render(chunks) == ('Привет!', '> Привет!\n')
+
+
+def test_prefix_only_at_start():
+    text, _ = render(['Привет! ', 'Мика: ', 'это я.'])
+    assert text == 'Привет! Мика: это я.'
+
+
+def test_similar_start_is_kept():
+    assert render(['Мик', 'рофон включён'])[0] == 'Микрофон включён'
+    assert render(['Ми', 'ла', 'я шутка'])[0] == 'Милая шутка'
+
+
+def test_all_chunks_are_printed():
+    chunks = [f'слово{i} ' for i in range(500)]
+    text, printed = render(chunks)
+    assert text == ''.join(chunks)
+    assert printed == '> ' + text + '\n'
+
+
+def test_empty_stream():
+    assert render([]) == ('', '> \n')
+    assert render(['Мика:']) == ('', '> \n')
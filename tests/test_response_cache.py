@@ -0,0 +1,154 @@
+"""Кэш ответов и эмбеддинги: порог близости, TTL, вытеснение LRU и работа без sentence-transformers."""
+
+import logging
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from src import response_cache
+from src.embeddings import Embedder
+from src.response_cache import ResponseCache, normalize_prompt
+
+
+class WordEmbedder:
+    """Мешок слов вместо модели: близость — доля общих слов."""
+
+    def __init__(self):
+        self.calls = []
+        self.vocabulary = {}
+
+    def encode_one(self, text):
+        self.calls.append(text)
+        vector = np.zeros(64, dtype=np.float32)
+        for word in text.split():
+            vector[self.vocabulary.setdefault(word, len(self.vocabulary))] += 1.0
+        return vector / np.linalg.norm(vector)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache.time, 'time', clock)
+    return clock
+
+
+def test_normalize_prompt():
+    assert normalize_prompt('  Что такое ЁЖИК?! ') == 'что такое ежик'
+    assert normalize_prompt('?!') == ''
+
+
+def test_exact_and_similar_questions(clock):
+    cache = ResponseCache(WordEmbedder(), threshold=0.7)
+    cache.put('Как испечь блины на молоке?', 'Смешай муку, яйца и молоко')
+    assert cache.get('как испечь блины на молоке') == 'Смешай муку, яйца и молоко'
+    # 4 общих слова из 5: близость 0.8 выше порога
+    assert cache.get('Как испечь блины на воде') == 'Смешай муку, яйца и молоко'
+    # 2 общих слова из 5: ниже порога
+    assert cache.get('Как починить велосипед на даче') is None
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_threshold(clock):
+    cache = ResponseCache(WordEmbedder(), threshold=0.79)
+    cache.put('раз два три четыре пять', 'ответ')
+    # Близость 0.8
+    assert cache.get('раз два три четыре шесть') == 'ответ'
+    cache.threshold = 0.81
+    assert cache.get('раз два три четыре семь') is None
+
+
+def test_put_reuses_vector_from_get(clock):
+    embedder = WordEmbedder()
+    cache = ResponseCache(embedder)
+    assert cache.get('Почему небо голубое?') is None
+    cache.put('Почему небо голубое?', 'Из-за рассеяния света')
+    assert embedder.calls == ['почему небо голубое']
+
+
+def test_ttl(clock):
+    cache = ResponseCache(WordEmbedder(), threshold=0.7, ttl=60)
+    cache.put('Как испечь блины на молоке', 'Рецепт')
+    clock.now += 60
+    assert cache.get('Как испечь блины на молоке') == 'Рецепт'
+    clock.now += 1
+    # Устаревшая запись не находится ни точным совпадением, ни по близости
+    assert cache.get('Как испечь блины на молоке') is None
+    assert cache.get('Как испечь блины на воде') is None
+    # Повторное сохранение обновляет срок жизни
+    cache.put('Как испечь блины на молоке', 'Новый рецепт')
+    assert cache.get('Как испечь блины на молоке') == 'Новый рецепт'
+    assert len(cache) == 1
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = ResponseCache(WordEmbedder(), max_entries=2, ttl=None)
+    cache.put('первый вопрос', 'один')
+    clock.now += 1
+    cache.put('второй вопрос', 'два')
+    clock.now += 1
+    assert cache.get('первый вопрос') == 'один'
+    clock.now += 1
+    cache.put('третий вопрос', 'три')
+
+    assert len(cache) == 2
+    assert cache.get('второй вопрос') is None
+    assert (cache.get('первый вопрос'), cache.get('третий вопрос')) == ('один', 'три')
+
+
+def test_clear(clock):
+    cache = ResponseCache(WordEmbedder(), max_entries=2)
+    cache.put('первый вопрос', 'один')
+    cache.clear()
+    assert len(cache) == 0 and cache.get('первый вопрос') is None
+    cache.put('второй вопрос', 'два')
+    cache.put('третий вопрос', 'три')
+    assert len(cache) == 2
+
+
+def test_without_sentence_transformers_only_exact_matches(clock, monkeypatch, caplog):
+    monkeypatch.setitem(sys.modules, 'sentence_transformers', None)
+    cache = ResponseCache(Embedder())
+    with caplog.at_level(logging.WARNING, logger='mika'):
+        cache.put('Как испечь блины на молоке?', 'Рецепт')
+        assert cache.get('как испечь блины на молоке') == 'Рецепт'
+        assert cache.get('Как испечь блины на воде') is None
+    # Предупреждение одно, дальше эмбеддинги не запрашиваются
+    assert caplog.text.count('sentence-transformers недоступен') == 1
+
+
+def test_embedder_loads_model_once(monkeypatch):
+    loaded = []
+
+    class FakeModel:
+        def __init__(self, name, device=None):
+            loaded.append((name, device))
+
+        def get_sentence_embedding_dimension(self):
+            return 3
+
+        def encode(self, texts, batch_size, convert_to_numpy, normalize_embeddings, show_progress_bar):
+            assert normalize_embeddings and convert_to_numpy
+            return np.ones((len(texts), 3), dtype=np.float64) / np.sqrt(3)
+
+    module = types.ModuleType('sentence_transformers')
+    module.SentenceTransformer = FakeModel
+    monkeypatch.setitem(sys.modules, 'sentence_transformers', module)
+
+    embedder = Embedder('tiny-model', device='cpu')
+    # Модель не загружается до первого запроса
+    assert loaded == []
+    vectors = embedder.encode(['раз', 'два'])
+    assert vectors.shape == (2, 3) and vectors.dtype == np.float32
+    assert embedder.encode_one('три').shape == (3,)
+    assert embedder.dimension == 3
+    assert loaded == [('tiny-model', 'cpu')]
@@ -0,0 +1,69 @@
+"""Планировщик генераций: очередь высокого приоритета для прогрева."""
+
+import threading
+import time
+
+from src.scheduler import PRIORITY_HIGH, GenerationScheduler
+from src.warmup import ModelWarmer
+
+
+class RecordingClient:
+    def __init__(self, order):
+        self.order = order
+
+    def warm_up(self, model, keep_alive=None, options=None):
+        self.order.append('warm-up')
+        return True
+
+
+def wait_queued(scheduler, count):
+    deadline = time.monotonic() + 2
+    while scheduler.queue_depth < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_high_priority_goes_first():
+    scheduler = GenerationScheduler(max_concurrent=1)
+    busy = scheduler.acquire('a')
+    order = []
+
+    def acquire(session_id, priority):
+        ticket = scheduler.acquire(session_id, priority)
+        order.append(session_id)
+        scheduler.release(ticket)
+
+    normal = threading.Thread(target=acquire, args=('b', 1))
+    normal.start()
+    wait_queued(scheduler, 1)
+    high = threading.Thread(target=acquire, args=('c', PRIORITY_HIGH))
+    high.start()
+    wait_queued(scheduler, 2)
+    scheduler.release(busy)
+    normal.join()
+    high.join()
+    assert order == ['c', 'b']
+
+
+def test_warm_up_uses_high_lane():
+    scheduler = GenerationScheduler(max_concurrent=1)
+    busy = scheduler.acquire('a')
+    order = []
+
+    def generate():
+        ticket = scheduler.acquire('b')
+        order.append('generation')
+        scheduler.release(ticket)
+
+    normal = threading.Thread(target=generate)
+    normal.start()
+    wait_queued(scheduler, 1)
+    warmer = ModelWarmer(RecordingClient(order), 'marco-o1', keep_alive=0, scheduler=scheduler)
+    future = warmer.warm_up()
+    wait_queued(scheduler, 2)
+    scheduler.release(busy)
+    assert future.result(timeout=2)
+    normal.join()
+    warmer.close()
+    assert order == ['warm-up', 'generation']
+    assert scheduler.running == 0
@@ -0,0 +1,145 @@
+"""Полнотекстовый поиск и статистика по истории: синхронизация индекса FTS5 и разбор запроса."""
+
+import sqlite3
+
+import pytest
+
+from src.dialog_manager import FALLBACK_RESPONSES, DialogManager, search_query
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.delenv('MIKA_RETENTION_DAYS', raising=False)
+    manager = DialogManager(tmp_path / 'mika_data.db', session_id='s1', user_id='alice')
+    yield manager
+    manager.close()
+
+
+def add(manager, session_id, user_id, human, ai, fallback=False):
+    manager.storage.execute(
+        'INSERT INTO messages (session_id, user_id, human_message, ai_message, fallback) VALUES (?, ?, ?, ?, ?)',
+        (session_id, user_id, human, ai, int(fallback))
+    )
+
+
+def assert_index_in_sync(manager):
+    # FTS5 сверяет индекс с таблицей сообщений и бросает ошибку при расхождении
+    manager.storage.execute("INSERT INTO messages_fts (messages_fts, rank) VALUES ('integrity-check', 1)")
+
+
+def indexed_ids(manager, query):
+    rows = manager.storage.query('SELECT rowid FROM messages_fts WHERE messages_fts MATCH ? ORDER BY rowid', (query,))
+    return [row[0] for row in rows]
+
+
+def test_index_follows_insert_update_delete(manager):
+    manager.add_interaction('Расскажи про котиков', 'Котики любят спать')
+    manager.add_interaction('А собаки?', 'Собаки любят гулять')
+    assert manager.search('котик')['total'] == 1
+    assert_index_in_sync(manager)
+
+    manager.storage.execute("UPDATE messages SET human_message = 'Расскажи про хомяков' WHERE id = 1")
+    assert manager.search('хомяк')['total'] == 1
+    assert indexed_ids(manager, 'расскажи') == [1]
+
+    manager.storage.execute('DELETE FROM messages WHERE id = 1')
+    assert indexed_ids(manager, 'любят') == [2]
+    assert manager.search('хомяк')['total'] == 0
+    assert_index_in_sync(manager)
+
+
+def test_index_follows_retention_pruning(manager):
+    for i in range(5):
+        add(manager, 's1', 'alice', f'Старый вопрос про котиков {i}', 'Старый ответ')
+    manager.add_interaction('Новый вопрос про котиков', 'Новый ответ')
+    manager.storage.execute("UPDATE messages SET timestamp = datetime('now', '-30 days') WHERE id <= 5")
+
+    assert manager.clear_old_messages(days=7, batch_size=2) == 5
+    assert indexed_ids(manager, 'котиков') == [6]
+    assert manager.search('котик')['total'] == 1
+    assert_index_in_sync(manager)
+
+
+def test_search_filters_and_pages(manager):
+    for i in range(5):
+        add(manager, 's1', 'alice', f'Котик номер {i}', 'Мяу')
+    add(manager, 's2', 'bob', 'Котик Боба', 'Мур')
+    assert manager.search('котик')['total'] == 6
+    assert manager.search('котик', user_id='bob')['total'] == 1
+    assert manager.search('котик', session_id='s1')['total'] == 5
+
+    first = manager.search('котик', user_id='alice', limit=2)
+    last = manager.search('котик', user_id='alice', limit=2, offset=4)
+    assert (first['total'], last['total']) == (5, 5)
+    assert len(first['results']) == 2 and len(last['results']) == 1
+    assert '[Котик]' in first['results'][0]['human_message']
+
+
+@pytest.mark.parametrize('text', [
+    'котик"', '"котик', '(котик', 'котик)', 'котик*', '^котик', 'котик:', '-котик', '+котик', "котик'",
+])
+def test_fts_syntax_in_user_text_is_ignored(manager, text):
+    manager.add_interaction('Мой котик спит', 'Пусть спит')
+    # Знаки и операторы FTS5 не ломают запрос: ищется только слово
+    assert manager.search(text)['total'] == 1
+
+
+def test_query_without_words(manager):
+    manager.add_interaction('Мой котик спит', 'Пусть спит')
+    assert search_query('"*()') == ''
+    assert manager.search('"*()') == {'total': 0, 'results': []}
+
+
+def test_operators_are_plain_words_unless_raw(manager):
+    manager.add_interaction('Котик', 'Мяу')
+    manager.add_interaction('Собака', 'Гав')
+    # Без raw операторы — обычные слова, которых в истории нет
+    for text in ('котик OR собака', 'NEAR(котик собака)', 'human_message:котик'):
+        assert manager.search(text)['total'] == 0
+    assert manager.search('котик OR собака', raw=True)['total'] == 2
+    # Ошибка синтаксиса в raw-запросе не бросается наружу
+    assert manager.search('котик OR (', raw=True) == {'total': 0, 'results': []}
+
+
+def test_statistics_on_empty_database(manager):
+    stats = manager.get_statistics()
+    assert stats == {
+        'messages': 0, 'sessions': 0, 'users': 0, 'fallbacks': 0, 'fallback_rate': 0.0, 'per_day': []
+    }
+
+
+def test_statistics_count_fallbacks(manager):
+    manager.add_interaction('Привет', 'Привет!')
+    manager.add_interaction('Как дела?', FALLBACK_RESPONSES[0], fallback=True)
+    add(manager, 's2', 'bob', 'Кто ты?', 'Я Мика')
+    add(manager, 's3', 'bob', 'Давно', 'Давно', fallback=True)
+    manager.storage.execute("UPDATE messages SET timestamp = datetime('now', '-60 days') WHERE session_id = 's3'")
+
+    stats = manager.get_statistics(days=30)
+    assert (stats['messages'], stats['sessions'], stats['users'], stats['fallbacks']) == (3, 2, 2, 1)
+    assert stats['fallback_rate'] == pytest.approx(1 / 3)
+    assert len(stats['per_day']) == 1
+    assert manager.get_statistics(days=30, user_id='bob')['messages'] == 1
+    assert manager.get_statistics(days=90)['fallbacks'] == 2
+
+
+def test_fallback_backfill(tmp_path):
+    path = tmp_path / 'old.db'
+    conn = sqlite3.connect(str(path))
+    conn.execute('''CREATE TABLE messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, human_message TEXT, ai_message TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+    conn.execute('CREATE TABLE user_preferences (key TEXT PRIMARY KEY, value TEXT, timestamp DATETIME)')
+    conn.executemany('INSERT INTO messages (human_message, ai_message) VALUES (?, ?)', [
+        ('Привет', 'Привет!'), ('Что?', FALLBACK_RESPONSES[2]),
+    ])
+    conn.commit()
+    conn.close()
+
+    manager = DialogManager(path)
+    try:
+        assert manager.storage.query('SELECT fallback FROM messages ORDER BY id') == [(0,), (1,)]
+        # Уже накопленная история попадает в индекс при миграции
+        assert manager.search('привет')['total'] == 1
+    finally:
+        manager.close()
@@ -0,0 +1,93 @@
+"""Сессии сервера: у каждой свой пользователь, чужой user_id отклоняется."""
+
+import asyncio
+
+import pytest
+
+from src.server import HTTPError, MikaServer
+
+
+@pytest.fixture
+def make_server(tmp_path):
+    servers = []
+
+    def make(**options):
+        server = MikaServer(
+            db_path=str(tmp_path / 'mika_data.db'),
+            knowledge_db_path=str(tmp_path / 'mika_knowledge.db'),
+            workers=2,
+            **options
+        )
+        servers.append(server)
+        return server
+
+    yield make
+    for server in servers:
+        asyncio.run(server.close())
+
+
+@pytest.fixture
+def server(make_server):
+    return make_server()
+
+
+def test_session_defaults_to_own_user(server):
+    alice = server.get_session('alice')
+    bob = server.get_session('bob')
+    assert alice.mika.dialog_manager.user_id == 'alice'
+    assert bob.mika.dialog_manager.user_id == 'bob'
+
+    alice.mika.dialog_manager.update_user_preferences({'name': 'Алиса'})
+    assert bob.mika.dialog_manager.get_user_preferences().get('name') is None
+
+
+def test_explicit_user_id(server):
+    session = server.get_session('tab-1', 'alice')
+    assert session.mika.dialog_manager.user_id == 'alice'
+    # Без user_id и с тем же user_id — та же сессия
+    assert server.get_session('tab-1') is session
+    assert server.get_session('tab-1', 'alice') is session
+
+
+def test_other_user_is_rejected(server):
+    # Приветствие создало сессию без user_id: позже нельзя выдать её за другого пользователя
+    server.get_session('alice')
+    with pytest.raises(HTTPError) as error:
+        server.get_session('alice', 'bob')
+    assert error.value.status == 409
+
+
+def test_owner_survives_eviction(make_server):
+    server = make_server(max_sessions=1)
+    server.get_session('x', 'alice')
+    server.get_session('y')
+    assert 'x' not in server.sessions
+    with pytest.raises(HTTPError) as error:
+        server.get_session('x', 'bob')
+    assert error.value.status == 409
+    assert server.get_session('x').mika.dialog_manager.user_id == 'alice'
+
+
+def test_owner_survives_restart(make_server):
+    first = make_server()
+    first.get_session('x', 'alice')
+    asyncio.run(first.close())
+
+    restarted = make_server()
+    with pytest.raises(HTTPError) as error:
+        restarted.get_session('x', 'bob')
+    assert error.value.status == 409
+    assert restarted.get_session('x').mika.dialog_manager.user_id == 'alice'
+
+
+@pytest.mark.parametrize('length', [b'abc', b'-1'])
+def test_bad_content_length(server, length):
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b'POST /sessions/x/messages HTTP/1.1\r\nContent-Length: ' + length + b'\r\n\r\n')
+        reader.feed_eof()
+        return await server._read_request(reader)
+
+    with pytest.raises(HTTPError) as error:
+        asyncio.run(read())
+    assert error.value.status == 400
@@ -0,0 +1,96 @@
+"""Контекст сессий: привязка к пользователю переживает выгрузку и перезапуск."""
+
+import pytest
+
+from src.dialog_manager import DialogManager
+from src.session_state import SessionStateCache
+from src.storage import Storage
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return tmp_path / 'mika_data.db'
+
+
+def open_manager(db_path, session_id, user_id):
+    return DialogManager(db_path, session_id=session_id, user_id=user_id)
+
+
+def test_state_and_history_belong_to_owner(db_path):
+    alice = open_manager(db_path, 'x', 'alice')
+    alice.save_state({'recent': ['Меня зовут Алиса']})
+    alice.add_interaction('Меня зовут Алиса', 'Привет, Алиса!')
+    alice.close()
+
+    # Перезапуск: в памяти ничего нет, всё читается из базы
+    bob = open_manager(db_path, 'x', 'bob')
+    try:
+        assert bob.load_state() is None
+        assert bob.get_recent_messages() == []
+    finally:
+        bob.close()
+
+    alice = open_manager(db_path, 'x', 'alice')
+    try:
+        assert alice.load_state() == {'recent': ['Меня зовут Алиса']}
+        assert [m['content'] for m in alice.get_recent_messages()] == ['Меня зовут Алиса', 'Привет, Алиса!']
+    finally:
+        alice.close()
+
+
+def test_shared_cache_keeps_users_apart(db_path):
+    manager = open_manager(db_path, 'x', 'alice')
+    try:
+        cache = manager.state_cache
+        cache.save_state('x', 'alice', {'recent': ['секрет']})
+        assert cache.load_state('x', 'bob') is None
+        assert cache.load_state('x', 'alice') == {'recent': ['секрет']}
+        cache.invalidate(session_id='x')
+        assert cache.load_state('x', 'alice') == {'recent': ['секрет']}
+    finally:
+        manager.close()
+
+
+def test_session_owner_is_persisted(db_path):
+    open_manager(db_path, 'x', 'alice').close()
+    storage = Storage(db_path)
+    try:
+        cache = SessionStateCache(storage)
+        assert cache.session_owner('x', 'alice') == 'alice'
+        assert cache.session_owner('x', 'bob') == 'alice'
+    finally:
+        storage.close()
+
+    storage = Storage(db_path)
+    try:
+        assert SessionStateCache(storage).session_owner('x', 'bob') == 'alice'
+    finally:
+        storage.close()
+
+
+def test_session_with_history_belongs_to_its_author(db_path):
+    carol = open_manager(db_path, 'imported', 'carol')
+    carol.add_interaction('Старое сообщение', 'Старый ответ')
+    try:
+        assert carol.state_cache.session_owner('imported', 'bob') == 'carol'
+    finally:
+        carol.close()
+
+
+def test_existing_sessions_are_bound_on_upgrade(db_path):
+    manager = open_manager(db_path, 'x', 'alice')
+    manager.add_interaction('Привет', 'Привет!')
+    manager.save_state({'recent': []})
+    # Откатываем базу к версии 5, где привязки ещё не было
+    manager.storage.execute('DROP TABLE sessions')
+    manager.storage.execute("INSERT INTO session_state (session_id, user_id, state) VALUES ('y', 'dave', '{}')")
+    manager.storage.execute('PRAGMA user_version=5')
+    manager.close()
+
+    manager = open_manager(db_path, 'x', 'alice')
+    try:
+        assert sorted(manager.storage.query('SELECT session_id, user_id FROM sessions')) == [
+            ('x', 'alice'), ('y', 'dave')
+        ]
+    finally:
+        manager.close()
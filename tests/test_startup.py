@@ -0,0 +1,59 @@
+"""Холодный старт: ленивые импорты, отсутствие сети при импорте и бюджет времени."""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+from benchmarks import startup
+
+HEAVY_MODULES = ('rich', 'requests', 'wikipediaapi', 'nltk')
+
+# На медленных машинах бюджеты можно растянуть: MIKA_BUDGET_SCALE=2 pytest
+BUDGET_SCALE = float(os.environ.get('MIKA_BUDGET_SCALE', '1.0'))
+
+# Любое сетевое обращение в дочернем процессе завершает его с ошибкой
+_NO_NETWORK = '''
+import sys
+def _audit(event, args):
+    if event in ('socket.connect', 'socket.getaddrinfo', 'urllib.Request'):
+        raise RuntimeError(f'сетевое обращение при импорте: {event} {args!r}')
+sys.addaudithook(_audit)
+'''
+
+
+def run_python(code: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=str(startup.ROOT))
+    return subprocess.run(
+        [sys.executable, '-c', code],
+        capture_output=True, text=True, env=env, cwd=tempfile.gettempdir()
+    )
+
+
+def test_dialog_manager_import_is_light():
+    result = run_python(
+        'import sys, src.dialog_manager; '
+        f'print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))'
+    )
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == ''
+
+
+def test_text_processor_import_is_offline():
+    result = run_python(
+        _NO_NETWORK
+        + 'import nltk\n'
+        + 'nltk.download = lambda *a, **k: sys.exit("nltk.download при импорте")\n'
+        + 'from src.text_processor import TextProcessor\n'
+        + 'TextProcessor().analyze_text("Привет! Что такое Python?")\n'
+    )
+    assert result.returncode == 0, result.stderr
+
+
+@pytest.mark.parametrize('module, budget_ms', sorted(startup.IMPORT_BUDGETS_MS.items()))
+def test_import_budget(module, budget_ms):
+    # Лучшее из трёх: одиночный замер шумит из-за холодного дискового кэша
+    elapsed = min(startup.measure_import(module) for _ in range(3))
+    assert elapsed <= budget_ms * BUDGET_SCALE, f'import {module}: {elapsed:.1f} ms'
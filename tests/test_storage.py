@@ -0,0 +1,110 @@
+"""Хранилище SQLite: отложенная запись, flush/close и надёжные транзакции."""
+
+import sqlite3
+
+import pytest
+
+from src.storage import Storage
+
+
+@pytest.fixture
+def storage(tmp_path):
+    # Большой интервал: фоновый поток не успеет дописать очередь сам
+    storage = Storage(tmp_path / 'test.db', flush_interval=60, batch_size=10_000)
+    storage.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, value TEXT)')
+    yield storage
+    storage.close()
+
+
+def read_from_disk(path):
+    conn = sqlite3.connect(str(path))
+    try:
+        return [row[0] for row in conn.execute('SELECT value FROM items ORDER BY id')]
+    finally:
+        conn.close()
+
+
+def test_submit_is_deferred_until_flush(storage):
+    for value in ('a', 'b', 'c'):
+        storage.submit('INSERT INTO items (value) VALUES (?)', (value,))
+    assert read_from_disk(storage.db_path) == []
+
+    storage.flush()
+    assert read_from_disk(storage.db_path) == ['a', 'b', 'c']
+
+
+def test_reads_see_pending_writes_in_order(storage):
+    storage.submit('INSERT INTO items (value) VALUES (?)', ('a',))
+    storage.submit('UPDATE items SET value = ? WHERE value = ?', ('b', 'a'))
+    assert storage.query('SELECT value FROM items') == [('b',)]
+
+
+def test_sync_write_follows_queued_writes(storage):
+    storage.submit('INSERT INTO items (id, value) VALUES (1, ?)', ('queued',))
+    # Синхронная запись выполняется после очереди и видит её результат
+    assert storage.execute('UPDATE items SET value = ? WHERE id = 1', ('updated',)) == 1
+    assert read_from_disk(storage.db_path) == ['updated']
+
+
+def test_close_drains_queue_and_rejects_new_writes(tmp_path):
+    storage = Storage(tmp_path / 'test.db', flush_interval=60, batch_size=10_000)
+    storage.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, value TEXT)')
+    storage.submit('INSERT INTO items (value) VALUES (?)', ('last',))
+    storage.close()
+
+    assert storage.closed
+    assert read_from_disk(storage.db_path) == ['last']
+    with pytest.raises(sqlite3.ProgrammingError):
+        storage.submit('INSERT INTO items (value) VALUES (?)', ('late',))
+    # Повторное закрытие ничего не делает
+    storage.close()
+
+
+def test_failed_transaction_rolls_back(storage):
+    with pytest.raises(RuntimeError):
+        with storage.transaction() as conn:
+            conn.execute('INSERT INTO items (value) VALUES (?)', ('lost',))
+            raise RuntimeError('отмена')
+    assert storage.query('SELECT value FROM items') == []
+
+
+def test_durable_transaction_restores_synchronous(storage):
+    assert storage.synchronous == 'NORMAL'
+    with storage.transaction(durable=True) as conn:
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 2
+    assert storage.query_one('PRAGMA synchronous')[0] == 1
+
+
+def test_synchronous_from_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv('MIKA_DB_SYNCHRONOUS', 'full')
+    storage = Storage(tmp_path / 'test.db')
+    try:
+        assert storage.synchronous == 'FULL'
+    finally:
+        storage.close()
+
+    with pytest.raises(ValueError):
+        Storage(tmp_path / 'other.db', synchronous='sometimes')
+
+
+def test_new_database_gets_incremental_vacuum(tmp_path):
+    storage = Storage(tmp_path / 'new.db')
+    try:
+        assert storage.enable_incremental_vacuum()
+        assert storage.query_one('PRAGMA auto_vacuum')[0] == 2
+    finally:
+        storage.close()
+
+
+def test_existing_database_is_not_rebuilt_on_start(storage):
+    storage.executemany('INSERT INTO items (value) VALUES (?)', [('x' * 1000,)] * 200)
+    storage.execute('DELETE FROM items')
+    pages = storage.query_one('PRAGMA page_count')[0]
+    # Без полной пересборки режим не меняется, и файл остаётся прежнего размера
+    assert not storage.enable_incremental_vacuum()
+    assert storage.query_one('PRAGMA auto_vacuum')[0] == 0
+    assert storage.query_one('PRAGMA page_count')[0] == pages
+
+    storage.compact()
+    assert storage.query_one('PRAGMA auto_vacuum')[0] == 2
+    assert storage.query_one('PRAGMA page_count')[0] < pages
@@ -0,0 +1,66 @@
+"""Пакетный анализ текстов: пул процессов даёт те же результаты и в том же порядке, что и по одному."""
+
+import itertools
+
+import pytest
+
+from src import text_processor
+from src.text_processor import TextProcessor
+
+TEXTS = [
+    f'{opening} {i}: котики {"очень " * (i % 3)}любят спать, а собаки гулять{"?" if i % 2 else "!"}'
+    for i, opening in zip(range(40), itertools.cycle(['Привет', 'Мне грустно', 'Спасибо, отлично', 'Что такое']))
+]
+
+
+@pytest.fixture(scope='module')
+def processor():
+    return TextProcessor()
+
+
+def test_parallel_analysis_matches_serial(processor):
+    serial = [processor.analyze_text(text) for text in TEXTS]
+    assert list(processor.analyze_many(TEXTS, workers=2, chunk_size=3)) == serial
+
+
+def test_parallel_keywords_match_serial(processor):
+    serial = [processor.extract_keywords(text, 2) for text in TEXTS]
+    assert list(processor.extract_keywords_many(iter(TEXTS), limit=2, workers=2, chunk_size=5)) == serial
+
+
+def test_order_is_preserved_across_chunks(processor):
+    texts = [f'номер{i}' for i in range(30)]
+    results = processor.analyze_many(texts, workers=3, chunk_size=2)
+    assert [result['tokens'] for result in results] == [[text] for text in texts]
+
+
+def test_empty_input(processor):
+    assert list(processor.analyze_many([], workers=2, chunk_size=2)) == []
+    assert list(processor.extract_keywords_many(iter(()), workers=2)) == []
+
+
+def test_small_input_skips_pool(processor, monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError('пул процессов для маленького входа')
+
+    monkeypatch.setattr(text_processor, 'ProcessPoolExecutor', no_pool)
+    assert list(processor.analyze_many(TEXTS[:3], workers=4, chunk_size=4)) == [
+        processor.analyze_text(text) for text in TEXTS[:3]
+    ]
+    # Один процесс — тоже без пула, сколько бы ни было текстов
+    assert len(list(processor.extract_keywords_many(TEXTS, workers=1, chunk_size=2))) == len(TEXTS)
+
+
+def test_input_is_read_lazily(processor):
+    consumed = []
+
+    def texts():
+        for text in TEXTS:
+            consumed.append(text)
+            yield text
+
+    results = processor.analyze_many(texts(), workers=2, chunk_size=2)
+    assert next(results) == processor.analyze_text(TEXTS[0])
+    # Не больше двух кусков в работе на процесс плюс первый кусок
+    assert len(consumed) <= 2 * (2 * 2 + 1)
+    assert len(list(results)) == len(TEXTS) - 1
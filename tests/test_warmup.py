@@ -0,0 +1,125 @@
+"""Прогрев модели: пропуск при занятых слотах, повторный прогрев и параллельный запуск."""
+
+import logging
+import threading
+import time
+
+import pytest
+
+from src.dialog_manager import DialogManager
+from src.knowledge import KnowledgeBase
+from src.mika import Mika
+from src.scheduler import GenerationScheduler
+from src.warmup import ModelWarmer, parse_duration
+
+
+class SlowClient:
+    """Клиент Ollama, у которого проверка и загрузка модели занимают ``delay`` секунд."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.warm_ups = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def warm_up(self, model, keep_alive=None, options=None):
+        self.warm_ups.append(time.monotonic())
+        self.release.wait(5)
+        time.sleep(self.delay)
+        return True
+
+    def check_service(self):
+        time.sleep(self.delay)
+        return True
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize('value, seconds', [
+    ('30m', 1800.0), ('1h30m', 5400.0), ('500ms', 0.5), (300, 300.0), ('45', 45.0),
+    (0, None), ('-1', None), ('-5m', None),
+])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+
+def test_parse_duration_rejects_garbage():
+    with pytest.raises(ValueError):
+        parse_duration('полчаса')
+
+
+def test_concurrent_warm_ups_are_merged():
+    client = SlowClient()
+    client.release.clear()
+    warmer = ModelWarmer(client, 'marco-o1', keep_alive=0)
+    try:
+        futures = [warmer.warm_up() for _ in range(3)]
+        assert futures[0] is futures[1] is futures[2]
+        client.release.set()
+        assert futures[0].result(timeout=2)
+        assert len(client.warm_ups) == 1
+    finally:
+        warmer.close()
+
+
+def test_warm_up_skipped_when_slots_are_busy(caplog):
+    scheduler = GenerationScheduler(max_concurrent=1)
+    busy = scheduler.acquire('a')
+    client = SlowClient()
+    warmer = ModelWarmer(client, 'marco-o1', keep_alive=0, scheduler=scheduler, slot_timeout=0.1)
+    try:
+        with caplog.at_level(logging.INFO, logger='mika'):
+            assert warmer.warm_up().result(timeout=2) is False
+        assert client.warm_ups == []
+        assert warmer.skipped == 1
+        assert 'пропущен' in caplog.text
+        # Пропущенный прогрев не оставляет билет в очереди
+        assert (scheduler.running, scheduler.queue_depth) == (1, 0)
+    finally:
+        scheduler.release(busy)
+        warmer.close()
+
+
+def test_watcher_rewarms_until_idle():
+    client = SlowClient()
+    # keep_alive 0.2 с: повторный прогрев каждые 0.1 с, пока пользователь молчит меньше 0.5 с
+    warmer = ModelWarmer(client, 'marco-o1', keep_alive=0.2, margin=0.5, max_idle=0.5)
+    try:
+        warmer.warm_up().result(timeout=2)
+        time.sleep(0.4)
+        assert len(client.warm_ups) >= 3
+        assert warmer.warm_ups == len(client.warm_ups)
+
+        time.sleep(0.4)
+        # Пользователь давно молчит: модель больше не прогревается
+        settled = len(client.warm_ups)
+        time.sleep(0.3)
+        assert len(client.warm_ups) == settled
+
+        # Обращение к модели возобновляет прогрев
+        warmer.touch()
+        time.sleep(0.25)
+        assert len(client.warm_ups) > settled
+    finally:
+        warmer.close()
+
+
+def test_startup_steps_run_concurrently(tmp_path, monkeypatch):
+    client = SlowClient(delay=0.3)
+    dialog_manager = DialogManager(tmp_path / 'mika_data.db')
+    knowledge = KnowledgeBase(tmp_path / 'mika_knowledge.db', offline=True)
+    monkeypatch.setattr(dialog_manager, 'clear_old_messages', lambda **kwargs: time.sleep(0.3) or 0)
+    mika = Mika(ollama_client=client, dialog_manager=dialog_manager, knowledge=knowledge, keep_alive='0')
+    try:
+        started = time.monotonic()
+        assert mika._startup()
+        elapsed = time.monotonic() - started
+        # Проверка сервиса, очистка и прогрев шли одновременно, а не друг за другом
+        assert elapsed < 0.55, f'{elapsed:.2f} с'
+        # Загрузка модели началась вместе с остальными шагами
+        assert len(client.warm_ups) == 1 and client.warm_ups[0] - started < 0.1
+    finally:
+        mika.close()
+        dialog_manager.close()
+        knowledge.close()